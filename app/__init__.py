@@ -2,12 +2,13 @@ from flask import Flask, redirect, url_for
 from flask_cors import CORS
 from flask_login import LoginManager, login_required
 import os
+import multiprocessing
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-def create_app():
+def create_app(background_tasks=True):
     app = Flask(__name__)
     CORS(app)
     
@@ -17,6 +18,36 @@ def create_app():
     app.config['UPLOAD_FOLDER'] = os.path.join(os.getcwd(), 'app/static/screenshots')
     app.config['DATABASE'] = os.getenv('DATABASE_PATH', os.path.join(os.getcwd(), 'database/trading_journal.db'))
     app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_UPLOAD_SIZE_MB', 16)) * 1024 * 1024
+    app.config['BACKGROUND_TASKS'] = os.getenv('BACKGROUND_TASKS', 'true').lower() == 'true'
+    app.config['SCREENSHOT_GC_INTERVAL_HOURS'] = float(os.getenv('SCREENSHOT_GC_INTERVAL_HOURS', 0))
+    app.config['SCREENSHOT_GC_GRACE_HOURS'] = float(os.getenv('SCREENSHOT_GC_GRACE_HOURS', 24))
+    app.config['BACKUP_DIR'] = os.getenv('BACKUP_DIR', os.path.join(os.getcwd(), 'backups'))
+    app.config['BACKUP_ENABLED'] = os.getenv('BACKUP_ENABLED', 'false').lower() == 'true'
+    app.config['BACKUP_INTERVAL_MINUTES'] = float(os.getenv('BACKUP_INTERVAL_MINUTES', 60))
+    app.config['BACKUP_IO_LIMIT_MB'] = float(os.getenv('BACKUP_IO_LIMIT_MB', 0)) or None
+    app.config['BACKUP_LEVEL'] = int(os.getenv('BACKUP_LEVEL')) if os.getenv('BACKUP_LEVEL') else None
+    app.config['BACKUP_WORKERS'] = int(os.getenv('BACKUP_WORKERS')) if os.getenv('BACKUP_WORKERS') else None
+    app.config['CAPTURE_BACKEND'] = os.getenv('CAPTURE_BACKEND', 'stub')
+    app.config['CAPTURE_WORKER_PROCESSES'] = int(os.getenv('CAPTURE_WORKER_PROCESSES', 0))
+    app.config['CAPTURE_MAX_ATTEMPTS'] = int(os.getenv('CAPTURE_MAX_ATTEMPTS', 3))
+    app.config['CAPTURE_TIMEOUT_SECONDS'] = float(os.getenv('CAPTURE_TIMEOUT_SECONDS', 60))
+    app.config['DB_MAINTENANCE_INTERVAL_HOURS'] = float(os.getenv('DB_MAINTENANCE_INTERVAL_HOURS', 0))
+    app.config['METRICS_ENABLED'] = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+    app.config['METRICS_TOKEN'] = os.getenv('METRICS_TOKEN')
+    app.config['SLOW_QUERY_MS'] = float(os.getenv('SLOW_QUERY_MS', 200))
+    app.config['SLOW_QUERY_LOG'] = os.getenv('SLOW_QUERY_LOG', os.path.join(os.getcwd(), 'logs/slow_queries.log'))
+    app.config['SERVER_TIMING'] = os.getenv(
+        'SERVER_TIMING', str(app.config['FLASK_ENV'] == 'development')
+    ).lower() == 'true'
+    app.config['STREAM_HEARTBEAT_SECONDS'] = float(os.getenv('STREAM_HEARTBEAT_SECONDS', 15))
+    app.config['STREAM_QUEUE_SIZE'] = int(os.getenv('STREAM_QUEUE_SIZE', 100))
+    app.config['STREAM_MAX_CLIENTS_PER_USER'] = int(os.getenv('STREAM_MAX_CLIENTS_PER_USER', 5))
+    app.config['STREAM_MAX_CLIENTS'] = int(os.getenv('STREAM_MAX_CLIENTS', 50))
+    app.config['JSON_PROVIDER'] = os.getenv('JSON_PROVIDER', 'auto')
+    app.config['COMPRESSION_ENABLED'] = os.getenv('COMPRESSION_ENABLED', 'true').lower() == 'true'
+    app.config['COMPRESSION_MIN_BYTES'] = int(os.getenv('COMPRESSION_MIN_BYTES', 1024))
+    app.config['COMPRESSION_LEVEL'] = int(os.getenv('COMPRESSION_LEVEL', 1))
+    app.config['COMPRESSION_BROTLI_QUALITY'] = int(os.getenv('COMPRESSION_BROTLI_QUALITY', 4))
     
     # Ensure folders exist
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
@@ -31,9 +62,95 @@ def create_app():
     migration = Migration(app.config['DATABASE'])
     try:
         migration.run_all_migrations()
+        # Data backfills run in batches in the background, rate limited
+        if migration.has_pending_backfills():
+            migration.start_backfill_thread(
+                batch_size=int(os.getenv('BACKFILL_BATCH_SIZE', 1000)),
+                max_rows_per_second=int(os.getenv('BACKFILL_MAX_ROWS_PER_SECOND', 20000))
+            )
     except Exception as e:
         print(f"Migration error: {e}")
     
+    # Schedulers run in one process: never in capture processes (they re-import the
+    # main module) or the reloader's watcher, and not at all with BACKGROUND_TASKS=false
+    # (e.g. gunicorn workers, with the manage.py daemons running instead)
+    background_tasks = (background_tasks and app.config['BACKGROUND_TASKS']
+                        and multiprocessing.parent_process() is None)
+    
+    # Periodic orphaned screenshot cleanup (disabled unless an interval is set)
+    if app.config['SCREENSHOT_GC_INTERVAL_HOURS'] > 0 and background_tasks:
+        from app.services.screenshot_gc import ScreenshotGarbageCollector
+        ScreenshotGarbageCollector(
+            app.config['DATABASE'],
+            app.config['UPLOAD_FOLDER'],
+            grace_hours=app.config['SCREENSHOT_GC_GRACE_HOURS']
+        ).start_periodic(app.config['SCREENSHOT_GC_INTERVAL_HOURS'])
+    
+    # Scheduled backups (or run `python manage.py backup-daemon` separately)
+    if app.config['BACKUP_ENABLED'] and background_tasks:
+        from app.services.backup_scheduler import BackupScheduler
+        BackupScheduler(
+            app.config['DATABASE'],
+            app.config['UPLOAD_FOLDER'],
+            backup_dir=app.config['BACKUP_DIR'],
+            interval_minutes=app.config['BACKUP_INTERVAL_MINUTES'],
+            keep_hourly=int(os.getenv('BACKUP_KEEP_HOURLY', 24)),
+            keep_daily=int(os.getenv('BACKUP_KEEP_DAILY', 7)),
+            keep_weekly=int(os.getenv('BACKUP_KEEP_WEEKLY', 4)),
+            io_limit_mb=app.config['BACKUP_IO_LIMIT_MB'],
+            codec=os.getenv('BACKUP_CODEC', 'gzip'),
+            level=app.config['BACKUP_LEVEL'],
+            workers=app.config['BACKUP_WORKERS']
+        ).start_thread()
+    
+    # Periodic ANALYZE/optimize, bounded incremental vacuum and WAL checkpoint
+    if app.config['DB_MAINTENANCE_INTERVAL_HOURS'] > 0 and background_tasks:
+        from app.models.maintenance import MaintenanceScheduler
+        MaintenanceScheduler(
+            app.config['DATABASE'],
+            interval_hours=app.config['DB_MAINTENANCE_INTERVAL_HOURS'],
+            vacuum_pages=int(os.getenv('DB_MAINTENANCE_VACUUM_PAGES', 2000))
+        ).start_thread()
+    
+    # Local capture worker (otherwise run `python manage.py capture-worker`)
+    if app.config['CAPTURE_WORKER_PROCESSES'] > 0 and background_tasks:
+        from app.services.capture_queue import CaptureWorker
+        CaptureWorker(
+            app.config['DATABASE'],
+            app.config['UPLOAD_FOLDER'],
+            backend=app.config['CAPTURE_BACKEND'],
+            processes=app.config['CAPTURE_WORKER_PROCESSES']
+        ).start_thread()
+    
+    # Request timing, SQL counts and /api/metrics
+    if app.config['METRICS_ENABLED']:
+        from app.services.metrics import init_metrics
+        init_metrics(app, server_timing=app.config['SERVER_TIMING'])
+    
+    # Statements slower than SLOW_QUERY_MS are logged with their query plan
+    if app.config['SLOW_QUERY_MS'] > 0:
+        from app.services.slow_queries import init_slow_query_log
+        init_slow_query_log(
+            app.config['SLOW_QUERY_LOG'],
+            threshold_ms=app.config['SLOW_QUERY_MS'],
+            max_bytes=int(float(os.getenv('SLOW_QUERY_LOG_MAX_MB', 10)) * 1024 * 1024),
+            backup_count=int(os.getenv('SLOW_QUERY_LOG_BACKUPS', 5))
+        )
+    
+    # orjson when installed (JSON_PROVIDER=auto), otherwise the stdlib encoder
+    from app.services.json_provider import init_json_provider
+    init_json_provider(app, app.config['JSON_PROVIDER'])
+    
+    # gzip/brotli for JSON, CSV and pages above COMPRESSION_MIN_BYTES
+    if app.config['COMPRESSION_ENABLED']:
+        from app.services.compression import init_compression
+        init_compression(
+            app,
+            min_size=app.config['COMPRESSION_MIN_BYTES'],
+            level=app.config['COMPRESSION_LEVEL'],
+            brotli_quality=app.config['COMPRESSION_BROTLI_QUALITY']
+        )
+    
     # Setup Flask-Login
     login_manager = LoginManager()
     login_manager.init_app(app)
@@ -52,6 +169,7 @@ def create_app():
     from app.routes.statistics import bp as statistics_bp
     from app.routes.auth import bp as auth_bp
     from app.routes.landing import bp as landing_bp
+    from app.routes.stream import bp as stream_bp
     
     app.register_blueprint(main_bp)
     app.register_blueprint(trades_bp)
@@ -60,5 +178,6 @@ def create_app():
     app.register_blueprint(statistics_bp)
     app.register_blueprint(auth_bp)
     app.register_blueprint(landing_bp)
+    app.register_blueprint(stream_bp)
     
     return app
\ No newline at end of file
@@ -0,0 +1,401 @@
+import os
+import re
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from app.models.change_log import latest_change, log_change
+
+ARCHIVE_SCHEMA = 'archive'
+
+# Lifetime rollups of archived trades, per user: (dimension, bucket expression)
+ROLLUP_DIMENSIONS = [
+    ('all', "''"),
+    ('session', 'session'),
+    ('setup_type', 'setup_type'),
+    ('entry_hour', 'entry_hour'),
+    ('entry_weekday', 'entry_weekday')
+]
+
+ROLLUP_AGGREGATES = '''
+    COUNT(*),
+    SUM(CASE WHEN profit_loss > 0 THEN 1 ELSE 0 END),
+    SUM(CASE WHEN profit_loss < 0 THEN 1 ELSE 0 END),
+    COALESCE(SUM(profit_loss), 0),
+    COALESCE(SUM(CASE WHEN profit_loss > 0 THEN profit_loss END), 0),
+    COALESCE(SUM(CASE WHEN profit_loss < 0 THEN profit_loss END), 0),
+    COALESCE(SUM(CASE WHEN r_multiple > 0 THEN r_multiple END), 0),
+    SUM(CASE WHEN r_multiple > 0 THEN 1 ELSE 0 END),
+    COALESCE(SUM(r_multiple), 0),
+    COUNT(r_multiple),
+    SUM(CASE WHEN ABS(profit_loss) <= risk_amount * 1.1 THEN 1 ELSE 0 END),
+    SUM(CASE WHEN rule_followed = 1 THEN 1 ELSE 0 END),
+    MAX(profit_loss),
+    MIN(profit_loss)
+'''
+
+ROLLUP_COUNTS = ('trades', 'wins', 'losses', 'r_win_count', 'r_count', 'disciplined', 'rule_followed')
+ROLLUP_COLUMNS = (
+    'trades', 'wins', 'losses', 'pnl', 'win_pnl', 'loss_pnl', 'r_win_sum', 'r_win_count',
+    'r_sum', 'r_count', 'disciplined', 'rule_followed', 'max_pnl', 'min_pnl'
+)
+
+def archive_path_for(db_path):
+    """The archive lives next to the main database: trading_journal_archive.db"""
+    root, ext = os.path.splitext(db_path)
+    return f'{root}_archive{ext or ".db"}'
+
+def archived_before(conn):
+    """Exit-time cutoff below which closed trades may be archived, or None"""
+    try:
+        row = conn.execute("SELECT value FROM archive_state WHERE key = 'archived_before'").fetchone()
+    except sqlite3.OperationalError:
+        return None  # Migrations not run yet
+    return row[0] if row else None
+
+def attach_archive(conn, db_path):
+    """ATTACH the archive to `conn` (once); False if there is no archive file"""
+    attached = [row[1] for row in conn.execute('PRAGMA database_list').fetchall()]
+    if ARCHIVE_SCHEMA in attached:
+        return True
+    path = archive_path_for(db_path)
+    if not os.path.exists(path):
+        return False
+    conn.execute(f'ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}', (path,))
+    return True
+
+def needs_archive(conn, db_path, since=None):
+    """Attach the archive if rows on or after `since` (None = all time) can be archived.
+
+    Archived trades all exited before the recorded cutoff, so queries whose
+    range starts at or after it never touch the archive file.
+    """
+    cutoff = archived_before(conn)
+    if cutoff is None or (since is not None and since >= cutoff):
+        return False
+    return attach_archive(conn, db_path)
+
+def _columns(conn, schema, table):
+    return [row[1] for row in conn.execute(f'PRAGMA {schema}.table_info({table})').fetchall()]
+
+def trades_source(conn, db_path, since=None):
+    """Table expression for trades: hot rows, plus archived ones when needed.
+
+    Use as `FROM {source}`; it is aliased to `trades`. The archive side
+    selects NULL for any column added to the hot table after it was created.
+    """
+    if not needs_archive(conn, db_path, since):
+        return 'trades'
+
+    hot = _columns(conn, 'main', 'trades')
+    cold = set(_columns(conn, ARCHIVE_SCHEMA, 'trades'))
+    hot_list = ', '.join(hot)
+    cold_list = ', '.join(column if column in cold else f'NULL AS {column}' for column in hot)
+    return (
+        f'(SELECT {hot_list} FROM main.trades '
+        f'UNION ALL SELECT {cold_list} FROM {ARCHIVE_SCHEMA}.trades) AS trades'
+    )
+
+def trade_tags_source(conn):
+    """Table expression for trade_tags (alias it); includes archived links if attached"""
+    attached = [row[1] for row in conn.execute('PRAGMA database_list').fetchall()]
+    if ARCHIVE_SCHEMA not in attached:
+        return 'trade_tags'
+    return (
+        f'(SELECT trade_id, tag_id FROM main.trade_tags '
+        f'UNION ALL SELECT trade_id, tag_id FROM {ARCHIVE_SCHEMA}.trade_tags)'
+    )
+
+def archive_rollups(conn, db_path, dimension, user_id=None):
+    """Lifetime totals of archived trades for one dimension, keyed by bucket"""
+    if not needs_archive(conn, db_path):
+        return {}
+
+    columns = ', '.join(f'SUM({column})' for column in ROLLUP_COLUMNS[:-2])
+    query = f'''
+        SELECT bucket, {columns}, MAX(max_pnl), MIN(min_pnl)
+        FROM {ARCHIVE_SCHEMA}.trade_rollups
+        WHERE dimension = ? {'AND user_id = ?' if user_id else ''}
+        GROUP BY bucket
+    '''
+    params = (dimension, user_id) if user_id else (dimension,)
+    return {
+        row[0]: dict(zip(ROLLUP_COLUMNS, row[1:]))
+        for row in conn.execute(query, params).fetchall()
+    }
+
+def archive_snapshot(conn, db_path, user_id):
+    """Running balance, peak and max drawdown at the end of a user's archived trades"""
+    if not needs_archive(conn, db_path):
+        return None
+    row = conn.execute(
+        f'SELECT balance, peak, max_drawdown FROM {ARCHIVE_SCHEMA}.user_snapshots WHERE user_id = ?',
+        (user_id,)
+    ).fetchone()
+    return tuple(row) if row else None
+
+class TradeArchive:
+    """Moves old closed trades into a separate archive database.
+
+    Trades keep their ids. Each batch moves one user's oldest trades, their
+    tag links, and their contribution to the lifetime rollups in a single
+    transaction across both files, so statistics never see a trade twice
+    or not at all.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.archive_path = archive_path_for(db_path)
+
+    def get_connection(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.execute(f'ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}', (self.archive_path,))
+        return conn
+
+    def ensure_schema(self, conn):
+        """Create archive tables from the hot schema, adding columns migrations added since"""
+        table_sql = conn.execute(
+            "SELECT sql FROM main.sqlite_master WHERE type = 'table' AND name = 'trades'"
+        ).fetchone()[0]
+        conn.execute(re.sub(
+            r'^CREATE TABLE\s+(?:"trades"|trades)',
+            f'CREATE TABLE IF NOT EXISTS {ARCHIVE_SCHEMA}.trades',
+            table_sql
+        ))
+
+        cold = set(_columns(conn, ARCHIVE_SCHEMA, 'trades'))
+        for row in conn.execute('PRAGMA main.table_info(trades)').fetchall():
+            name, column_type = row[1], row[2]
+            if name not in cold:
+                conn.execute(f'ALTER TABLE {ARCHIVE_SCHEMA}.trades ADD COLUMN {name} {column_type}')
+
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {ARCHIVE_SCHEMA}.trade_tags (
+                trade_id INTEGER NOT NULL,
+                tag_id INTEGER NOT NULL,
+                UNIQUE(trade_id, tag_id)
+            )
+        ''')
+        # bucket has no declared type so hours stay integers and sessions text
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {ARCHIVE_SCHEMA}.trade_rollups (
+                user_id INTEGER NOT NULL,
+                dimension TEXT NOT NULL,
+                bucket,
+                {', '.join(f"{column} {'INTEGER' if column in ROLLUP_COUNTS else 'REAL'}" for column in ROLLUP_COLUMNS)},
+                UNIQUE(user_id, dimension, bucket)
+            )
+        ''')
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {ARCHIVE_SCHEMA}.user_snapshots (
+                user_id INTEGER PRIMARY KEY,
+                balance REAL NOT NULL DEFAULT 0,
+                peak REAL NOT NULL DEFAULT 0,
+                max_drawdown REAL NOT NULL DEFAULT 0,
+                last_exit_time TEXT,
+                updated_at TEXT
+            )
+        ''')
+        conn.execute(
+            f'CREATE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}.idx_archive_trades_user_exit '
+            f'ON trades(user_id, exit_time)'
+        )
+        conn.execute(
+            f'CREATE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}.idx_archive_trades_user_entry '
+            f'ON trades(user_id, entry_time)'
+        )
+
+    def _add_rollups(self, conn):
+        """Add the trades in temp.archive_batch to the lifetime rollups"""
+        updates = ', '.join(
+            f'{column} = COALESCE(MAX({column}, excluded.{column}), {column}, excluded.{column})'
+            if column == 'max_pnl'
+            else f'{column} = COALESCE(MIN({column}, excluded.{column}), {column}, excluded.{column})'
+            if column == 'min_pnl'
+            else f'{column} = {column} + excluded.{column}'
+            for column in ROLLUP_COLUMNS
+        )
+        for dimension, bucket in ROLLUP_DIMENSIONS:
+            conn.execute(f'''
+                INSERT INTO {ARCHIVE_SCHEMA}.trade_rollups (user_id, dimension, bucket, {', '.join(ROLLUP_COLUMNS)})
+                SELECT user_id, ?, {bucket}, {ROLLUP_AGGREGATES}
+                FROM {ARCHIVE_SCHEMA}.trades
+                WHERE id IN (SELECT id FROM temp.archive_batch)
+                GROUP BY user_id, {bucket}
+                ON CONFLICT(user_id, dimension, bucket) DO UPDATE SET {updates}
+            ''', (dimension,))
+
+        # Tag usage (the mistakes report): bucket is the tag id
+        conn.execute(f'''
+            INSERT INTO {ARCHIVE_SCHEMA}.trade_rollups (user_id, dimension, bucket, trades)
+            SELECT t.user_id, 'tag', tt.tag_id, COUNT(*)
+            FROM {ARCHIVE_SCHEMA}.trade_tags tt
+            JOIN {ARCHIVE_SCHEMA}.trades t ON t.id = tt.trade_id
+            WHERE tt.trade_id IN (SELECT id FROM temp.archive_batch)
+            GROUP BY t.user_id, tt.tag_id
+            ON CONFLICT(user_id, dimension, bucket) DO UPDATE SET trades = trades + excluded.trades
+        ''')
+
+    def _advance_snapshot(self, conn, user_id, rows):
+        """Continue the user's balance/drawdown over trades moved in exit order"""
+        snapshot = conn.execute(
+            f'SELECT balance, peak, max_drawdown FROM {ARCHIVE_SCHEMA}.user_snapshots WHERE user_id = ?',
+            (user_id,)
+        ).fetchone()
+        balance, peak, max_drawdown = snapshot or (0, 0, 0)
+
+        for _, exit_time, profit_loss in rows:
+            if profit_loss:
+                balance += profit_loss
+                peak = max(peak, balance)
+                max_drawdown = max(max_drawdown, peak - balance)
+
+        conn.execute(f'''
+            INSERT INTO {ARCHIVE_SCHEMA}.user_snapshots
+                (user_id, balance, peak, max_drawdown, last_exit_time, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(user_id) DO UPDATE SET
+                balance = excluded.balance, peak = excluded.peak,
+                max_drawdown = excluded.max_drawdown,
+                last_exit_time = excluded.last_exit_time, updated_at = excluded.updated_at
+        ''', (user_id, balance, peak, max_drawdown, rows[-1][1], datetime.now().isoformat()))
+
+    def archive(self, older_than_days, batch_size=2000, pause=0.01, progress=None):
+        """Move closed trades that exited more than `older_than_days` ago"""
+        cutoff = (datetime.now() - timedelta(days=older_than_days)).isoformat()
+        conn = self.get_connection()
+        moved = 0
+
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            self.ensure_schema(conn)
+            conn.execute('CREATE TEMP TABLE IF NOT EXISTS archive_batch (id INTEGER PRIMARY KEY)')
+
+            # Publish the cutoff first: from here on, reads reaching before it attach the archive
+            current = archived_before(conn)
+            if current is None or cutoff > current:
+                conn.execute('''
+                    INSERT INTO archive_state (key, value) VALUES ('archived_before', ?)
+                    ON CONFLICT(key) DO UPDATE SET value = excluded.value
+                ''', (cutoff,))
+            conn.execute('COMMIT')
+
+            columns = ', '.join(_columns(conn, 'main', 'trades'))
+            user_ids = [row[0] for row in conn.execute(
+                "SELECT DISTINCT user_id FROM main.trades WHERE status = 'closed' AND exit_time < ?",
+                (cutoff,)
+            ).fetchall()]
+
+            for user_id in user_ids:
+                while True:
+                    conn.execute('BEGIN IMMEDIATE')
+                    try:
+                        # Oldest first, so the drawdown snapshot can be carried forward
+                        logged = latest_change(conn)
+                        rows = conn.execute('''
+                            SELECT id, exit_time, profit_loss FROM main.trades
+                            WHERE user_id = ? AND status = 'closed' AND exit_time < ?
+                            ORDER BY exit_time, id
+                            LIMIT ?
+                        ''', (user_id, cutoff, batch_size)).fetchall()
+                        if not rows:
+                            conn.execute('COMMIT')
+                            break
+
+                        conn.execute('DELETE FROM temp.archive_batch')
+                        conn.executemany(
+                            'INSERT INTO temp.archive_batch (id) VALUES (?)', [(row[0],) for row in rows]
+                        )
+                        batch = 'SELECT id FROM temp.archive_batch'
+                        conn.execute(f'''
+                            INSERT INTO {ARCHIVE_SCHEMA}.trades ({columns})
+                            SELECT {columns} FROM main.trades WHERE id IN ({batch})
+                        ''')
+                        conn.execute(f'''
+                            INSERT OR IGNORE INTO {ARCHIVE_SCHEMA}.trade_tags (trade_id, tag_id)
+                            SELECT trade_id, tag_id FROM main.trade_tags WHERE trade_id IN ({batch})
+                        ''')
+                        self._add_rollups(conn)
+                        self._advance_snapshot(conn, user_id, rows)
+                        conn.execute(f'DELETE FROM main.trade_tags WHERE trade_id IN ({batch})')
+                        conn.execute(f'DELETE FROM main.trades WHERE id IN ({batch})')
+                        # Archived trades are still listed: nothing changed for sync clients
+                        conn.execute('DELETE FROM main.trade_changes WHERE seq > ?', (logged,))
+                        conn.execute('COMMIT')
+                    except Exception:
+                        conn.execute('ROLLBACK')
+                        raise
+
+                    moved += len(rows)
+                    if progress:
+                        progress(moved)
+                    # Let app writers in between batches
+                    time.sleep(pause)
+        finally:
+            conn.close()
+
+        return {'cutoff': cutoff, 'moved': moved, 'archive': self.archive_path}
+
+    def rebuild_user(self, conn, user_id):
+        """Recompute a user's rollups and snapshot from their archived trades"""
+        conn.execute(f'DELETE FROM {ARCHIVE_SCHEMA}.trade_rollups WHERE user_id = ?', (user_id,))
+        conn.execute(f'DELETE FROM {ARCHIVE_SCHEMA}.user_snapshots WHERE user_id = ?', (user_id,))
+        conn.execute('CREATE TEMP TABLE IF NOT EXISTS archive_batch (id INTEGER PRIMARY KEY)')
+        conn.execute('DELETE FROM temp.archive_batch')
+        conn.execute(
+            f'INSERT INTO temp.archive_batch (id) SELECT id FROM {ARCHIVE_SCHEMA}.trades WHERE user_id = ?',
+            (user_id,)
+        )
+        self._add_rollups(conn)
+
+        rows = conn.execute(f'''
+            SELECT id, exit_time, profit_loss FROM {ARCHIVE_SCHEMA}.trades
+            WHERE user_id = ? ORDER BY exit_time, id
+        ''', (user_id,)).fetchall()
+        if rows:
+            self._advance_snapshot(conn, user_id, rows)
+
+    def delete_trade(self, trade_id, user_id):
+        """Delete an archived trade; returns False if the user has no such trade"""
+        if not os.path.exists(self.archive_path):
+            return False
+
+        conn = self.get_connection()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                deleted = conn.execute(
+                    f'DELETE FROM {ARCHIVE_SCHEMA}.trades WHERE id = ? AND user_id = ?',
+                    (trade_id, user_id)
+                ).rowcount
+                if deleted:
+                    conn.execute(f'DELETE FROM {ARCHIVE_SCHEMA}.trade_tags WHERE trade_id = ?', (trade_id,))
+                    self.rebuild_user(conn, user_id)
+                    # The archive has no change log triggers
+                    log_change(conn, trade_id, user_id, 'delete')
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            return bool(deleted)
+        finally:
+            conn.close()
+
+    def status(self):
+        """Cutoff, row counts and file sizes of the hot and archive databases"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            result = {
+                'archived_before': archived_before(conn),
+                'hot_trades': conn.execute('SELECT COUNT(*) FROM trades').fetchone()[0],
+                'hot_mb': round(os.path.getsize(self.db_path) / (1024 * 1024), 2),
+                'archived_trades': 0,
+                'archive_mb': 0
+            }
+            if attach_archive(conn, self.db_path):
+                result['archived_trades'] = conn.execute(
+                    f'SELECT COUNT(*) FROM {ARCHIVE_SCHEMA}.trades'
+                ).fetchone()[0]
+                result['archive_mb'] = round(os.path.getsize(self.archive_path) / (1024 * 1024), 2)
+            return result
+        finally:
+            conn.close()
@@ -1,68 +1,401 @@
 import shutil
 import os
+import sqlite3
 from datetime import datetime
 import gzip
+import json
+import hashlib
+import zlib
+import time
+from concurrent.futures import ThreadPoolExecutor
+from app.models.migrations import file_lock
+
+try:
+    import zstandard
+except ImportError:  # optional - gzip is always available
+    zstandard = None
+
+# Pages copied per backup step; the source is unlocked between steps
+BACKUP_PAGES_PER_STEP = 1024
+# Seconds to yield to writers between steps
+BACKUP_STEP_SLEEP = 0.005
+COPY_BUFFER_SIZE = 1024 * 1024
+# Incremental snapshots split the database into chunks of this many bytes
+# (a multiple of every SQLite page size, so a page never spans two chunks)
+SNAPSHOT_CHUNK_SIZE = 256 * 1024
+# Parallel gzip compresses blocks of this size as independent gzip members
+COMPRESS_BLOCK_SIZE = 4 * 1024 * 1024
+
+CODEC_EXTENSIONS = {'gzip': '.gz', 'zstd': '.zst'}
+DEFAULT_LEVELS = {'gzip': 6, 'zstd': 3}
+
+def _gzip_member(block, level):
+    # zlib releases the GIL while compressing, so threads scale across cores
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return compressor.compress(block) + compressor.flush()
+
+class IOThrottle:
+    """Sleeps just enough to keep average throughput under a byte rate"""
+    def __init__(self, bytes_per_second):
+        self.bytes_per_second = bytes_per_second
+        self.started = time.monotonic()
+        self.consumed = 0
+    
+    def consume(self, size):
+        self.consumed += size
+        ahead = self.consumed / self.bytes_per_second - (time.monotonic() - self.started)
+        if ahead > 0:
+            time.sleep(ahead)
+
+def codec_for(path):
+    """Infer the compression codec from a backup filename"""
+    for codec, extension in CODEC_EXTENSIONS.items():
+        if path.endswith(extension):
+            return codec
+    raise ValueError(f"Unknown backup format: {path}")
 
 class DatabaseBackup:
-    def __init__(self, db_path, backup_dir='backups'):
+    def __init__(self, db_path, backup_dir='backups', codec='gzip', level=None, workers=None,
+                 io_limit=None):
+        if codec not in CODEC_EXTENSIONS:
+            raise ValueError(f"Unknown codec: {codec}")
+        if codec == 'zstd' and zstandard is None:
+            raise ValueError("zstd codec requires the 'zstandard' package")
+        
         self.db_path = db_path
         self.backup_dir = backup_dir
+        self.codec = codec
+        self.level = level if level is not None else DEFAULT_LEVELS[codec]
+        self.workers = workers or os.cpu_count() or 1
+        # Optional bytes/second cap so background backups don't starve requests
+        self.io_limit = io_limit
+        self.throttle = None
+        self.snapshot_dir = os.path.join(backup_dir, 'snapshots')
+        self.chunk_dir = os.path.join(backup_dir, 'chunks')
+        # Snapshot writers hold it shared, chunk collection exclusively
+        self.chunk_lock_path = os.path.join(backup_dir, '.chunks.lock')
         os.makedirs(backup_dir, exist_ok=True)
     
-    def create_backup(self):
-        """Create a compressed backup of the database"""
+    def _snapshot_file(self, snapshot_path, pages_per_step, step_sleep):
+        """Copy the live database into a verified file at `snapshot_path`; returns its page size.
+        
+        Pages are copied in batches with the online backup API and the source
+        lock is released between steps, so writers are only ever blocked for
+        one batch. The copy is a consistent snapshot that includes committed
+        WAL contents. It goes to disk, so memory stays flat however large the
+        database is; the caller reads it in pieces and removes it with
+        _remove_snapshot_file.
+        """
+        source = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+        try:
+            page_size = source.execute('PRAGMA page_size').fetchone()[0]
+            if self.io_limit:
+                step_sleep = max(step_sleep, pages_per_step * page_size / self.io_limit)
+            snapshot = sqlite3.connect(snapshot_path)
+            try:
+                source.backup(snapshot, pages=pages_per_step, sleep=step_sleep)
+                self._verify(snapshot)
+            finally:
+                snapshot.close()
+        finally:
+            source.close()
+        return page_size
+    
+    @staticmethod
+    def _remove_snapshot_file(snapshot_path):
+        for suffix in ('', '-journal', '-wal', '-shm'):
+            if os.path.exists(snapshot_path + suffix):
+                os.remove(snapshot_path + suffix)
+    
+    def _verify(self, conn):
+        """Run PRAGMA integrity_check, raising if the copy is damaged"""
+        result = conn.execute('PRAGMA integrity_check').fetchall()
+        if [row[0] for row in result] != ['ok']:
+            raise sqlite3.DatabaseError(f"Integrity check failed: {result[:5]}")
+    
+    def _throttle(self, size):
+        if self.io_limit:
+            if self.throttle is None:
+                self.throttle = IOThrottle(self.io_limit)
+            self.throttle.consume(size)
+    
+    def _compress(self, f_in, f_out):
+        """Compress a file into f_out using all configured workers, a block at a time"""
+        if self.codec == 'zstd':
+            compressor = zstandard.ZstdCompressor(level=self.level, threads=self.workers)
+            with compressor.stream_writer(f_out, closefd=False) as writer:
+                for block in iter(lambda: f_in.read(COPY_BUFFER_SIZE), b''):
+                    writer.write(block)
+                    self._throttle(len(block))
+            return
+        
+        # pigz-style: independent gzip members, concatenated in order.
+        # Only a bounded window of blocks is read and in flight at once.
+        blocks = iter(lambda: f_in.read(COMPRESS_BLOCK_SIZE), b'')
+        window = self.workers * 2
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = []
+            for block in blocks:
+                pending.append(executor.submit(_gzip_member, block, self.level))
+                if len(pending) >= window:
+                    f_out.write(pending.pop(0).result())
+                    self._throttle(COMPRESS_BLOCK_SIZE)
+            for future in pending:
+                f_out.write(future.result())
+                self._throttle(COMPRESS_BLOCK_SIZE)
+    
+    def _open_decompressed(self, backup_file):
+        """Open a backup for streaming decompressed reads"""
+        if codec_for(backup_file) == 'zstd':
+            if zstandard is None:
+                raise ValueError("Restoring .zst backups requires the 'zstandard' package")
+            return zstandard.ZstdDecompressor().stream_reader(
+                open(backup_file, 'rb'), read_across_frames=True, closefd=True
+            )
+        # gzip.open reads concatenated members transparently
+        return gzip.open(backup_file, 'rb')
+    
+    def _swap_in(self, temp_path):
+        """Verify a restored database file and atomically rename it over the live one"""
+        conn = sqlite3.connect(temp_path)
+        try:
+            self._verify(conn)
+        finally:
+            conn.close()
+        
+        # Keep the previous database without copying it: a hard link to the old
+        # file survives the rename. Checkpoint first so no WAL is left behind.
+        current_backup = f"{self.db_path}.before_restore"
+        if os.path.exists(self.db_path):
+            conn = sqlite3.connect(self.db_path)
+            try:
+                conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            finally:
+                conn.close()
+            
+            if os.path.exists(current_backup):
+                os.remove(current_backup)
+            try:
+                os.link(self.db_path, current_backup)
+            except OSError:
+                shutil.copy2(self.db_path, current_backup)
+        
+        os.replace(temp_path, self.db_path)
+        for suffix in ('-wal', '-shm'):
+            if os.path.exists(self.db_path + suffix):
+                os.remove(self.db_path + suffix)
+        
+        return current_backup
+    
+    def create_backup(self, pages_per_step=BACKUP_PAGES_PER_STEP, step_sleep=BACKUP_STEP_SLEEP):
+        """Create a verified, compressed online backup of the database"""
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        backup_name = f"trading_journal_backup_{timestamp}.db"
-        backup_path = os.path.join(self.backup_dir, backup_name)
+        backup_name = f"trading_journal_backup_{timestamp}.db{CODEC_EXTENSIONS[self.codec]}"
+        compressed_path = os.path.join(self.backup_dir, backup_name)
+        # Written under a temp name so list_backups never sees a partial file
+        temp_path = f"{compressed_path}.tmp"
+        snapshot_path = os.path.join(self.backup_dir, f".{backup_name}.snapshot")
         
         try:
-            # Copy database
-            shutil.copy2(self.db_path, backup_path)
+            self._snapshot_file(snapshot_path, pages_per_step, step_sleep)
             
-            # Compress
-            compressed_path = f"{backup_path}.gz"
-            with open(backup_path, 'rb') as f_in:
-                with gzip.open(compressed_path, 'wb') as f_out:
-                    shutil.copyfileobj(f_in, f_out)
+            # Stream the snapshot into the compressor a block at a time
+            with open(snapshot_path, 'rb') as f_in, open(temp_path, 'wb') as f_out:
+                self._compress(f_in, f_out)
             
-            # Remove uncompressed
-            os.remove(backup_path)
+            os.replace(temp_path, compressed_path)
             
             print(f"✓ Backup created: {compressed_path}")
             return compressed_path
         except Exception as e:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
             print(f"✗ Backup failed: {e}")
             return None
+        finally:
+            self._remove_snapshot_file(snapshot_path)
     
     def restore_backup(self, backup_file):
         """Restore database from backup"""
+        # Decompress next to the database so the final rename is atomic
+        temp_path = f"{self.db_path}.restore.tmp"
+        
         try:
-            # Extract compressed backup
-            extracted_path = backup_file.replace('.gz', '')
-            with gzip.open(backup_file, 'rb') as f_in:
-                with open(extracted_path, 'wb') as f_out:
-                    shutil.copyfileobj(f_in, f_out)
-            
-            # Backup current database
-            current_backup = f"{self.db_path}.before_restore"
-            shutil.copy2(self.db_path, current_backup)
+            with self._open_decompressed(backup_file) as f_in:
+                with open(temp_path, 'wb') as f_out:
+                    shutil.copyfileobj(f_in, f_out, COPY_BUFFER_SIZE)
             
-            # Restore
-            shutil.copy2(extracted_path, self.db_path)
-            os.remove(extracted_path)
+            current_backup = self._swap_in(temp_path)
             
             print(f"✓ Database restored from: {backup_file}")
             print(f"  Previous database backed up to: {current_backup}")
             return True
         except Exception as e:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            print(f"✗ Restore failed: {e}")
+            return False
+    
+    # ---- Incremental snapshots (content-addressed chunk store) ----
+    
+    def _chunk_path(self, digest):
+        return os.path.join(self.chunk_dir, digest[:2], digest)
+    
+    def _write_chunk(self, digest, data):
+        """Store a chunk unless an identical one already exists; returns bytes written"""
+        path = self._chunk_path(digest)
+        if os.path.exists(path):
+            return 0
+        
+        self._throttle(len(data))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.tmp"
+        with gzip.open(temp_path, 'wb') as f_out:
+            f_out.write(data)
+        os.replace(temp_path, path)
+        return os.path.getsize(path)
+    
+    def create_incremental_backup(self, chunk_size=SNAPSHOT_CHUNK_SIZE,
+                                  pages_per_step=BACKUP_PAGES_PER_STEP,
+                                  step_sleep=BACKUP_STEP_SLEEP):
+        """Snapshot the database, storing only chunks not already in the chunk store"""
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        manifest_path = os.path.join(self.snapshot_dir, f"trading_journal_snapshot_{timestamp}.json")
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        snapshot_path = f"{manifest_path}.snapshot"
+        
+        try:
+            # Chunks written here are unreferenced until the manifest lands
+            with file_lock(self.chunk_lock_path, shared=True):
+                page_size = self._snapshot_file(snapshot_path, pages_per_step, step_sleep)
+                
+                file_hash = hashlib.sha256()
+                chunks = []
+                size = 0
+                new_chunks = 0
+                new_bytes = 0
+                
+                with open(snapshot_path, 'rb') as f_in:
+                    for chunk in iter(lambda: f_in.read(chunk_size), b''):
+                        file_hash.update(chunk)
+                        size += len(chunk)
+                        digest = hashlib.sha256(chunk).hexdigest()
+                        written = self._write_chunk(digest, chunk)
+                        if written:
+                            new_chunks += 1
+                            new_bytes += written
+                        chunks.append(digest)
+                
+                manifest = {
+                    'created': datetime.now().isoformat(),
+                    'size': size,
+                    'sha256': file_hash.hexdigest(),
+                    'page_size': page_size,
+                    'chunk_size': chunk_size,
+                    'chunks': chunks,
+                    'new_chunks': new_chunks,
+                    'new_bytes': new_bytes
+                }
+                
+                temp_path = f"{manifest_path}.tmp"
+                with open(temp_path, 'w') as f:
+                    json.dump(manifest, f)
+                os.replace(temp_path, manifest_path)
+            
+            print(f"✓ Snapshot created: {manifest_path}")
+            print(f"  {new_chunks}/{len(chunks)} chunks new ({round(new_bytes / 1024, 2)} KB stored)")
+            return manifest_path
+        except Exception as e:
+            print(f"✗ Snapshot failed: {e}")
+            return None
+        finally:
+            self._remove_snapshot_file(snapshot_path)
+    
+    def restore_snapshot(self, manifest_path):
+        """Reassemble a snapshot from the chunk store and swap it in"""
+        temp_path = f"{self.db_path}.restore.tmp"
+        
+        try:
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            
+            # Rebuild next to the database so the final rename is atomic
+            file_hash = hashlib.sha256()
+            with open(temp_path, 'wb') as f_out:
+                for digest in manifest['chunks']:
+                    with gzip.open(self._chunk_path(digest), 'rb') as f_in:
+                        chunk = f_in.read()
+                    if hashlib.sha256(chunk).hexdigest() != digest:
+                        raise ValueError(f"Chunk {digest} is corrupt")
+                    file_hash.update(chunk)
+                    f_out.write(chunk)
+            
+            if file_hash.hexdigest() != manifest['sha256']:
+                raise ValueError("Reassembled database does not match snapshot checksum")
+            
+            current_backup = self._swap_in(temp_path)
+            
+            print(f"✓ Database restored from snapshot: {manifest_path}")
+            print(f"  Previous database backed up to: {current_backup}")
+            return True
+        except Exception as e:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
             print(f"✗ Restore failed: {e}")
             return False
     
+    def list_snapshots(self):
+        """List all incremental snapshots, newest first"""
+        snapshots = []
+        if not os.path.isdir(self.snapshot_dir):
+            return snapshots
+        
+        for file in os.listdir(self.snapshot_dir):
+            if file.endswith('.json'):
+                filepath = os.path.join(self.snapshot_dir, file)
+                with open(filepath) as f:
+                    manifest = json.load(f)
+                snapshots.append({
+                    'filename': file,
+                    'path': filepath,
+                    'size_kb': round(manifest['size'] / 1024, 2),
+                    'new_kb': round(manifest['new_bytes'] / 1024, 2),
+                    'chunks': manifest['chunks'],
+                    'created': datetime.fromisoformat(manifest['created'])
+                })
+        
+        return sorted(snapshots, key=lambda x: x['created'], reverse=True)
+    
+    def collect_chunks(self):
+        """Delete chunks no remaining snapshot references; returns bytes freed.
+        
+        Waits for snapshots being written (in any process) to finish, so
+        their chunks are referenced by a manifest before anything is judged
+        unreferenced. Temp files left by crashed writers go too.
+        """
+        if not os.path.isdir(self.chunk_dir):
+            return 0
+        
+        with file_lock(self.chunk_lock_path):
+            referenced = set()
+            for snapshot in self.list_snapshots():
+                referenced.update(snapshot['chunks'])
+            
+            freed = 0
+            for prefix in os.scandir(self.chunk_dir):
+                if not prefix.is_dir():
+                    continue
+                for entry in os.scandir(prefix.path):
+                    if entry.name not in referenced:
+                        freed += entry.stat().st_size
+                        os.remove(entry.path)
+        return freed
+    
     def list_backups(self):
         """List all available backups"""
         backups = []
         for file in os.listdir(self.backup_dir):
-            if file.endswith('.db.gz'):
+            if file.endswith(('.db.gz', '.db.zst')):
                 filepath = os.path.join(self.backup_dir, file)
                 size = os.path.getsize(filepath) / 1024  # KB
                 backups.append({
@@ -75,10 +408,87 @@ class DatabaseBackup:
         return sorted(backups, key=lambda x: x['created'], reverse=True)
     
     def cleanup_old_backups(self, keep_count=10):
-        """Keep only the most recent N backups"""
+        """Keep only the most recent N backups and N snapshots"""
         backups = self.list_backups()
         
         if len(backups) > keep_count:
             for backup in backups[keep_count:]:
                 os.remove(backup['path'])
-                print(f"Removed old backup: {backup['filename']}")
\ No newline at end of file
+                print(f"Removed old backup: {backup['filename']}")
+        
+        snapshots = self.list_snapshots()
+        
+        if len(snapshots) > keep_count:
+            for snapshot in snapshots[keep_count:]:
+                os.remove(snapshot['path'])
+                print(f"Removed old snapshot: {snapshot['filename']}")
+        
+        freed = self.collect_chunks()
+        if freed:
+            print(f"Removed unreferenced chunks: {round(freed / 1024, 2)} KB")
+    
+    def apply_retention(self, hourly=24, daily=7, weekly=4):
+        """Grandfather-father-son retention across full backups and snapshots.
+        
+        Keeps the newest backup in each of the last `hourly` hours, `daily`
+        days and `weekly` ISO weeks; everything else is removed.
+        """
+        entries = sorted(
+            self.list_backups() + self.list_snapshots(),
+            key=lambda x: x['created'],
+            reverse=True
+        )
+        
+        keep = set()
+        for bucket_format, count in (('%Y-%m-%d %H', hourly), ('%Y-%m-%d', daily), ('%G-W%V', weekly)):
+            buckets = set()
+            for entry in entries:
+                bucket = entry['created'].strftime(bucket_format)
+                if bucket in buckets:
+                    continue
+                if len(buckets) >= count:
+                    break
+                buckets.add(bucket)
+                keep.add(entry['path'])
+        
+        removed = 0
+        for entry in entries:
+            if entry['path'] not in keep:
+                os.remove(entry['path'])
+                removed += 1
+                print(f"Removed expired backup: {entry['filename']}")
+        
+        self.collect_chunks()
+        return removed
+    
+    def backup_screenshots(self, upload_folder):
+        """Copy screenshot files not yet in backups/screenshots; returns files copied.
+        
+        Screenshot filenames are timestamped and never rewritten, so a file
+        already present in the backup folder is skipped without reading it.
+        """
+        target_dir = os.path.join(self.backup_dir, 'screenshots')
+        os.makedirs(target_dir, exist_ok=True)
+        
+        with os.scandir(target_dir) as entries:
+            existing = {entry.name for entry in entries}
+        
+        copied = 0
+        with os.scandir(upload_folder) as entries:
+            for entry in entries:
+                if entry.name.startswith('.') or not entry.is_file() or entry.name in existing:
+                    continue
+                
+                temp_path = os.path.join(target_dir, f".{entry.name}.tmp")
+                with open(entry.path, 'rb') as f_in, open(temp_path, 'wb') as f_out:
+                    while True:
+                        block = f_in.read(COPY_BUFFER_SIZE)
+                        if not block:
+                            break
+                        f_out.write(block)
+                        self._throttle(len(block))
+                shutil.copystat(entry.path, temp_path)
+                os.replace(temp_path, os.path.join(target_dir, entry.name))
+                copied += 1
+        
+        return copied
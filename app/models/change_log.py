@@ -0,0 +1,146 @@
+import sqlite3
+import time
+
+# Changes older than this are dropped; clients that haven't synced since resync
+RETENTION_DAYS = 30
+# trade_id of a log row telling all of a user's clients to reload everything
+RESET_TRADE_ID = 0
+COMPACT_BATCH_SIZE = 5000
+
+def latest_change(conn, schema='main'):
+    """Highest sequence number handed out so far (0 for an empty log).
+
+    AUTOINCREMENT keeps this monotonic even after compaction deletes the
+    newest rows, so a cursor is never handed out twice.
+    """
+    row = conn.execute(
+        f"SELECT seq FROM {schema}.sqlite_sequence WHERE name = 'trade_changes'"
+    ).fetchone()
+    return row[0] if row else 0
+
+def pruned_through(conn):
+    """Cursors at or below this sequence number can no longer be synced"""
+    row = conn.execute("SELECT value FROM change_log_state WHERE key = 'pruned_through'").fetchone()
+    return int(row[0]) if row else 0
+
+def user_version(conn, user_id):
+    """Changes whenever any of `user_id`'s trades (or their tags) change.
+
+    The user's newest sequence number. Once expiry has dropped all of their
+    rows the pruned position stands in: it is at least as high, and nothing
+    of theirs changed since.
+    """
+    row = conn.execute('SELECT MAX(seq) FROM trade_changes WHERE user_id = ?', (user_id,)).fetchone()
+    return row[0] if row[0] is not None else pruned_through(conn)
+
+def log_change(conn, trade_id, user_id, op, schema='main'):
+    """Record a change the triggers can't see (archived trades, resets)"""
+    conn.execute(
+        f'INSERT INTO {schema}.trade_changes (trade_id, user_id, op) VALUES (?, ?, ?)',
+        (trade_id, user_id, op)
+    )
+
+def changes_since(conn, user_id, since, limit=500):
+    """The latest change per trade of `user_id` after cursor `since`.
+
+    Returns {'reset', 'cursor', 'has_more', 'changes': [(trade_id, op), ...]}.
+    reset means the cursor can't be synced (0, pruned, or from before the
+    user's trades moved) and the client must reload the full list; cursor
+    is then the position to continue from after that reload.
+    """
+    latest = latest_change(conn)
+    reset = since <= pruned_through(conn) or since > latest or conn.execute(
+        'SELECT 1 FROM trade_changes WHERE user_id = ? AND trade_id = ? AND seq > ?',
+        (user_id, RESET_TRADE_ID, since)
+    ).fetchone() is not None
+    if reset:
+        return {'reset': True, 'cursor': latest, 'has_more': False, 'changes': []}
+
+    # One row per trade: SQLite takes op from the row holding MAX(seq)
+    rows = conn.execute('''
+        SELECT trade_id, op, MAX(seq) FROM trade_changes
+        WHERE user_id = ? AND seq > ?
+        GROUP BY trade_id
+        ORDER BY MAX(seq)
+        LIMIT ?
+    ''', (user_id, since, limit + 1)).fetchall()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if has_more:
+        cursor = rows[-1][2]
+    else:
+        cursor = max(latest, rows[-1][2]) if rows else latest
+    return {
+        'reset': False,
+        'cursor': cursor,
+        'has_more': has_more,
+        'changes': [(row[0], row[1]) for row in rows]
+    }
+
+class TradeChangeLog:
+    """Compaction of the trigger-maintained trade_changes log.
+
+    Only the newest change per trade matters to a client (it re-reads the
+    trade, or drops it), so older rows for the same trade are removed.
+    Rows older than the retention period go too; the highest pruned
+    sequence number is recorded so older cursors are told to resync.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+
+    def get_connection(self):
+        # Autocommit: each batch is its own short write transaction
+        return sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+
+    def compact(self, retention_days=RETENTION_DAYS, batch_size=COMPACT_BATCH_SIZE, pause=0.01):
+        """Remove superseded and expired rows; returns counts of each"""
+        conn = self.get_connection()
+        superseded = expired = 0
+
+        try:
+            last = latest_change(conn)
+            start = conn.execute('SELECT COALESCE(MIN(seq), 1) FROM trade_changes').fetchone()[0]
+
+            while start <= last:
+                end = start + batch_size - 1
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    superseded += conn.execute('''
+                        DELETE FROM trade_changes
+                        WHERE seq BETWEEN ? AND ? AND EXISTS (
+                            SELECT 1 FROM trade_changes newer
+                            WHERE newer.trade_id = trade_changes.trade_id
+                              AND newer.user_id IS trade_changes.user_id
+                              AND newer.seq > trade_changes.seq
+                        )
+                    ''', (start, end)).rowcount
+                    conn.execute('COMMIT')
+                except Exception:
+                    conn.execute('ROLLBACK')
+                    raise
+                start = end + 1
+                # Let app writers in between batches
+                time.sleep(pause)
+
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                floor = conn.execute(
+                    "SELECT MAX(seq) FROM trade_changes WHERE changed_at < datetime('now', ?)",
+                    (f'-{retention_days} days',)
+                ).fetchone()[0]
+                if floor:
+                    expired = conn.execute('DELETE FROM trade_changes WHERE seq <= ?', (floor,)).rowcount
+                    conn.execute('''
+                        INSERT INTO change_log_state (key, value) VALUES ('pruned_through', ?)
+                        ON CONFLICT(key) DO UPDATE SET value = excluded.value
+                    ''', (floor,))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        finally:
+            conn.close()
+
+        return {'superseded': superseded, 'expired': expired}
@@ -2,16 +2,142 @@ import sqlite3
 from datetime import datetime
 import os
 
+# Columns derived from other trade fields. Stored (not computed per query) so
+# statistics can filter, group and index on them. Every write path and the
+# backfill use this one definition so the values never disagree.
+# Derived column -> SQL expression over its {placeholder} inputs
+DERIVED_TRADE_EXPRESSIONS = {
+    'r_multiple': 'CASE WHEN {profit_loss} IS NOT NULL AND {risk_amount} > 0 '
+                  'THEN {profit_loss} / {risk_amount} END',
+    'exit_date': 'date({exit_time})',
+    'entry_hour': "CAST(strftime('%H', {entry_time}) AS INTEGER)",
+    'entry_weekday': "CAST(strftime('%w', {entry_time}) AS INTEGER)",
+    'holding_minutes': 'CASE WHEN {exit_time} IS NOT NULL '
+                       'THEN ROUND((julianday({exit_time}) - julianday({entry_time})) * 1440, 1) END'
+}
+DERIVED_TRADE_INPUTS = ('profit_loss', 'risk_amount', 'exit_time', 'entry_time')
+
+def derived_trade_expressions(**sources):
+    """Derived column -> SQL, reading each input from `sources` when given.
+
+    Inputs default to the stored columns. Writes pass the values being
+    written instead (e.g. profit_loss=':profit_loss'), since an UPDATE's
+    expressions see the row as it was, and an INSERT has no row yet.
+    """
+    names = {column: sources.get(column, column) for column in DERIVED_TRADE_INPUTS}
+    return {column: expression.format(**names) for column, expression in DERIVED_TRADE_EXPRESSIONS.items()}
+
+def derived_trade_assignments(**sources):
+    """The derived columns as UPDATE ... SET assignments"""
+    return ',\n'.join(f'{column} = {expression}' for column, expression in derived_trade_expressions(**sources).items())
+
+DERIVED_TRADE_COLUMNS = derived_trade_assignments()
+
+# Trade tables, shared by the main database and per-user shard files
+TRADES_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS trades (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL DEFAULT 1,
+        pair TEXT NOT NULL,
+        session TEXT NOT NULL,
+        timeframe TEXT NOT NULL,
+        setup_type TEXT NOT NULL,
+        trade_type TEXT NOT NULL,
+        entry_price REAL NOT NULL,
+        stop_loss REAL NOT NULL,
+        take_profit REAL NOT NULL,
+        position_size REAL NOT NULL,
+        risk_amount REAL NOT NULL,
+        reward_amount REAL NOT NULL,
+        risk_reward_ratio REAL NOT NULL,
+        risk_percentage REAL,
+        confidence INTEGER,
+        emotion_before TEXT,
+        rule_followed INTEGER DEFAULT 1,
+        entry_time TIMESTAMP NOT NULL,
+        exit_time TIMESTAMP,
+        exit_price REAL,
+        profit_loss REAL,
+        status TEXT DEFAULT 'open',
+        notes TEXT,
+        screenshot_before TEXT,
+        screenshot_after TEXT,
+        r_multiple REAL,
+        exit_date TEXT,
+        entry_hour INTEGER,
+        entry_weekday INTEGER,
+        holding_minutes REAL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+    )
+'''
+
+TRADE_TAGS_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS trade_tags (
+        trade_id INTEGER,
+        tag_id   INTEGER,
+        FOREIGN KEY (trade_id) REFERENCES trades(id) ON DELETE CASCADE,
+        FOREIGN KEY (tag_id)   REFERENCES tags(id)   ON DELETE CASCADE,
+        PRIMARY KEY (trade_id, tag_id)
+    )
+'''
+
+def data_version(conn, name):
+    """Write counter of a global table ('tags'), bumped by triggers on every change.
+
+    Also resolves on shard connections, through the attached global database.
+    """
+    row = conn.execute('SELECT version FROM data_versions WHERE name = ?', (name,)).fetchone()
+    return row[0] if row else 0
+
+def tuple_cursor(conn):
+    """A cursor returning plain tuples instead of sqlite3.Row objects.
+
+    For queries reading many rows: select only the columns needed and pick
+    them by position. Tuples are smaller and cheaper to build than Rows,
+    let alone a dict per row.
+    """
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    return cursor
+
+def iter_dicts(cursor, batch_size=1000):
+    """Rows of an executed tuple cursor as dicts, built a batch at a time.
+
+    Only rows headed for a JSON response need this; nothing holds the
+    whole result as Rows next to the dicts made from them.
+    """
+    columns = [column[0] for column in cursor.description]
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        for row in rows:
+            yield dict(zip(columns, row))
+
 class Database:
+    # Paths whose tables were already created by this process
+    _initialized = set()
+    # Swapped for a tracing connection class when metrics are enabled
+    connection_factory = sqlite3.Connection
+
     def __init__(self, db_path):
         self.db_path = db_path
-        self.init_db()
+        # Routes build a Database per request; only the first one pays for init_db
+        if db_path not in Database._initialized:
+            self.init_db()
+            Database._initialized.add(db_path)
 
     def get_connection(self):
-        conn = sqlite3.connect(self.db_path)
+        conn = sqlite3.connect(self.db_path, factory=self.connection_factory)
         conn.row_factory = sqlite3.Row
         return conn
 
+    @staticmethod
+    def refresh_derived_columns(cursor, where, params=()):
+        """Recompute derived trade columns for rows matching `where` (backfills and bulk loads)"""
+        cursor.execute(f'UPDATE trades SET {DERIVED_TRADE_COLUMNS} WHERE {where}', params)
+
     def init_db(self):
         """Create tables if they don't exist"""
         conn = self.get_connection()
@@ -41,49 +167,10 @@ class Database:
         ''')
 
         # Trades table (with user_id)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS trades (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL DEFAULT 1,
-                pair TEXT NOT NULL,
-                session TEXT NOT NULL,
-                timeframe TEXT NOT NULL,
-                setup_type TEXT NOT NULL,
-                trade_type TEXT NOT NULL,
-                entry_price REAL NOT NULL,
-                stop_loss REAL NOT NULL,
-                take_profit REAL NOT NULL,
-                position_size REAL NOT NULL,
-                risk_amount REAL NOT NULL,
-                reward_amount REAL NOT NULL,
-                risk_reward_ratio REAL NOT NULL,
-                risk_percentage REAL,
-                confidence INTEGER,
-                emotion_before TEXT,
-                rule_followed INTEGER DEFAULT 1,
-                entry_time TIMESTAMP NOT NULL,
-                exit_time TIMESTAMP,
-                exit_price REAL,
-                profit_loss REAL,
-                status TEXT DEFAULT 'open',
-                notes TEXT,
-                screenshot_before TEXT,
-                screenshot_after TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-            )
-        ''')
+        cursor.execute(TRADES_TABLE_SQL)
 
         # Trade tags junction table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS trade_tags (
-                trade_id INTEGER,
-                tag_id   INTEGER,
-                FOREIGN KEY (trade_id) REFERENCES trades(id) ON DELETE CASCADE,
-                FOREIGN KEY (tag_id)   REFERENCES tags(id)   ON DELETE CASCADE,
-                PRIMARY KEY (trade_id, tag_id)
-            )
-        ''')
+        cursor.execute(TRADE_TAGS_TABLE_SQL)
 
         # Default mistake tags
         default_tags = [
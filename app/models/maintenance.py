@@ -0,0 +1,283 @@
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows desktop mode runs a single process
+    fcntl = None
+
+AUTO_VACUUM_MODES = {0: 'none', 1: 'full', 2: 'incremental'}
+VACUUM_STEP_PAGES = 500
+VACUUM_STEP_SLEEP = 0.01
+# Rows sampled per index by PRAGMA optimize in the background run
+ANALYSIS_LIMIT = 1000
+
+class DatabaseMaintenance:
+    """Planner statistics, space reclamation and storage reports.
+
+    Work is done in short steps on a dedicated connection so the app keeps
+    serving requests while maintenance runs. The one exception is switching
+    an existing database to incremental auto-vacuum, which needs a single
+    full VACUUM (exclusive lock, temporary copy of the file).
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+
+    def get_connection(self):
+        # Autocommit, so every PRAGMA step is its own short transaction
+        return sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+
+    def pragma(self, conn, name):
+        return conn.execute(f'PRAGMA {name}').fetchone()[0]
+
+    def page_stats(self, conn=None):
+        own = conn is None
+        conn = conn or self.get_connection()
+        try:
+            page_size = self.pragma(conn, 'page_size')
+            page_count = self.pragma(conn, 'page_count')
+            freelist = self.pragma(conn, 'freelist_count')
+            return {
+                'page_size': page_size,
+                'page_count': page_count,
+                'freelist_count': freelist,
+                'file_mb': round(page_size * page_count / (1024 * 1024), 2),
+                'free_mb': round(page_size * freelist / (1024 * 1024), 2),
+                'auto_vacuum': AUTO_VACUUM_MODES.get(self.pragma(conn, 'auto_vacuum')),
+                'journal_mode': self.pragma(conn, 'journal_mode')
+            }
+        finally:
+            if own:
+                conn.close()
+
+    def analyze(self, full=False):
+        """Refresh planner statistics.
+
+        The default is PRAGMA optimize with a sampling limit, which only
+        re-analyzes tables whose statistics are stale. A file with no
+        statistics yet (e.g. a fresh shard) gets an ANALYZE under the same
+        sampling limit. Only full=True runs a complete, unbounded ANALYZE.
+        """
+        conn = self.get_connection()
+        started = time.perf_counter()
+        try:
+            has_stats = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"
+            ).fetchone()
+            if full:
+                conn.execute('ANALYZE')
+                mode = 'analyze'
+            elif not has_stats:
+                conn.execute(f'PRAGMA analysis_limit = {ANALYSIS_LIMIT}')
+                conn.execute('ANALYZE')
+                mode = 'sampled analyze'
+            else:
+                conn.execute(f'PRAGMA analysis_limit = {ANALYSIS_LIMIT}')
+                conn.execute('PRAGMA optimize')
+                mode = 'optimize'
+        finally:
+            conn.close()
+        return {'mode': mode, 'seconds': round(time.perf_counter() - started, 3)}
+
+    def enable_incremental_vacuum(self):
+        """Switch to auto_vacuum=INCREMENTAL; returns False if it already was.
+
+        The mode only changes through a full VACUUM, so this rewrites the
+        whole file once. Later runs reclaim space in small steps instead.
+        """
+        conn = self.get_connection()
+        try:
+            if self.pragma(conn, 'auto_vacuum') == 2:
+                return False
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            conn.execute('VACUUM')
+            return True
+        finally:
+            conn.close()
+
+    def incremental_vacuum(self, max_pages=None, step_pages=VACUUM_STEP_PAGES, step_sleep=VACUUM_STEP_SLEEP):
+        """Return free pages to the filesystem in small steps.
+
+        Each step is its own write transaction and the sleep between steps
+        lets app writers in. Does nothing unless auto_vacuum is INCREMENTAL.
+        """
+        conn = self.get_connection()
+        reclaimed = 0
+        try:
+            if self.pragma(conn, 'auto_vacuum') != 2:
+                return 0
+
+            while max_pages is None or reclaimed < max_pages:
+                free = self.pragma(conn, 'freelist_count')
+                if free == 0:
+                    break
+                step = min(step_pages, free)
+                if max_pages is not None:
+                    step = min(step, max_pages - reclaimed)
+                # The pragma works while its rows are stepped, so drain them
+                conn.execute(f'PRAGMA incremental_vacuum({step})').fetchall()
+                reclaimed += free - self.pragma(conn, 'freelist_count')
+                time.sleep(step_sleep)
+        finally:
+            conn.close()
+        return reclaimed
+
+    def checkpoint(self):
+        """Checkpoint and truncate the WAL (no-op in rollback journal mode)"""
+        conn = self.get_connection()
+        try:
+            if self.pragma(conn, 'journal_mode') != 'wal':
+                return None
+            busy, log_pages, checkpointed = conn.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchone()
+            return {'busy': bool(busy), 'log_pages': log_pages, 'checkpointed': checkpointed}
+        finally:
+            conn.close()
+
+    def space_report(self):
+        """Size and fragmentation per table and index (needs the dbstat table).
+
+        unused_pct is free space inside the object's pages; scattered_pct is
+        the share of leaf pages that don't directly follow the previous leaf
+        in key order, i.e. how far a scan jumps around the file.
+        """
+        conn = self.get_connection()
+        try:
+            try:
+                rows = conn.execute('''
+                    SELECT name, COUNT(*), SUM(pgsize), SUM(unused)
+                    FROM dbstat GROUP BY name
+                ''').fetchall()
+            except sqlite3.OperationalError:
+                return None  # SQLite built without SQLITE_ENABLE_DBSTAT_VTAB
+
+            types = dict(conn.execute('SELECT name, type FROM sqlite_master').fetchall())
+            report = {
+                name: {
+                    'name': name,
+                    'type': types.get(name, 'table'),
+                    'pages': pages,
+                    'mb': round(size / (1024 * 1024), 2),
+                    'unused_pct': round(unused / size * 100, 1) if size else 0.0,
+                    'scattered_pct': 0.0
+                }
+                for name, pages, size, unused in rows
+            }
+
+            # Walk leaf pages in b-tree order and count jumps
+            name = previous = None
+            leaves = jumps = 0
+            cursor = conn.execute("SELECT name, pageno FROM dbstat WHERE pagetype = 'leaf' ORDER BY name, path")
+            for leaf_name, pageno in cursor:
+                if leaf_name != name:
+                    if name in report and leaves > 1:
+                        report[name]['scattered_pct'] = round(jumps / (leaves - 1) * 100, 1)
+                    name, previous, leaves, jumps = leaf_name, None, 0, 0
+                if previous is not None and pageno != previous + 1:
+                    jumps += 1
+                previous = pageno
+                leaves += 1
+            if name in report and leaves > 1:
+                report[name]['scattered_pct'] = round(jumps / (leaves - 1) * 100, 1)
+
+            return sorted(report.values(), key=lambda item: item['pages'], reverse=True)
+        finally:
+            conn.close()
+
+    def run(self, vacuum_pages=None, full_analyze=False, convert=True):
+        """Full maintenance pass; returns what each step did"""
+        result = {'started_at': datetime.now().isoformat(), 'before': self.page_stats()}
+
+        if convert:
+            result['converted_to_incremental'] = self.enable_incremental_vacuum()
+        result['pages_reclaimed'] = self.incremental_vacuum(max_pages=vacuum_pages)
+        result['analyze'] = self.analyze(full=full_analyze)
+        result['checkpoint'] = self.checkpoint()
+        result['after'] = self.page_stats()
+        return result
+
+def compact_change_logs(db_path):
+    """Compact the trade change log of every database holding trades (all shards)"""
+    from app.models.change_log import TradeChangeLog
+    from app.models.sharding import get_router
+
+    totals = {'superseded': 0, 'expired': 0}
+    for database in get_router(db_path).databases():
+        result = TradeChangeLog(database.db_path).compact()
+        for key in totals:
+            totals[key] += result[key]
+    return totals
+
+class MaintenanceScheduler:
+    """Background maintenance at low priority: optimize, bounded vacuum, checkpoint.
+
+    Never converts the database or runs a full VACUUM - that's for
+    `python manage.py db-maintain` during a quiet period.
+    """
+
+    def __init__(self, db_path, interval_hours=24, vacuum_pages=2000):
+        self.maintenance = DatabaseMaintenance(db_path)
+        self.interval_seconds = interval_hours * 3600
+        self.vacuum_pages = vacuum_pages
+        self._lock_path = f'{db_path}.maintenance.lock'
+        self._lock_file = None
+        self._stop = threading.Event()
+
+    def _acquire_lock(self):
+        """One process (of several preforked workers) does the work"""
+        if fcntl is None:
+            return True
+        if self._lock_file is None:
+            self._lock_file = open(self._lock_path, 'w')
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            return False
+
+    def run_once(self):
+        from app.models.sharding import get_router
+
+        # Compact first, so the vacuum step can hand the freed pages back
+        change_log = compact_change_logs(self.maintenance.db_path)
+        result = self.maintenance.run(vacuum_pages=self.vacuum_pages, convert=False)
+        # Once sharded, the trades live in the shard files
+        result['shards'] = {
+            shard_path: DatabaseMaintenance(shard_path).run(vacuum_pages=self.vacuum_pages, convert=False)
+            for shard_path in get_router(self.maintenance.db_path).shard_paths()
+        }
+        result['change_log'] = change_log
+        return result
+
+    def run_forever(self):
+        # Lower this thread's CPU priority where the OS supports per-thread nice
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 10)
+        except (AttributeError, OSError):
+            pass
+
+        while not self._stop.wait(self.interval_seconds):
+            if not self._acquire_lock():
+                continue
+            try:
+                result = self.run_once()
+                reclaimed = result['pages_reclaimed'] + sum(
+                    shard['pages_reclaimed'] for shard in result['shards'].values()
+                )
+                print(f"[{datetime.now().isoformat()}] Database maintenance "
+                      f"({1 + len(result['shards'])} files): "
+                      f"{reclaimed} pages reclaimed, {result['analyze']['mode']}, "
+                      f"{sum(result['change_log'].values())} change log rows compacted")
+            except Exception as e:
+                print(f"Database maintenance failed: {e}")
+
+    def start_thread(self):
+        thread = threading.Thread(target=self.run_forever, name='db-maintenance', daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self._stop.set()
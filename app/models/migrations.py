@@ -1,17 +1,103 @@
 import sqlite3
 import os
+import time
+import threading
+from contextlib import contextmanager
 from datetime import datetime
+from app.models.database import DERIVED_TRADE_COLUMNS
+from app.models.change_log import latest_change
+
+try:
+    import fcntl
+except ImportError:  # Windows desktop mode runs a single process
+    fcntl = None
+
+@contextmanager
+def file_lock(path, shared=False):
+    """Inter-process lock held for the duration of the block.
+
+    Exclusive by default; `shared` holders only exclude exclusive ones.
+    """
+    if fcntl is None:
+        yield
+        return
+
+    with open(path, 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
 
 class Migration:
-    def __init__(self, db_path):
+    """Schema migrations.
+
+    The number of applied migrations is stored in PRAGMA user_version, so an
+    up-to-date database costs one connection and one PRAGMA read at startup.
+    Pending migrations run together in a single transaction on one connection.
+
+    Shard files (shard=True) hold only trade tables; migrations of the
+    global tables (users, jobs, shard layout) are recorded there as no-ops.
+    """
+
+    def __init__(self, db_path, shard=False):
         self.db_path = db_path
+        self.shard = shard
         self.migrations_table = 'schema_migrations'
-        self._ensure_migrations_table()
-    
-    def _ensure_migrations_table(self):
+        self.migrations = [
+            ('001_add_user_id_to_trades', self.migration_001),
+            ('002_add_confidence_fields', self.migration_002),
+            ('003_add_user_plan', self.migration_003),
+            ('004_add_screenshot_jobs', self.migration_004),
+            ('005_add_backfill_progress', self.migration_005),
+            ('006_add_derived_trade_columns', self.migration_006),
+            ('007_add_archive_state', self.migration_007),
+            ('008_add_sharding', self.migration_008),
+            ('009_add_trade_change_log', self.migration_009),
+            ('010_add_data_versions', self.migration_010),
+            ('011_add_trade_search', self.migration_011)
+        ]
+        # Data backfills: (name, table, UPDATE ... WHERE id BETWEEN ? AND ?).
+        # They run in small id-ranged batches after the schema migrations,
+        # so large tables are never locked by one giant UPDATE.
+        self.backfills = [
+            (
+                '006_backfill_derived_trade_columns',
+                'trades',
+                f'UPDATE trades SET {DERIVED_TRADE_COLUMNS} WHERE id BETWEEN ? AND ?'
+            ),
+            (
+                '011_backfill_trade_notes_search',
+                'trades',
+                # Triggers index rows written since migration 011; skip those
+                '''INSERT INTO trades_fts (rowid, notes)
+                   SELECT id, notes FROM trades
+                   WHERE id BETWEEN ? AND ? AND notes <> ''
+                     AND NOT EXISTS (SELECT 1 FROM trades_fts WHERE rowid = trades.id)'''
+            )
+        ]
+
+    @property
+    def latest_version(self):
+        return len(self.migrations)
+
+    def get_connection(self):
+        # Autocommit mode: transactions are managed explicitly with BEGIN/COMMIT
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.isolation_level = None
+        return conn
+
+    def current_version(self, conn=None):
+        """Schema version recorded in the database header"""
+        own_conn = conn is None
+        conn = conn or self.get_connection()
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        if own_conn:
+            conn.close()
+        return version
+
+    def _ensure_migrations_table(self, cursor):
         """Create migrations tracking table"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS schema_migrations (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -19,114 +105,437 @@ class Migration:
                 applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         ''')
-        conn.commit()
-        conn.close()
-    
-    def is_applied(self, version):
-        """Check if migration has been applied"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute(
-            'SELECT version FROM schema_migrations WHERE version = ?',
-            (version,)
-        )
-        result = cursor.fetchone()
-        conn.close()
-        return result is not None
-    
-    def mark_applied(self, version):
-        """Mark migration as applied"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        try:
-            cursor.execute(
-                'INSERT INTO schema_migrations (version) VALUES (?)',
-                (version,)
-            )
-            conn.commit()
-        except sqlite3.IntegrityError:
-            # Already applied
-            pass
-        conn.close()
-    
-    def column_exists(self, table, column):
+
+    def applied_versions(self, cursor):
+        """Versions recorded in schema_migrations (databases predating user_version)"""
+        cursor.execute('SELECT version FROM schema_migrations')
+        return {row[0] for row in cursor.fetchall()}
+
+    def column_exists(self, cursor, table, column):
         """Check if column exists in table"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
         cursor.execute(f"PRAGMA table_info({table})")
         columns = [row[1] for row in cursor.fetchall()]
-        conn.close()
         return column in columns
-    
-    def run_migration(self, version, migration_func):
-        """Run a migration function"""
-        if self.is_applied(version):
-            print(f"Migration {version} already applied, skipping...")
-            return
-        
-        print(f"Running migration {version}...")
-        
+
+    def pending_migrations(self):
+        """Versions not yet applied"""
+        conn = self.get_connection()
         try:
-            migration_func()
-            self.mark_applied(version)
-            print(f"✓ Migration {version} completed successfully")
-        except Exception as e:
-            print(f"✗ Migration {version} failed: {e}")
-            # Don't raise - allow other migrations to run
-    
-    def run_all_migrations(self):
-        """Run all pending migrations"""
-        
-        # Migration 001: Add user_id to trades
-        def migration_001():
-            if not self.column_exists('trades', 'user_id'):
-                conn = sqlite3.connect(self.db_path)
-                cursor = conn.cursor()
-                cursor.execute('ALTER TABLE trades ADD COLUMN user_id INTEGER DEFAULT 1')
-                cursor.execute('CREATE INDEX IF NOT EXISTS idx_trades_user_id ON trades(user_id)')
-                conn.commit()
-                conn.close()
-        
-        # Migration 002: Add confidence fields
-        def migration_002():
-            conn = sqlite3.connect(self.db_path)
+            if self.current_version(conn) >= self.latest_version:
+                return []
             cursor = conn.cursor()
-            
-            if not self.column_exists('trades', 'confidence'):
-                cursor.execute('ALTER TABLE trades ADD COLUMN confidence INTEGER')
-            if not self.column_exists('trades', 'emotion_before'):
-                cursor.execute('ALTER TABLE trades ADD COLUMN emotion_before TEXT')
-            if not self.column_exists('trades', 'rule_followed'):
-                cursor.execute('ALTER TABLE trades ADD COLUMN rule_followed INTEGER DEFAULT 1')
-            if not self.column_exists('trades', 'risk_percentage'):
-                cursor.execute('ALTER TABLE trades ADD COLUMN risk_percentage REAL')
-            
-            conn.commit()
+            self._ensure_migrations_table(cursor)
+            applied = self.applied_versions(cursor)
+            return [version for version, _ in self.migrations if version not in applied]
+        finally:
             conn.close()
-        
-        # Migration 003: Add user plan fields
-        def migration_003():
-            conn = sqlite3.connect(self.db_path)
+
+    def run_all_migrations(self, verbose=True):
+        """Run all pending migrations"""
+        conn = self.get_connection()
+        try:
+            # Fast path: nothing to do, no lock, no output
+            if self.current_version(conn) >= self.latest_version:
+                return []
+        finally:
+            conn.close()
+
+        # Preforked workers all start at once - only one of them migrates
+        with file_lock(f"{self.db_path}.migrate.lock"):
+            conn = self.get_connection()
             cursor = conn.cursor()
-            
-            if not self.column_exists('users', 'plan'):
-                cursor.execute("ALTER TABLE users ADD COLUMN plan TEXT DEFAULT 'free'")
-            if not self.column_exists('users', 'is_active'):
-                cursor.execute('ALTER TABLE users ADD COLUMN is_active INTEGER DEFAULT 1')
-            if not self.column_exists('users', 'last_login'):
-                cursor.execute('ALTER TABLE users ADD COLUMN last_login TIMESTAMP')
-            
-            conn.commit()
+            try:
+                # Another process may have finished while we waited for the lock
+                if self.current_version(conn) >= self.latest_version:
+                    return []
+
+                cursor.execute('BEGIN IMMEDIATE')
+                self._ensure_migrations_table(cursor)
+                applied = self.applied_versions(cursor)
+                ran = []
+
+                for version, migration_func in self.migrations:
+                    if version in applied:
+                        continue
+                    if verbose:
+                        print(f"Running migration {version}...")
+                    migration_func(cursor)
+                    cursor.execute(
+                        'INSERT INTO schema_migrations (version) VALUES (?)',
+                        (version,)
+                    )
+                    ran.append(version)
+
+                # PRAGMA user_version is part of the transaction
+                cursor.execute(f'PRAGMA user_version = {self.latest_version}')
+                cursor.execute('COMMIT')
+            except Exception as e:
+                cursor.execute('ROLLBACK')
+                print(f"✗ Migrations failed, rolled back: {e}")
+                raise
+            finally:
+                conn.close()
+
+        for version in ran if verbose else ():
+            print(f"✓ Migration {version} completed successfully")
+        return ran
+
+    # ---- Batched online backfills ----
+
+    def _backfill_row(self, cursor, name):
+        cursor.execute('SELECT * FROM backfill_progress WHERE name = ?', (name,))
+        row = cursor.fetchone()
+        if not row:
+            return None
+        columns = [description[0] for description in cursor.description]
+        return dict(zip(columns, row))
+
+    def run_backfill(self, name, table, sql, batch_size=1000, max_rows_per_second=None):
+        """Run one backfill to completion, resuming from its last checkpoint.
+
+        Each batch covers an id range and commits together with its checkpoint,
+        so an interrupted backfill picks up at the next unprocessed id. The
+        target id is fixed when the backfill first starts; rows inserted later
+        are expected to be populated by the write path. Backfills don't
+        count as trade changes, so nothing they touch is left in the change log.
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            progress = self._backfill_row(cursor, name)
+            if progress and progress['completed_at']:
+                return progress
+
+            if not progress:
+                cursor.execute(f'SELECT COALESCE(MIN(id), 1) - 1, COALESCE(MAX(id), 0) FROM {table}')
+                last_id, max_id = cursor.fetchone()
+                now = datetime.now().isoformat()
+                cursor.execute('''
+                    INSERT INTO backfill_progress (name, last_id, max_id, rows_done, started_at, updated_at)
+                    VALUES (?, ?, ?, 0, ?, ?)
+                ''', (name, last_id, max_id, now, now))
+                progress = self._backfill_row(cursor, name)
+
+            last_id = progress['last_id']
+            max_id = progress['max_id']
+
+            while last_id < max_id:
+                started = time.monotonic()
+                end_id = min(last_id + batch_size, max_id)
+
+                # Short write transaction: one batch plus its checkpoint
+                cursor.execute('BEGIN IMMEDIATE')
+                try:
+                    logged = latest_change(conn)
+                    cursor.execute(sql, (last_id + 1, end_id))
+                    rows = max(cursor.rowcount, 0)
+                    # Recomputed columns aren't edits: keep the change log triggers'
+                    # rows out of it, or sync clients would refetch all history
+                    cursor.execute('DELETE FROM trade_changes WHERE seq > ?', (logged,))
+                    cursor.execute('''
+                        UPDATE backfill_progress
+                        SET last_id = ?, rows_done = rows_done + ?, updated_at = ?
+                        WHERE name = ?
+                    ''', (end_id, rows, datetime.now().isoformat(), name))
+                    cursor.execute('COMMIT')
+                except Exception:
+                    cursor.execute('ROLLBACK')
+                    raise
+
+                last_id = end_id
+
+                # Rate limit, which also gives other writers a turn at the lock
+                if max_rows_per_second:
+                    remaining = batch_size / max_rows_per_second - (time.monotonic() - started)
+                    if remaining > 0:
+                        time.sleep(remaining)
+
+            now = datetime.now().isoformat()
+            cursor.execute(
+                'UPDATE backfill_progress SET completed_at = ?, updated_at = ? WHERE name = ?',
+                (now, now, name)
+            )
+            return self._backfill_row(cursor, name)
+        finally:
             conn.close()
-        
-        # Run migrations
-        migrations = [
-            ('001_add_user_id_to_trades', migration_001),
-            ('002_add_confidence_fields', migration_002),
-            ('003_add_user_plan', migration_003)
+
+    def has_pending_backfills(self):
+        """Cheap startup check - no query at all when nothing is registered"""
+        if not self.backfills:
+            return False
+        return any(status['state'] != 'done' for status in self.backfill_status())
+
+    def run_all_backfills(self, batch_size=1000, max_rows_per_second=None):
+        """Run every registered backfill that hasn't completed"""
+        results = []
+        # One process at a time; the others find the work done when they get the lock
+        with file_lock(f"{self.db_path}.backfill.lock"):
+            for name, table, sql in self.backfills:
+                progress = self.run_backfill(name, table, sql, batch_size, max_rows_per_second)
+                print(f"✓ Backfill {name}: {progress['rows_done']} rows")
+                results.append(progress)
+        return results
+
+    def start_backfill_thread(self, batch_size=1000, max_rows_per_second=None):
+        """Run pending backfills in a daemon thread so startup isn't blocked"""
+        def run():
+            try:
+                self.run_all_backfills(batch_size, max_rows_per_second)
+            except Exception as e:
+                print(f"Backfill error: {e}")
+
+        thread = threading.Thread(target=run, name='backfill', daemon=True)
+        thread.start()
+        return thread
+
+    def backfill_status(self):
+        """Progress of every registered backfill"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        statuses = []
+
+        try:
+            for name, table, sql in self.backfills:
+                progress = self._backfill_row(cursor, name)
+                if not progress:
+                    statuses.append({'name': name, 'state': 'pending', 'percent': 0, 'rows_done': 0})
+                    continue
+
+                if progress['completed_at']:
+                    state, percent = 'done', 100
+                else:
+                    cursor.execute(f'SELECT COALESCE(MIN(id), 1) - 1 FROM {table}')
+                    first_id = cursor.fetchone()[0]
+                    span = max(progress['max_id'] - first_id, 1)
+                    state = 'running'
+                    percent = round(max(progress['last_id'] - first_id, 0) / span * 100, 1)
+
+                statuses.append({
+                    'name': name,
+                    'state': state,
+                    'percent': percent,
+                    'rows_done': progress['rows_done'],
+                    'last_id': progress['last_id'],
+                    'max_id': progress['max_id'],
+                    'updated_at': progress['updated_at']
+                })
+        finally:
+            conn.close()
+
+        return statuses
+
+    # Migration 001: Add user_id to trades
+    def migration_001(self, cursor):
+        if not self.column_exists(cursor, 'trades', 'user_id'):
+            cursor.execute('ALTER TABLE trades ADD COLUMN user_id INTEGER DEFAULT 1')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_trades_user_id ON trades(user_id)')
+
+    # Migration 002: Add confidence fields
+    def migration_002(self, cursor):
+        if not self.column_exists(cursor, 'trades', 'confidence'):
+            cursor.execute('ALTER TABLE trades ADD COLUMN confidence INTEGER')
+        if not self.column_exists(cursor, 'trades', 'emotion_before'):
+            cursor.execute('ALTER TABLE trades ADD COLUMN emotion_before TEXT')
+        if not self.column_exists(cursor, 'trades', 'rule_followed'):
+            cursor.execute('ALTER TABLE trades ADD COLUMN rule_followed INTEGER DEFAULT 1')
+        if not self.column_exists(cursor, 'trades', 'risk_percentage'):
+            cursor.execute('ALTER TABLE trades ADD COLUMN risk_percentage REAL')
+
+    # Migration 003: Add user plan fields
+    def migration_003(self, cursor):
+        if self.shard:
+            return
+        if not self.column_exists(cursor, 'users', 'plan'):
+            cursor.execute("ALTER TABLE users ADD COLUMN plan TEXT DEFAULT 'free'")
+        if not self.column_exists(cursor, 'users', 'is_active'):
+            cursor.execute('ALTER TABLE users ADD COLUMN is_active INTEGER DEFAULT 1')
+        if not self.column_exists(cursor, 'users', 'last_login'):
+            cursor.execute('ALTER TABLE users ADD COLUMN last_login TIMESTAMP')
+
+    # Migration 004: Screenshot capture job queue
+    def migration_004(self, cursor):
+        if self.shard:
+            return
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS screenshot_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                trade_id INTEGER NOT NULL,
+                screenshot_type TEXT NOT NULL DEFAULT 'before',
+                url TEXT,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL DEFAULT 3,
+                timeout_seconds REAL NOT NULL DEFAULT 60,
+                run_after TIMESTAMP NOT NULL,
+                locked_until TIMESTAMP,
+                filename TEXT,
+                error TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP
+            )
+        ''')
+        cursor.execute(
+            'CREATE INDEX IF NOT EXISTS idx_screenshot_jobs_status ON screenshot_jobs(status, run_after)'
+        )
+
+    # Migration 005: Checkpoints for batched data backfills
+    def migration_005(self, cursor):
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS backfill_progress (
+                name TEXT PRIMARY KEY,
+                last_id INTEGER NOT NULL,
+                max_id INTEGER NOT NULL,
+                rows_done INTEGER NOT NULL DEFAULT 0,
+                started_at TIMESTAMP,
+                updated_at TIMESTAMP,
+                completed_at TIMESTAMP
+            )
+        ''')
+
+    # Migration 006: Stored derived columns for statistics
+    def migration_006(self, cursor):
+        derived_columns = [
+            ('r_multiple', 'REAL'),
+            ('exit_date', 'TEXT'),
+            ('entry_hour', 'INTEGER'),
+            ('entry_weekday', 'INTEGER'),
+            ('holding_minutes', 'REAL')
         ]
-        
-        for version, func in migrations:
-            self.run_migration(version, func)
-        
-        print("✓ All migrations completed successfully")
\ No newline at end of file
+        for column, column_type in derived_columns:
+            if not self.column_exists(cursor, 'trades', column):
+                cursor.execute(f'ALTER TABLE trades ADD COLUMN {column} {column_type}')
+
+        cursor.execute(
+            'CREATE INDEX IF NOT EXISTS idx_trades_user_status_exit_time ON trades(user_id, status, exit_time)'
+        )
+        cursor.execute(
+            'CREATE INDEX IF NOT EXISTS idx_trades_user_exit_date ON trades(user_id, exit_date)'
+        )
+        # Covering index: AVG(r_multiple) for a user never touches the table
+        cursor.execute(
+            'CREATE INDEX IF NOT EXISTS idx_trades_user_r_multiple ON trades(user_id, r_multiple)'
+        )
+
+    # Migration 007: Cutoff of trades moved to the archive database
+    def migration_007(self, cursor):
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS archive_state (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            )
+        ''')
+
+    # Migration 008: Shard layout, and the owner of each capture job for routing
+    def migration_008(self, cursor):
+        if self.shard:
+            return
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS shard_state (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            )
+        ''')
+        if not self.column_exists(cursor, 'screenshot_jobs', 'user_id'):
+            cursor.execute('ALTER TABLE screenshot_jobs ADD COLUMN user_id INTEGER')
+
+    # Migration 009: Trigger-maintained change log for delta sync (in every file holding trades)
+    def migration_009(self, cursor):
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS trade_changes (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                trade_id INTEGER NOT NULL,
+                user_id INTEGER,
+                op TEXT NOT NULL,
+                changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_trade_changes_user_seq ON trade_changes(user_id, seq)')
+        # Compaction looks for a newer row of the same trade
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_trade_changes_trade_seq ON trade_changes(trade_id, seq)')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS change_log_state (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trades_log_insert AFTER INSERT ON trades BEGIN
+                INSERT INTO trade_changes (trade_id, user_id, op) VALUES (NEW.id, NEW.user_id, 'insert');
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trades_log_update AFTER UPDATE ON trades BEGIN
+                INSERT INTO trade_changes (trade_id, user_id, op) VALUES (NEW.id, NEW.user_id, 'update');
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trades_log_delete AFTER DELETE ON trades BEGIN
+                INSERT INTO trade_changes (trade_id, user_id, op) VALUES (OLD.id, OLD.user_id, 'delete');
+            END
+        ''')
+        # Tags are part of a trade as clients see it
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trade_tags_log_insert AFTER INSERT ON trade_tags BEGIN
+                INSERT INTO trade_changes (trade_id, user_id, op)
+                SELECT id, user_id, 'update' FROM trades WHERE id = NEW.trade_id;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trade_tags_log_delete AFTER DELETE ON trade_tags BEGIN
+                INSERT INTO trade_changes (trade_id, user_id, op)
+                SELECT id, user_id, 'update' FROM trades WHERE id = OLD.trade_id;
+            END
+        ''')
+
+    # Migration 010: Write counters for global tables (the tag catalogue), bumped by triggers
+    def migration_010(self, cursor):
+        if self.shard:
+            return
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS data_versions (
+                name TEXT PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        cursor.execute("INSERT OR IGNORE INTO data_versions (name) VALUES ('tags')")
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS tags_version_{event.lower()} AFTER {event} ON tags BEGIN
+                    UPDATE data_versions SET version = version + 1 WHERE name = 'tags';
+                END
+            ''')
+
+    # Migration 011: Full-text index of trade notes and indexes for trade search
+    # (in every file holding trades; existing notes are indexed by a backfill)
+    def migration_011(self, cursor):
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_trades_user_entry_time ON trades(user_id, entry_time)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_trade_tags_tag ON trade_tags(tag_id)')
+        # Keeps its own copy of the notes rather than reading them from trades:
+        # removing a row that was never indexed is then harmless, so the
+        # backfill can run while the app writes
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS trades_fts USING fts5(
+                notes, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+            )
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trades_fts_insert AFTER INSERT ON trades
+            WHEN NEW.notes <> '' BEGIN
+                INSERT INTO trades_fts (rowid, notes) VALUES (NEW.id, NEW.notes);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trades_fts_update AFTER UPDATE OF notes ON trades BEGIN
+                DELETE FROM trades_fts WHERE rowid = OLD.id;
+                INSERT INTO trades_fts (rowid, notes) SELECT NEW.id, NEW.notes WHERE NEW.notes <> '';
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trades_fts_delete AFTER DELETE ON trades
+            WHEN OLD.notes <> '' BEGIN
+                DELETE FROM trades_fts WHERE rowid = OLD.id;
+            END
+        ''')
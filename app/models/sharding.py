@@ -0,0 +1,439 @@
+import os
+import re
+import sqlite3
+import zlib
+from app.models.database import Database, TRADES_TABLE_SQL, TRADE_TAGS_TABLE_SQL
+from app.models.migrations import Migration
+from app.models.archive import TradeArchive, ARCHIVE_SCHEMA, archive_path_for, archived_before
+from app.models.change_log import RESET_TRADE_ID, log_change
+
+SHARD_MODES = ('off', 'user', 'hash')
+# Shard files live in this folder next to the main database
+SHARD_DIR = 'shards'
+# Schema name of the global database (users, tags, jobs) on shard connections
+GLOBAL_SCHEMA = 'global_db'
+
+def read_layout(db_path):
+    """(mode, shard_count) recorded by `manage.py reshard`; ('off', 0) if never sharded"""
+    if not os.path.exists(db_path):
+        return 'off', 0
+    conn = sqlite3.connect(db_path)
+    try:
+        state = dict(conn.execute('SELECT key, value FROM shard_state').fetchall())
+    except sqlite3.OperationalError:
+        return 'off', 0  # Migrations not run yet
+    finally:
+        conn.close()
+    return state.get('mode', 'off'), int(state.get('shard_count') or 0)
+
+class ShardDatabase(Database):
+    """A shard file: trades and trade_tags (and its own archive) for some users.
+
+    The global database is attached to every connection. Shard files have no
+    users or tags tables, so unqualified names resolve to the global ones and
+    the existing queries run unchanged.
+    """
+
+    def __init__(self, db_path, global_path):
+        self.global_path = global_path
+        super().__init__(db_path)
+
+    def get_connection(self):
+        conn = super().get_connection()
+        conn.execute(f'ATTACH DATABASE ? AS {GLOBAL_SCHEMA}', (self.global_path,))
+        return conn
+
+    def init_db(self):
+        """Create the trade tables and bring the shard to the current schema version"""
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute(TRADES_TABLE_SQL)
+        conn.execute(TRADE_TAGS_TABLE_SQL)
+        conn.commit()
+        conn.close()
+        Migration(self.db_path, shard=True).run_all_migrations(verbose=False)
+
+class ShardRouter:
+    """Resolves the database holding a user's trades.
+
+    Modes: 'off' keeps everything in the main database; 'user' gives every
+    user their own file; 'hash' spreads users over `shard_count` files by a
+    stable hash of their id. Users, tags and job tables always stay in the
+    main (global) database.
+    """
+
+    def __init__(self, db_path, mode=None, shard_count=None):
+        if mode is None:
+            mode, shard_count = read_layout(db_path)
+        if mode not in SHARD_MODES:
+            raise ValueError(f"Unknown shard mode: {mode}")
+        if mode == 'hash' and not (shard_count or 0) > 0:
+            raise ValueError("Hash sharding needs a shard count")
+
+        self.db_path = db_path
+        self.mode = mode
+        self.shard_count = shard_count if mode == 'hash' else 0
+        self.shard_dir = os.path.join(os.path.dirname(db_path), SHARD_DIR)
+        self._root, ext = os.path.splitext(os.path.basename(db_path))
+        self._ext = ext or '.db'
+
+    @property
+    def enabled(self):
+        return self.mode != 'off'
+
+    def shard_path(self, user_id):
+        """File holding `user_id`'s trades"""
+        if self.mode == 'user':
+            name = f'{self._root}_user_{int(user_id)}{self._ext}'
+        elif self.mode == 'hash':
+            # crc32, not hash(): must be the same in every process
+            index = zlib.crc32(str(int(user_id)).encode()) % self.shard_count
+            name = f'{self._root}_shard_{index:03d}{self._ext}'
+        else:
+            return self.db_path
+        return os.path.join(self.shard_dir, name)
+
+    def for_user(self, user_id):
+        """Database for `user_id`'s trades (the main database when sharding is off)"""
+        if not self.enabled:
+            return Database(self.db_path)
+        if user_id is None:
+            raise ValueError("A user id is required to route to a shard")
+        return ShardDatabase(self.shard_path(user_id), self.db_path)
+
+    def shard_paths(self):
+        """Existing shard files of this layout"""
+        if not self.enabled or not os.path.isdir(self.shard_dir):
+            return []
+        kind = r'user_\d+' if self.mode == 'user' else r'shard_\d{3}'
+        pattern = re.compile(rf'^{re.escape(self._root)}_{kind}{re.escape(self._ext)}$')
+        return sorted(
+            os.path.join(self.shard_dir, name)
+            for name in os.listdir(self.shard_dir) if pattern.match(name)
+        )
+
+    def databases(self):
+        """Every database holding trades - what cross-user queries fan out over"""
+        if not self.enabled:
+            return [Database(self.db_path)]
+        return [ShardDatabase(path, self.db_path) for path in self.shard_paths()]
+
+# Layouts only change through `manage.py reshard`, with the app stopped
+_routers = {}
+
+def get_router(db_path):
+    """Router for the layout recorded in `db_path`, read once per process"""
+    router = _routers.get(db_path)
+    if router is None:
+        router = _routers[db_path] = ShardRouter(db_path)
+    return router
+
+def _columns(conn, schema, table):
+    return [row[1] for row in conn.execute(f'PRAGMA {schema}.table_info({table})').fetchall()]
+
+def _attached(conn):
+    return {row[1] for row in conn.execute('PRAGMA database_list').fetchall()}
+
+class Resharder:
+    """Moves every user's trades from the recorded layout (and the main database) to a new one.
+
+    Run it with the app and workers stopped. A user moves in batches; each
+    batch copies trades and their tag links into the target file and deletes
+    them from the source in one transaction. Archived trades move into the
+    target's archive together with the user's rollups and drawdown snapshot.
+
+    Trades keep their ids unless the id is taken in the target file (per-user
+    shards number independently), in which case the trade gets a new id and
+    its tag links and capture jobs follow. The new layout is recorded only
+    after every user has moved; an interrupted run is finished by running it
+    again with the same options.
+    """
+
+    def __init__(self, db_path, mode, shard_count=0, batch_size=2000):
+        self.db_path = db_path
+        self.source = ShardRouter(db_path)
+        self.target = ShardRouter(db_path, mode, shard_count)
+        self.batch_size = batch_size
+
+    def _state(self, conn, key):
+        row = conn.execute('SELECT value FROM shard_state WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_state(self, conn, key, value):
+        conn.execute('''
+            INSERT INTO shard_state (key, value) VALUES (?, ?)
+            ON CONFLICT(key) DO UPDATE SET value = excluded.value
+        ''', (key, None if value is None else str(value)))
+
+    def _source_users(self):
+        """(user_id, source path, has archived trades) for every user with trades"""
+        # The main database too: it holds trades written while sharding was off
+        paths = [self.db_path] + self.source.shard_paths()
+        users = []
+        for path in paths:
+            conn = sqlite3.connect(path)
+            try:
+                hot = {row[0] for row in conn.execute('SELECT DISTINCT user_id FROM trades')}
+                archived = set()
+                archive_path = archive_path_for(path)
+                if os.path.exists(archive_path):
+                    conn.execute(f'ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}', (archive_path,))
+                    if 'trades' in self._tables(conn, ARCHIVE_SCHEMA):
+                        archived = {row[0] for row in conn.execute(
+                            f'SELECT DISTINCT user_id FROM {ARCHIVE_SCHEMA}.trades'
+                        )}
+            finally:
+                conn.close()
+            users.extend(
+                (user_id, path, user_id in archived)
+                for user_id in sorted(hot | archived)
+            )
+        return users
+
+    def _tables(self, conn, schema):
+        return {row[0] for row in conn.execute(f"SELECT name FROM {schema}.sqlite_master WHERE type = 'table'")}
+
+    def _next_trade_id(self, conn):
+        """Reserve an id above every trade in the source and target files, hot or archived"""
+        schemas = [schema for schema in ('main', ARCHIVE_SCHEMA, 'src', 'src_archive') if schema in _attached(conn)]
+        highest = max(
+            conn.execute(f'SELECT COALESCE(MAX(id), 0) FROM {schema}.trades').fetchone()[0]
+            for schema in schemas
+        )
+        highest = max(highest, conn.execute(
+            "SELECT COALESCE(MAX(seq), 0) FROM main.sqlite_sequence WHERE name = 'trades'"
+        ).fetchone()[0])
+        self._reserve_ids(conn, highest + 1)
+        return highest + 1
+
+    def _reserve_ids(self, conn, trade_id):
+        """Make AUTOINCREMENT in the target's hot table continue above `trade_id`"""
+        updated = conn.execute(
+            "UPDATE main.sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'trades'", (trade_id,)
+        ).rowcount
+        if not updated:
+            conn.execute("INSERT INTO main.sqlite_sequence (name, seq) VALUES ('trades', ?)", (trade_id,))
+
+    def _move_trades(self, conn, user_id, source, target, jobs):
+        """Move one user's trades and tag links from schema `source` to `target` in batches"""
+        source_columns = set(_columns(conn, source, 'trades'))
+        columns = [
+            column for column in _columns(conn, target, 'trades')
+            if column in source_columns and column != 'id'
+        ]
+        # Ids already used in the target file, hot or archived
+        taken = ' OR '.join(
+            f'old_id IN (SELECT id FROM {schema}.trades)'
+            for schema in ('main', ARCHIVE_SCHEMA) if schema in _attached(conn)
+        )
+        moved = renumbered = 0
+
+        while True:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                rows = conn.execute(
+                    f'SELECT id FROM {source}.trades WHERE user_id = ? ORDER BY id LIMIT ?',
+                    (user_id, self.batch_size)
+                ).fetchall()
+                if not rows:
+                    conn.execute('COMMIT')
+                    break
+
+                conn.execute('DELETE FROM temp.reshard_ids')
+                conn.executemany(
+                    'INSERT INTO temp.reshard_ids (old_id, new_id) VALUES (?, ?)',
+                    [(row[0], row[0]) for row in rows]
+                )
+                collisions = [row[0] for row in conn.execute(
+                    f'SELECT old_id FROM temp.reshard_ids WHERE {taken}'
+                ).fetchall()]
+                for old_id in collisions:
+                    conn.execute(
+                        'UPDATE temp.reshard_ids SET new_id = ? WHERE old_id = ?',
+                        (self._next_trade_id(conn), old_id)
+                    )
+
+                conn.execute(f'''
+                    INSERT INTO {target}.trades (id, {', '.join(columns)})
+                    SELECT m.new_id, {', '.join(f's.{column}' for column in columns)}
+                    FROM {source}.trades s JOIN temp.reshard_ids m ON m.old_id = s.id
+                ''')
+                conn.execute(f'''
+                    INSERT OR IGNORE INTO {target}.trade_tags (trade_id, tag_id)
+                    SELECT m.new_id, tt.tag_id
+                    FROM {source}.trade_tags tt JOIN temp.reshard_ids m ON m.old_id = tt.trade_id
+                ''')
+                if collisions:
+                    conn.execute(f'''
+                        UPDATE {jobs}.screenshot_jobs
+                        SET trade_id = (SELECT new_id FROM temp.reshard_ids WHERE old_id = trade_id)
+                        WHERE (user_id = ? OR user_id IS NULL)
+                          AND trade_id IN (SELECT old_id FROM temp.reshard_ids WHERE new_id != old_id)
+                    ''', (user_id,))
+                conn.execute(
+                    f'DELETE FROM {source}.trade_tags WHERE trade_id IN (SELECT old_id FROM temp.reshard_ids)'
+                )
+                conn.execute(
+                    f'DELETE FROM {source}.trades WHERE id IN (SELECT old_id FROM temp.reshard_ids)'
+                )
+                if target == ARCHIVE_SCHEMA:
+                    # Hot inserts in the target must never reuse an archived id
+                    self._reserve_ids(conn, conn.execute(
+                        'SELECT MAX(new_id) FROM temp.reshard_ids'
+                    ).fetchone()[0])
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+
+            moved += len(rows)
+            renumbered += len(collisions)
+
+        return moved, renumbered
+
+    def _move_rollups(self, conn, user_id):
+        """Move the user's archive rollups and snapshot, and carry over the archive cutoff"""
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for table in ('trade_rollups', 'user_snapshots'):
+                column_list = ', '.join(_columns(conn, ARCHIVE_SCHEMA, table))
+                conn.execute(f'''
+                    INSERT OR REPLACE INTO {ARCHIVE_SCHEMA}.{table} ({column_list})
+                    SELECT {column_list} FROM src_archive.{table} WHERE user_id = ?
+                ''', (user_id,))
+                conn.execute(f'DELETE FROM src_archive.{table} WHERE user_id = ?', (user_id,))
+
+            # The target may now hold trades archived up to the source's cutoff
+            source_cutoff = conn.execute(
+                "SELECT value FROM src.archive_state WHERE key = 'archived_before'"
+            ).fetchone()
+            current = archived_before(conn)
+            if source_cutoff and (current is None or source_cutoff[0] > current):
+                conn.execute('''
+                    INSERT INTO main.archive_state (key, value) VALUES ('archived_before', ?)
+                    ON CONFLICT(key) DO UPDATE SET value = excluded.value
+                ''', (source_cutoff[0],))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def _reset_changes(self, conn, user_id):
+        """Restart the user's change log in the target: sync cursors from the source mean nothing here"""
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('DELETE FROM main.trade_changes WHERE user_id = ?', (user_id,))
+            log_change(conn, RESET_TRADE_ID, user_id, 'reset')
+            if 'trade_changes' in self._tables(conn, 'src'):
+                conn.execute('DELETE FROM src.trade_changes WHERE user_id = ?', (user_id,))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def move_user(self, user_id, source_path, has_archived=False):
+        """Move one user's trades from `source_path` to their target file"""
+        target_path = self.target.for_user(user_id).db_path
+        if os.path.abspath(target_path) == os.path.abspath(source_path):
+            return {'moved': 0, 'archived': 0, 'renumbered': 0}
+
+        if has_archived:
+            trade_archive = TradeArchive(target_path)
+            conn = trade_archive.get_connection()
+            conn.execute('BEGIN IMMEDIATE')
+            trade_archive.ensure_schema(conn)
+            conn.execute('COMMIT')
+        else:
+            conn = sqlite3.connect(target_path, timeout=30, isolation_level=None)
+
+        try:
+            conn.execute('ATTACH DATABASE ? AS src', (source_path,))
+            if has_archived:
+                conn.execute('ATTACH DATABASE ? AS src_archive', (archive_path_for(source_path),))
+            # Capture jobs reference trade ids and live in the global database
+            if os.path.abspath(target_path) == os.path.abspath(self.db_path):
+                jobs = 'main'
+            elif os.path.abspath(source_path) == os.path.abspath(self.db_path):
+                jobs = 'src'
+            else:
+                conn.execute(f'ATTACH DATABASE ? AS {GLOBAL_SCHEMA}', (self.db_path,))
+                jobs = GLOBAL_SCHEMA
+            conn.execute('CREATE TEMP TABLE IF NOT EXISTS reshard_ids (old_id INTEGER PRIMARY KEY, new_id INTEGER)')
+
+            archived = renumbered = 0
+            if has_archived:
+                self._move_rollups(conn, user_id)
+                archived, renumbered = self._move_trades(conn, user_id, 'src_archive', ARCHIVE_SCHEMA, jobs)
+            moved, hot_renumbered = self._move_trades(conn, user_id, 'src', 'main', jobs)
+            self._reset_changes(conn, user_id)
+        finally:
+            conn.close()
+
+        return {'moved': moved, 'archived': archived, 'renumbered': renumbered + hot_renumbered}
+
+    def _remove_if_empty(self, path):
+        """Delete a source shard file (and its archive) once no trades are left in it"""
+        conn = sqlite3.connect(path)
+        try:
+            remaining = conn.execute('SELECT COUNT(*) FROM trades').fetchone()[0]
+            archive_path = archive_path_for(path)
+            if os.path.exists(archive_path):
+                conn.execute(f'ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}', (archive_path,))
+                remaining += conn.execute(f'SELECT COUNT(*) FROM {ARCHIVE_SCHEMA}.trades').fetchone()[0]
+        except sqlite3.OperationalError:
+            return False
+        finally:
+            conn.close()
+        if remaining:
+            return False
+
+        for candidate in (path, archive_path_for(path)):
+            for suffix in ('', '-journal', '-wal', '-shm', '.migrate.lock', '.backfill.lock'):
+                if os.path.exists(candidate + suffix):
+                    os.remove(candidate + suffix)
+        Database._initialized.discard(path)
+        return True
+
+    def run(self, progress=None):
+        """Move every user, then record the new layout"""
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
+        try:
+            pending = self._state(conn, 'pending_mode'), self._state(conn, 'pending_shard_count')
+            requested = self.target.mode, str(self.target.shard_count)
+            if pending[0] and pending != requested:
+                raise ValueError(
+                    f"An interrupted reshard to mode={pending[0]} shards={pending[1]} "
+                    f"must be finished first"
+                )
+            self._set_state(conn, 'pending_mode', self.target.mode)
+            self._set_state(conn, 'pending_shard_count', self.target.shard_count)
+        finally:
+            conn.close()
+
+        totals = {'users': 0, 'moved': 0, 'archived': 0, 'renumbered': 0, 'removed_files': 0}
+        for user_id, source_path, has_archived in self._source_users():
+            result = self.move_user(user_id, source_path, has_archived)
+            if result['moved'] or result['archived']:
+                totals['users'] += 1
+            for key in ('moved', 'archived', 'renumbered'):
+                totals[key] += result[key]
+            if progress:
+                progress(user_id, result)
+
+        for path in self.source.shard_paths():
+            if path not in self.target.shard_paths() and self._remove_if_empty(path):
+                totals['removed_files'] += 1
+
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            self._set_state(conn, 'mode', self.target.mode)
+            self._set_state(conn, 'shard_count', self.target.shard_count)
+            conn.execute("DELETE FROM shard_state WHERE key IN ('pending_mode', 'pending_shard_count')")
+            conn.execute('COMMIT')
+        finally:
+            conn.close()
+        _routers.pop(self.db_path, None)
+
+        totals['shards'] = len(self.target.shard_paths())
+        return totals
@@ -0,0 +1,97 @@
+import json
+import re
+
+# Trade columns a filter matches exactly (a value, or a list of values)
+EQUALITY_FILTERS = ('pair', 'session', 'setup_type', 'timeframe', 'trade_type', 'status')
+# Inclusive bounds: filter key -> (column, operator)
+RANGE_FILTERS = {
+    'min_pnl': ('profit_loss', '>='),
+    'max_pnl': ('profit_loss', '<='),
+    'min_r': ('r_multiple', '>='),
+    'max_r': ('r_multiple', '<=')
+}
+
+def notes_match_query(text):
+    """FTS5 query for free text: every word must appear, as a word or a prefix.
+
+    Words are quoted, so operators and punctuation typed by the user are
+    never parsed as query syntax. Returns None when there are no words.
+    """
+    words = re.findall(r'\w+', text)
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
+
+def _tag_ids(key, value):
+    if not isinstance(value, list) or not all(isinstance(v, int) for v in value):
+        raise ValueError(f"{key} must be a list of tag ids")
+    return sorted(set(value))
+
+def trade_filter(filters, alias='trades'):
+    """SQL condition and parameters selecting the trades matching `filters`.
+
+    Keys: any of EQUALITY_FILTERS and RANGE_FILTERS; 'from' and 'to' bound
+    entry_time (inclusive; a bare date 'to' covers that whole day); 'ids'
+    is a list of trade ids; 'tags_any' / 'tags_all' are lists of tag ids a
+    trade needs one or all of; 'q' is free text searched in the notes.
+    The owner is not part of it - callers add user_id themselves. Raises
+    ValueError for unknown keys or malformed values.
+    """
+    clauses = []
+    params = []
+
+    for key, value in filters.items():
+        if key in EQUALITY_FILTERS:
+            values = value if isinstance(value, list) else [value]
+            if not values or not all(isinstance(v, str) for v in values):
+                raise ValueError(f"{key} must be a string or a list of strings")
+            clauses.append(f"{alias}.{key} IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+        elif key in RANGE_FILTERS:
+            column, operator = RANGE_FILTERS[key]
+            try:
+                bound = float(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"{key} must be a number")
+            clauses.append(f'{alias}.{column} {operator} ?')
+            params.append(bound)
+        elif key == 'from':
+            clauses.append(f'{alias}.entry_time >= ?')
+            params.append(str(value))
+        elif key == 'to':
+            value = str(value)
+            if len(value) == 10:
+                # A date on its own means up to the end of that day
+                clauses.append(f"{alias}.entry_time < date(?, '+1 day')")
+            else:
+                clauses.append(f'{alias}.entry_time <= ?')
+            params.append(value)
+        elif key == 'ids':
+            if not isinstance(value, list) or not all(isinstance(v, int) for v in value):
+                raise ValueError("ids must be a list of trade ids")
+            # One parameter however many ids there are
+            clauses.append(f'{alias}.id IN (SELECT value FROM json_each(?))')
+            params.append(json.dumps(value))
+        elif key == 'tags_any':
+            tag_ids = _tag_ids(key, value)
+            clauses.append(
+                f"{alias}.id IN (SELECT trade_id FROM trade_tags WHERE tag_id IN ({', '.join('?' * len(tag_ids))}))"
+            )
+            params.extend(tag_ids)
+        elif key == 'tags_all':
+            tag_ids = _tag_ids(key, value)
+            clauses.append(
+                f"{alias}.id IN (SELECT trade_id FROM trade_tags WHERE tag_id IN ({', '.join('?' * len(tag_ids))}) "
+                f"GROUP BY trade_id HAVING COUNT(*) = ?)"
+            )
+            params.extend(tag_ids)
+            params.append(len(tag_ids))
+        elif key == 'q':
+            query = notes_match_query(str(value))
+            if query is not None:
+                clauses.append(f'{alias}.id IN (SELECT rowid FROM trades_fts WHERE trades_fts MATCH ?)')
+                params.append(query)
+        else:
+            raise ValueError(f"Unknown filter: {key}")
+
+    return ' AND '.join(clauses) or '1', params
@@ -1,6 +1,7 @@
-from flask import Blueprint, render_template, jsonify, current_app
-from flask_login import login_required
-from app.models.database import Database
+from flask import Blueprint, render_template, jsonify, current_app, request, Response
+from flask_login import login_required, current_user
+from app.models.database import derived_trade_expressions, DERIVED_TRADE_INPUTS
+from app.models.sharding import get_router
 from datetime import datetime, timedelta
 import random
 
@@ -28,11 +29,32 @@ def health_check():
         'message': 'Trading Journal API is running!'
     })
 
+@bp.route('/api/metrics')
+def prometheus_metrics():
+    """Request, SQL and connection metrics in Prometheus text format.
+    
+    Scrapers send `Authorization: Bearer <METRICS_TOKEN>`; without a token
+    configured, only logged-in users can read them.
+    """
+    if not current_app.config['METRICS_ENABLED']:
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    
+    token = current_app.config['METRICS_TOKEN']
+    if token:
+        if request.headers.get('Authorization') != f'Bearer {token}':
+            return jsonify({'error': 'Unauthorized'}), 401
+    elif not current_user.is_authenticated:
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    from app.services.metrics import metrics
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @bp.route('/api/add-sample-data', methods=['POST'])
 @login_required
 def add_sample_data():
     """Add sample closed trades for testing"""
-    db = Database(current_app.config['DATABASE'])
+    # Sample trades belong to user 1, so they go to that user's shard
+    db = get_router(current_app.config['DATABASE']).for_user(1)
     conn = db.get_connection()
     cursor = conn.cursor()
     
@@ -64,33 +86,40 @@ def add_sample_data():
         entry_time = datetime.now() - timedelta(days=random.randint(0, 30))
         exit_time = entry_time + timedelta(hours=random.randint(1, 24))
         
-        cursor.execute('''
+        derived = derived_trade_expressions(
+            **{column: f':{column}' for column in DERIVED_TRADE_INPUTS}
+        )
+        cursor.execute(f'''
             INSERT INTO trades (
                 user_id, pair, session, timeframe, setup_type, trade_type,
                 entry_price, stop_loss, take_profit, position_size,
                 risk_amount, reward_amount, risk_reward_ratio,
-                entry_time, exit_time, exit_price, profit_loss, status
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            1,  # Replace with current_user.id in production
-            random.choice(pairs),
-            random.choice(sessions),
-            'H1',
-            random.choice(setups),
-            'Buy' if is_buy else 'Sell',
-            entry,
-            sl,
-            tp,
-            position_size,
-            risk * position_size * 100000,
-            reward * position_size * 100000,
-            rr_ratio,
-            entry_time.isoformat(),
-            exit_time.isoformat(),
-            exit_price,
-            profit_loss,
-            'closed'
-        ))
+                entry_time, exit_time, exit_price, profit_loss, status, {', '.join(derived)}
+            ) VALUES (
+                :user_id, :pair, :session, :timeframe, :setup_type, :trade_type,
+                :entry_price, :stop_loss, :take_profit, :position_size,
+                :risk_amount, :reward_amount, :risk_reward_ratio,
+                :entry_time, :exit_time, :exit_price, :profit_loss, 'closed', {', '.join(derived.values())}
+            )
+        ''', {
+            'user_id': 1,  # Replace with current_user.id in production
+            'pair': random.choice(pairs),
+            'session': random.choice(sessions),
+            'timeframe': 'H1',
+            'setup_type': random.choice(setups),
+            'trade_type': 'Buy' if is_buy else 'Sell',
+            'entry_price': entry,
+            'stop_loss': sl,
+            'take_profit': tp,
+            'position_size': position_size,
+            'risk_amount': risk * position_size * 100000,
+            'reward_amount': reward * position_size * 100000,
+            'risk_reward_ratio': rr_ratio,
+            'entry_time': entry_time.isoformat(),
+            'exit_time': exit_time.isoformat(),
+            'exit_price': exit_price,
+            'profit_loss': profit_loss
+        })
         
         sample_trades.append({'pair': random.choice(pairs), 'profit_loss': profit_loss})
     
@@ -1,82 +1,136 @@
 from flask import Blueprint, request, jsonify, current_app, send_from_directory
-from app.services.screenshot import ScreenshotService
-from app.models.database import Database
+from flask_login import login_required, current_user
+from app.services.screenshot import ScreenshotService, UploadError
+from app.services.capture_queue import CaptureJobQueue
+from app.models.sharding import get_router
 import os
 
 bp = Blueprint('screenshots', __name__, url_prefix='/api/screenshots')
 
 def get_db():
-    return Database(current_app.config['DATABASE'])
+    # The current user's shard when sharding is enabled
+    return get_router(current_app.config['DATABASE']).for_user(current_user.id)
 
 def get_screenshot_service():
-    return ScreenshotService(current_app.config['UPLOAD_FOLDER'])
+    return ScreenshotService(
+        current_app.config['UPLOAD_FOLDER'],
+        max_size=current_app.config['MAX_CONTENT_LENGTH']
+    )
 
-@bp.route('/capture-url', methods=['POST'])
-def capture_url_screenshot():
-    """Capture screenshot from TradingView URL"""
-    data = request.json
-    trade_id = data.get('trade_id')
-    url = data.get('url')
-    screenshot_type = data.get('type', 'before')  # 'before' or 'after'
-    
-    if not url or not trade_id:
-        return jsonify({'error': 'Missing trade_id or url'}), 400
-    
-    service = get_screenshot_service()
-    filename = service.capture_url(url, trade_id, screenshot_type)
-    
-    if not filename:
-        return jsonify({'error': 'Screenshot capture failed'}), 500
-    
-    # Update database
+def upload_error_response(error):
+    body = {'error': error.message}
+    if error.offset is not None:
+        body['offset'] = error.offset
+    return jsonify(body), error.status
+
+def owns_trade(trade_id):
+    """Whether the current user has a trade with this id"""
+    db = get_db()
+    conn = db.get_connection()
+    try:
+        row = conn.execute(
+            'SELECT 1 FROM trades WHERE id = ? AND user_id = ?', (trade_id, current_user.id)
+        ).fetchone()
+    finally:
+        conn.close()
+    return row is not None
+
+def set_trade_screenshot(trade_id, screenshot_type, filename):
     db = get_db()
     conn = db.get_connection()
     cursor = conn.cursor()
     
     column = 'screenshot_before' if screenshot_type == 'before' else 'screenshot_after'
-    cursor.execute(f'UPDATE trades SET {column} = ? WHERE id = ?', (filename, trade_id))
+    cursor.execute(
+        f'UPDATE trades SET {column} = ? WHERE id = ? AND user_id = ?',
+        (filename, trade_id, current_user.id)
+    )
     conn.commit()
     conn.close()
+
+def get_capture_queue():
+    return CaptureJobQueue(current_app.config['DATABASE'])
+
+def job_response(job):
+    body = {
+        'job_id': job['id'],
+        'kind': job['kind'],
+        'trade_id': job['trade_id'],
+        'type': job['screenshot_type'],
+        'status': job['status'],
+        'attempts': job['attempts'],
+        'max_attempts': job['max_attempts'],
+        'error': job['error'],
+        'created_at': job['created_at'],
+        'updated_at': job['updated_at']
+    }
+    if job['filename']:
+        body['filename'] = job['filename']
+        body['url'] = f"/api/screenshots/view/{job['filename']}"
+    return body
+
+def enqueue_capture(kind, data):
+    trade_id = data.get('trade_id')
+    screenshot_type = data.get('type', 'before')
+    
+    if screenshot_type not in ('before', 'after'):
+        return jsonify({'error': "type must be 'before' or 'after'"}), 400
+    if not owns_trade(trade_id):
+        return jsonify({'error': 'Trade not found or access denied'}), 404
+    
+    queue = get_capture_queue()
+    job_id = queue.enqueue(
+        kind,
+        trade_id,
+        screenshot_type,
+        url=data.get('url'),
+        user_id=current_user.id,
+        max_attempts=current_app.config['CAPTURE_MAX_ATTEMPTS'],
+        timeout_seconds=current_app.config['CAPTURE_TIMEOUT_SECONDS']
+    )
     
     return jsonify({
         'success': True,
-        'filename': filename,
-        'url': f'/api/screenshots/view/{filename}'
-    })
+        'job_id': job_id,
+        'status': 'pending',
+        'status_url': f'/api/screenshots/jobs/{job_id}'
+    }), 202
+
+@bp.route('/capture-url', methods=['POST'])
+@login_required
+def capture_url_screenshot():
+    """Queue a screenshot capture of a TradingView URL"""
+    data = request.json
+    
+    if not data.get('url') or not data.get('trade_id'):
+        return jsonify({'error': 'Missing trade_id or url'}), 400
+    
+    return enqueue_capture('url', data)
 
 @bp.route('/capture-screen', methods=['POST'])
+@login_required
 def capture_screen_screenshot():
-    """Capture screenshot of current screen (for MT5)"""
+    """Queue a screenshot capture of the current screen (for MT5)"""
     data = request.json
-    trade_id = data.get('trade_id')
-    screenshot_type = data.get('type', 'before')
     
-    if not trade_id:
+    if not data.get('trade_id'):
         return jsonify({'error': 'Missing trade_id'}), 400
     
-    service = get_screenshot_service()
-    filename = service.capture_mt5_window(trade_id, screenshot_type)
+    return enqueue_capture('screen', data)
+
+@bp.route('/jobs/<int:job_id>', methods=['GET'])
+@login_required
+def get_capture_job(job_id):
+    """Get status of a queued capture"""
+    job = get_capture_queue().get(job_id, user_id=current_user.id)
     
-    if not filename:
-        return jsonify({'error': 'Screenshot capture failed'}), 500
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
     
-    # Update database
-    db = get_db()
-    conn = db.get_connection()
-    cursor = conn.cursor()
-    
-    column = 'screenshot_before' if screenshot_type == 'before' else 'screenshot_after'
-    cursor.execute(f'UPDATE trades SET {column} = ? WHERE id = ?', (filename, trade_id))
-    conn.commit()
-    conn.close()
-    
-    return jsonify({
-        'success': True,
-        'filename': filename,
-        'url': f'/api/screenshots/view/{filename}'
-    })
+    return jsonify(job_response(job))
 
 @bp.route('/upload', methods=['POST'])
+@login_required
 def upload_screenshot():
     """Upload screenshot file"""
     if 'file' not in request.files:
@@ -92,6 +146,9 @@ def upload_screenshot():
     if file.filename == '':
         return jsonify({'error': 'No file selected'}), 400
     
+    if not owns_trade(trade_id):
+        return jsonify({'error': 'Trade not found or access denied'}), 404
+    
     service = get_screenshot_service()
     filename = service.upload_screenshot(file, trade_id, screenshot_type)
     
@@ -99,14 +156,7 @@ def upload_screenshot():
         return jsonify({'error': 'Upload failed'}), 500
     
     # Update database
-    db = get_db()
-    conn = db.get_connection()
-    cursor = conn.cursor()
-    
-    column = 'screenshot_before' if screenshot_type == 'before' else 'screenshot_after'
-    cursor.execute(f'UPDATE trades SET {column} = ? WHERE id = ?', (filename, trade_id))
-    conn.commit()
-    conn.close()
+    set_trade_screenshot(trade_id, screenshot_type, filename)
     
     return jsonify({
         'success': True,
@@ -117,4 +167,92 @@ def upload_screenshot():
 @bp.route('/view/<filename>')
 def view_screenshot(filename):
     """Serve screenshot file"""
-    return send_from_directory(current_app.config['UPLOAD_FOLDER'], filename)
\ No newline at end of file
+    return send_from_directory(current_app.config['UPLOAD_FOLDER'], filename)
+
+@bp.route('/uploads', methods=['POST'])
+@login_required
+def init_chunked_upload():
+    """Start a resumable chunked upload"""
+    data = request.json or {}
+    trade_id = data.get('trade_id')
+    screenshot_type = data.get('type', 'before')
+    
+    if not trade_id:
+        return jsonify({'error': 'Missing trade_id'}), 400
+    
+    try:
+        total_size = int(data.get('total_size', 0))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'total_size must be an integer'}), 400
+    
+    if not owns_trade(trade_id):
+        return jsonify({'error': 'Trade not found or access denied'}), 404
+    
+    service = get_screenshot_service()
+    try:
+        upload = service.init_upload(trade_id, screenshot_type, total_size, user_id=current_user.id)
+    except UploadError as e:
+        return upload_error_response(e)
+    
+    return jsonify(upload), 201
+
+@bp.route('/uploads/<upload_id>', methods=['GET'])
+@login_required
+def get_chunked_upload(upload_id):
+    """Get upload progress - clients resume from the returned offset"""
+    service = get_screenshot_service()
+    try:
+        return jsonify(service.upload_status(upload_id, current_user.id))
+    except UploadError as e:
+        return upload_error_response(e)
+
+@bp.route('/uploads/<upload_id>', methods=['PUT'])
+@login_required
+def append_chunked_upload(upload_id):
+    """Append a raw chunk (request body) at ?offset=N"""
+    offset = request.args.get('offset', type=int)
+    if offset is None:
+        return jsonify({'error': 'Missing offset'}), 400
+    
+    service = get_screenshot_service()
+    try:
+        new_offset = service.append_chunk(
+            upload_id, offset, request.stream, length=request.content_length, user_id=current_user.id
+        )
+    except UploadError as e:
+        return upload_error_response(e)
+    
+    return jsonify({'success': True, 'offset': new_offset})
+
+@bp.route('/uploads/<upload_id>/complete', methods=['POST'])
+@login_required
+def complete_chunked_upload(upload_id):
+    """Finish a chunked upload and attach it to the trade"""
+    data = request.get_json(silent=True) or {}
+    
+    service = get_screenshot_service()
+    try:
+        result = service.complete_upload(upload_id, sha256=data.get('sha256'), user_id=current_user.id)
+    except UploadError as e:
+        return upload_error_response(e)
+    
+    set_trade_screenshot(result['trade_id'], result['type'], result['filename'])
+    
+    return jsonify({
+        'success': True,
+        'filename': result['filename'],
+        'sha256': result['sha256'],
+        'url': f"/api/screenshots/view/{result['filename']}"
+    })
+
+@bp.route('/uploads/<upload_id>', methods=['DELETE'])
+@login_required
+def abort_chunked_upload(upload_id):
+    """Discard a partial upload"""
+    service = get_screenshot_service()
+    try:
+        service.abort_upload(upload_id, current_user.id)
+    except UploadError as e:
+        return upload_error_response(e)
+    
+    return jsonify({'success': True})
\ No newline at end of file
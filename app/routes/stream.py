@@ -0,0 +1,53 @@
+from flask import Blueprint, Response, jsonify, current_app
+from flask_login import login_required, current_user
+from app.services.events import events, format_event
+
+bp = Blueprint('stream', __name__, url_prefix='/api/stream')
+
+STREAM_RETRY_AFTER_SECONDS = 30
+
+@bp.route('', methods=['GET'])
+@login_required
+def stream():
+    """Server-sent events: trade changes and the statistics they moved.
+
+    Each open stream holds a server thread for as long as it is connected, so
+    streams per process are capped at STREAM_MAX_CLIENTS; past that clients get
+    a 503 and retry. Serve many concurrent streams with a gevent/eventlet worker.
+    """
+    max_clients = current_app.config['STREAM_MAX_CLIENTS']
+    if max_clients and events.client_count() >= max_clients:
+        response = jsonify({'error': 'Too many open streams on this server'})
+        response.headers['Retry-After'] = str(STREAM_RETRY_AFTER_SECONDS)
+        return response, 503
+
+    subscription = events.subscribe(
+        current_user.id,
+        max_queue=current_app.config['STREAM_QUEUE_SIZE'],
+        max_per_user=current_app.config['STREAM_MAX_CLIENTS_PER_USER']
+    )
+    if subscription is None:
+        return jsonify({'error': 'Too many open streams'}), 429
+
+    heartbeat = current_app.config['STREAM_HEARTBEAT_SECONDS']
+
+    def generate():
+        # Reconnect delay for the browser's EventSource
+        yield 'retry: 5000\n\n'
+        while True:
+            message = subscription.get(timeout=heartbeat)
+            if message is None:
+                # Keeps proxies from closing an idle stream, and
+                # surfaces a disconnected client on the next write
+                yield ': heartbeat\n\n'
+            else:
+                yield format_event(*message)
+
+    response = Response(
+        generate(),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    # Runs when the server closes the response, even if it was never read
+    response.call_on_close(lambda: events.unsubscribe(subscription))
+    return response
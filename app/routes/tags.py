@@ -1,20 +1,38 @@
 from flask import Blueprint, request, jsonify, current_app
+from flask_login import login_required, current_user
 from app.models.database import Database
+from app.models.sharding import get_router
+from app.models.trade_filters import trade_filter
+from app.services.events import publish_trade_change
+from app.services.conditional import conditional, tags_etag
+from app.services.tag_catalogue import tag_catalogue
 
 bp = Blueprint('tags', __name__, url_prefix='/api/tags')
 
 def get_db():
     return Database(current_app.config['DATABASE'])
 
+def get_trade_db():
+    # Tag links live with the trades, in the current user's shard
+    return get_router(current_app.config['DATABASE']).for_user(current_user.id)
+
+def parse_tag_ids(value):
+    """A list of distinct tag ids from a request body, or None if malformed"""
+    if not isinstance(value, list) or not all(isinstance(v, int) and not isinstance(v, bool) for v in value):
+        return None
+    return sorted(set(value))
+
+def unknown_tags(conn, tag_ids):
+    """Tag ids in `tag_ids` that don't exist"""
+    return sorted(set(tag_ids) - tag_catalogue.get(conn, current_app.config['DATABASE']).keys())
+
 @bp.route('/', methods=['GET'])
+@conditional(tags_etag)
 def get_all_tags():
     """Get all available tags"""
     db = get_db()
     conn = db.get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('SELECT * FROM tags ORDER BY name')
-    tags = [dict(row) for row in cursor.fetchall()]
+    tags = tag_catalogue.sorted(conn, db.db_path)
     conn.close()
     
     return jsonify(tags)
@@ -36,6 +54,7 @@ def create_tag():
         tag_id = cursor.lastrowid
         conn.commit()
         conn.close()
+        tag_catalogue.invalidate(db.db_path)
         
         return jsonify({
             'success': True,
@@ -46,24 +65,22 @@ def create_tag():
         return jsonify({'error': str(e)}), 400
 
 @bp.route('/trade/<int:trade_id>', methods=['GET'])
+@login_required
 def get_trade_tags(trade_id):
     """Get all tags for a specific trade"""
-    db = get_db()
+    db = get_trade_db()
     conn = db.get_connection()
     cursor = conn.cursor()
     
-    cursor.execute('''
-        SELECT t.* FROM tags t
-        JOIN trade_tags tt ON t.id = tt.tag_id
-        WHERE tt.trade_id = ?
-    ''', (trade_id,))
-    
-    tags = [dict(row) for row in cursor.fetchall()]
+    catalogue = tag_catalogue.get(conn, current_app.config['DATABASE'])
+    cursor.execute('SELECT tag_id FROM trade_tags WHERE trade_id = ? ORDER BY tag_id', (trade_id,))
+    tags = [catalogue[row['tag_id']] for row in cursor.fetchall() if row['tag_id'] in catalogue]
     conn.close()
     
     return jsonify(tags)
 
 @bp.route('/trade/<int:trade_id>/add', methods=['POST'])
+@login_required
 def add_tag_to_trade(trade_id):
     """Add a tag to a trade"""
     data = request.json
@@ -72,7 +89,7 @@ def add_tag_to_trade(trade_id):
     if not tag_id:
         return jsonify({'error': 'tag_id is required'}), 400
     
-    db = get_db()
+    db = get_trade_db()
     conn = db.get_connection()
     cursor = conn.cursor()
     
@@ -84,12 +101,14 @@ def add_tag_to_trade(trade_id):
         conn.commit()
         conn.close()
         
+        publish_trade_change(current_app.config['DATABASE'], current_user.id, 'tagged', trade_id)
         return jsonify({'success': True})
     except Exception as e:
         conn.close()
         return jsonify({'error': str(e)}), 400
 
 @bp.route('/trade/<int:trade_id>/remove', methods=['POST'])
+@login_required
 def remove_tag_from_trade(trade_id):
     """Remove a tag from a trade"""
     data = request.json
@@ -98,7 +117,7 @@ def remove_tag_from_trade(trade_id):
     if not tag_id:
         return jsonify({'error': 'tag_id is required'}), 400
     
-    db = get_db()
+    db = get_trade_db()
     conn = db.get_connection()
     cursor = conn.cursor()
     
@@ -109,4 +128,119 @@ def remove_tag_from_trade(trade_id):
     conn.commit()
     conn.close()
     
-    return jsonify({'success': True})
\ No newline at end of file
+    publish_trade_change(current_app.config['DATABASE'], current_user.id, 'tagged', trade_id)
+    return jsonify({'success': True})
+
+@bp.route('/trade/<int:trade_id>', methods=['PUT'])
+@login_required
+def set_trade_tags(trade_id):
+    """Replace a trade's tags with {"tag_ids": [...]} in one transaction"""
+    data = request.json or {}
+    tag_ids = parse_tag_ids(data.get('tag_ids'))
+    
+    if tag_ids is None:
+        return jsonify({'error': 'tag_ids must be a list of tag ids'}), 400
+    
+    db = get_trade_db()
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    
+    # Archived trades are read-only: only the hot table is matched
+    cursor.execute('SELECT 1 FROM trades WHERE id = ? AND user_id = ?', (trade_id, current_user.id))
+    if not cursor.fetchone():
+        conn.close()
+        return jsonify({'error': 'Trade not found or access denied'}), 404
+    
+    unknown = unknown_tags(conn, tag_ids)
+    if unknown:
+        conn.close()
+        return jsonify({'error': f'Unknown tag ids: {unknown}'}), 400
+    
+    placeholders = ', '.join('?' * len(tag_ids))
+    # Only links that actually change are written (and logged for delta sync)
+    cursor.execute(f'''
+        DELETE FROM trade_tags
+        WHERE trade_id = (SELECT id FROM trades WHERE id = ? AND user_id = ?)
+          AND tag_id NOT IN ({placeholders})
+    ''', (trade_id, current_user.id, *tag_ids))
+    removed = cursor.rowcount
+    cursor.execute(f'''
+        INSERT OR IGNORE INTO trade_tags (trade_id, tag_id)
+        SELECT t.id, g.id FROM trades t JOIN tags g
+        WHERE t.id = ? AND t.user_id = ? AND g.id IN ({placeholders})
+    ''', (trade_id, current_user.id, *tag_ids))
+    added = cursor.rowcount
+    conn.commit()
+    conn.close()
+    
+    if added or removed:
+        publish_trade_change(current_app.config['DATABASE'], current_user.id, 'tagged', trade_id)
+    return jsonify({'success': True, 'tag_ids': tag_ids, 'added': added, 'removed': removed})
+
+@bp.route('/bulk', methods=['POST'])
+@login_required
+def bulk_tag_trades():
+    """Add and/or remove tags across many of the current user's trades.
+    
+    Body: {"add": [tag ids], "remove": [tag ids], "trade_ids": [...]} or
+    {"add": [...], "filter": {"pair": "EURUSD", "from": "2025-01-01", ...}}
+    (see trade_filter). Trades are matched and checked for ownership in
+    SQL, and each side is a single statement.
+    """
+    data = request.json or {}
+    add = parse_tag_ids(data.get('add', []))
+    remove = parse_tag_ids(data.get('remove', []))
+    
+    if add is None or remove is None:
+        return jsonify({'error': 'add and remove must be lists of tag ids'}), 400
+    if not add and not remove:
+        return jsonify({'error': 'Nothing to add or remove'}), 400
+    if set(add) & set(remove):
+        return jsonify({'error': 'A tag cannot be both added and removed'}), 400
+    if ('trade_ids' in data) == ('filter' in data):
+        return jsonify({'error': 'Give either trade_ids or filter'}), 400
+    
+    filters = {'ids': data['trade_ids']} if 'trade_ids' in data else data['filter']
+    if not isinstance(filters, dict):
+        return jsonify({'error': 'filter must be an object'}), 400
+    try:
+        where, params = trade_filter(filters, alias='t')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    db = get_trade_db()
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    
+    unknown = unknown_tags(conn, add + remove)
+    if unknown:
+        conn.close()
+        return jsonify({'error': f'Unknown tag ids: {unknown}'}), 400
+    
+    # The user's (hot) trades matching the request
+    matched = f'SELECT t.id FROM trades t WHERE t.user_id = ? AND {where}'
+    scope = (current_user.id, *params)
+    
+    cursor.execute(f'SELECT COUNT(*) FROM ({matched})', scope)
+    trades = cursor.fetchone()[0]
+    
+    added = removed = 0
+    if remove:
+        cursor.execute(f'''
+            DELETE FROM trade_tags
+            WHERE tag_id IN ({', '.join('?' * len(remove))}) AND trade_id IN ({matched})
+        ''', (*remove, *scope))
+        removed = cursor.rowcount
+    if add:
+        cursor.execute(f'''
+            INSERT OR IGNORE INTO trade_tags (trade_id, tag_id)
+            SELECT m.id, g.id FROM ({matched}) m JOIN tags g
+            WHERE g.id IN ({', '.join('?' * len(add))})
+        ''', (*scope, *add))
+        added = cursor.rowcount
+    conn.commit()
+    conn.close()
+    
+    if added or removed:
+        publish_trade_change(current_app.config['DATABASE'], current_user.id, 'tagged', None)
+    return jsonify({'success': True, 'trades': trades, 'added': added, 'removed': removed})
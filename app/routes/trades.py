@@ -1,41 +1,219 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, Response, request, jsonify, current_app
 from flask_login import login_required, current_user
-from app.models.database import Database
+from app.models.database import tuple_cursor, iter_dicts, derived_trade_expressions, derived_trade_assignments
+from app.models.archive import TradeArchive, trades_source, trade_tags_source
+from app.models.sharding import get_router
+from app.models.change_log import changes_since
+from app.models.trade_filters import trade_filter, EQUALITY_FILTERS, RANGE_FILTERS
+from app.services.events import publish_trade_change
+from app.services.conditional import conditional, user_etag
+from app.services.tag_catalogue import tag_catalogue
 from datetime import datetime
+import math
 
 bp = Blueprint('trades', __name__, url_prefix='/api/trades')
 
+# Most trades a single /changes response returns
+MAX_CHANGES_PAGE = 2000
+# Page size of /search, by default and at most
+SEARCH_PAGE_SIZE = 50
+MAX_SEARCH_PAGE = 200
+# Rows read and written per chunk of a streamed list or CSV export
+EXPORT_BATCH_SIZE = 1000
+
 def get_db():
-    return Database(current_app.config['DATABASE'])
+    # The current user's shard when sharding is enabled
+    return get_router(current_app.config['DATABASE']).for_user(current_user.id)
+
+def trades_etag():
+    return user_etag(current_user.id)
+
+def trade_tags(conn, trade_ids_sql, params=()):
+    """trade id -> its tags, named from the tag catalogue.
+    
+    `trade_ids_sql` selects the trade ids; the links of all of them come
+    back in one query, without joining tags.
+    """
+    catalogue = tag_catalogue.get(conn, current_app.config['DATABASE'])
+    cursor = tuple_cursor(conn)
+    cursor.execute(f'''
+        SELECT trade_id, tag_id FROM {trade_tags_source(conn)} tt
+        WHERE trade_id IN ({trade_ids_sql})
+        ORDER BY tag_id
+    ''', params)
+    
+    tags = {}
+    for trade_id, tag_id in cursor:
+        # Links to a deleted tag are skipped, as the join used to
+        if tag_id in catalogue:
+            tags.setdefault(trade_id, []).append(catalogue[tag_id])
+    return tags
+
+def attach_tags(conn, trades, trade_ids_sql, params=()):
+    """Set each trade's 'tags' (see trade_tags)"""
+    tags = trade_tags(conn, trade_ids_sql, params)
+    for trade in trades:
+        trade['tags'] = tags.get(trade['id'], [])
 
 @bp.route('/', methods=['GET'])
 @login_required
+@conditional(trades_etag)
 def get_trades():
-    """Get all trades for current user"""
+    """Get all trades for current user (optionally ?from=<entry date>)"""
+    since = request.args.get('from')
+    
     db = get_db()
     conn = db.get_connection()
-    cursor = conn.cursor()
     
-    cursor.execute('''
-        SELECT * FROM trades 
-        WHERE user_id = ?
+    # Archived trades are only read when the range reaches back that far
+    source = trades_source(conn, db.db_path, since)
+    scope = 'user_id = ? AND (? IS NULL OR entry_time >= ?)'
+    params = (current_user.id, since, since)
+    # Tag links are few and read up front; the trades themselves are streamed
+    tags = trade_tags(conn, f'SELECT id FROM {source} WHERE {scope}', params)
+    rows = tuple_cursor(conn)
+    rows.execute(f'''
+        SELECT * FROM {source}
+        WHERE {scope}
         ORDER BY entry_time DESC
-    ''', (current_user.id,))
+    ''', params)
+    columns = [column[0] for column in rows.description]
+    dumps = current_app.json.dumps
     
-    trades = [dict(row) for row in cursor.fetchall()]
+    # A batch of tuples at a time, each made a dict only to be encoded
+    def generate():
+        separator = '['
+        while True:
+            batch = rows.fetchmany(EXPORT_BATCH_SIZE)
+            if not batch:
+                break
+            encoded = []
+            for row in batch:
+                trade = dict(zip(columns, row))
+                trade['tags'] = tags.get(trade['id'], [])
+                encoded.append(dumps(trade))
+            yield separator + ','.join(encoded)
+            separator = ','
+        yield '[]\n' if separator == '[' else ']\n'
     
-    # Get tags for each trade
-    for trade in trades:
-        cursor.execute('''
-            SELECT t.* FROM tags t
-            JOIN trade_tags tt ON t.id = tt.tag_id
-            WHERE tt.trade_id = ?
-        ''', (trade['id'],))
-        trade['tags'] = [dict(row) for row in cursor.fetchall()]
+    output = Response(generate(), mimetype='application/json')
+    output.call_on_close(conn.close)
+    return output
+
+@bp.route('/changes', methods=['GET'])
+@login_required
+def get_trade_changes():
+    """Trades inserted, updated or deleted after ?since=<cursor> (delta sync).
+
+    since=0 (or a cursor too old to sync) returns reset=true: reload the
+    full list from GET /api/trades/, then continue from the returned cursor.
+    Page with ?limit= while has_more is true.
+    """
+    since = request.args.get('since', type=int)
+    if since is None:
+        return jsonify({'error': 'since is required'}), 400
+    limit = max(1, min(request.args.get('limit', 500, type=int), MAX_CHANGES_PAGE))
+    
+    db = get_db()
+    conn = db.get_connection()
+    
+    result = changes_since(conn, current_user.id, since, limit)
+    changed_ids = [trade_id for trade_id, op in result['changes'] if op != 'delete']
+    
+    trades = []
+    if changed_ids:
+        placeholders = ', '.join('?' * len(changed_ids))
+        # The trade may have been archived since it changed
+        source = trades_source(conn, db.db_path)
+        rows = tuple_cursor(conn)
+        rows.execute(f'''
+            SELECT * FROM {source}
+            WHERE user_id = ? AND id IN ({placeholders})
+        ''', (current_user.id, *changed_ids))
+        trades = list(iter_dicts(rows))
+        attach_tags(conn, trades, placeholders, changed_ids)
+    
+    conn.close()
+    
+    found = {trade['id'] for trade in trades}
+    return jsonify({
+        'cursor': result['cursor'],
+        'reset': result['reset'],
+        'has_more': result['has_more'],
+        'trades': trades,
+        'deleted': [trade_id for trade_id, op in result['changes'] if trade_id not in found]
+    })
+
+@bp.route('/search', methods=['GET'])
+@login_required
+@conditional(trades_etag)
+def search_trades():
+    """Filter and search the current user's trades, newest entry first.
+    
+    Filters: pair, session, setup_type, timeframe, trade_type, status
+    (repeat for several values), from/to (entry time), min_pnl/max_pnl,
+    min_r/max_r, tags=<id>,<id> with tag_mode=any|all, and q - words
+    searched in the notes (full-text, prefix matching). Page with ?limit=
+    and the returned next_cursor as ?cursor=. Archived trades are not
+    searched.
+    """
+    filters = {}
+    for key in EQUALITY_FILTERS:
+        values = request.args.getlist(key)
+        if values:
+            filters[key] = values
+    for key in ('from', 'to', 'q', *RANGE_FILTERS):
+        if request.args.get(key):
+            filters[key] = request.args[key]
+    
+    tags = [tag for value in request.args.getlist('tags') for tag in value.split(',') if tag]
+    tag_mode = request.args.get('tag_mode', 'any')
+    if tag_mode not in ('any', 'all'):
+        return jsonify({'error': 'tag_mode must be any or all'}), 400
+    if tags:
+        if not all(tag.isdigit() for tag in tags):
+            return jsonify({'error': 'tags must be tag ids'}), 400
+        filters[f'tags_{tag_mode}'] = [int(tag) for tag in tags]
+    
+    try:
+        where, params = trade_filter(filters, alias='t')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Keyset pagination: the (entry_time, id) of the last trade on the previous page
+    cursor_value = request.args.get('cursor')
+    if cursor_value:
+        entry_time, _, last_id = cursor_value.rpartition('|')
+        if not entry_time or not last_id.isdigit():
+            return jsonify({'error': 'Invalid cursor'}), 400
+        where += ' AND (t.entry_time, t.id) < (?, ?)'
+        params += [entry_time, int(last_id)]
+    limit = max(1, min(request.args.get('limit', SEARCH_PAGE_SIZE, type=int), MAX_SEARCH_PAGE))
+    
+    db = get_db()
+    conn = db.get_connection()
+    rows = tuple_cursor(conn)
+    # Walks the (user_id, entry_time) index newest first and stops at a full page
+    rows.execute(f'''
+        SELECT t.* FROM trades t
+        WHERE t.user_id = ? AND {where}
+        ORDER BY t.entry_time DESC, t.id DESC
+        LIMIT ?
+    ''', (current_user.id, *params, limit + 1))
+    trades = list(iter_dicts(rows))
     
+    has_more = len(trades) > limit
+    trades = trades[:limit]
+    if trades:
+        attach_tags(conn, trades, ', '.join('?' * len(trades)), [trade['id'] for trade in trades])
     conn.close()
     
-    return jsonify(trades)
+    last = trades[-1] if has_more else None
+    return jsonify({
+        'trades': trades,
+        'has_more': has_more,
+        'next_cursor': f"{last['entry_time']}|{last['id']}" if last else None
+    })
 
 @bp.route('/', methods=['POST'])
 @login_required
@@ -60,45 +238,61 @@ def create_trade():
     # Calculate risk percentage
     risk_percentage = (risk / entry * 100) if entry > 0 else 0
     
+    # NaN/Infinity would be stored and flow into profit_loss and r_multiple
+    if not all(math.isfinite(value) for value in
+               (entry, sl, tp, position_size, risk_amount, reward_amount, rr_ratio, risk_percentage)):
+        return jsonify({'error': 'Prices and position size must be finite numbers'}), 400
+    
     db = get_db()
     conn = db.get_connection()
     cursor = conn.cursor()
     
-    cursor.execute('''
+    # Derived columns are computed in the same INSERT, from the values being written
+    derived = derived_trade_expressions(
+        entry_time=':entry_time', risk_amount=':risk_amount', exit_time='NULL', profit_loss='NULL'
+    )
+    cursor.execute(f'''
         INSERT INTO trades (
             user_id, pair, session, timeframe, setup_type, trade_type,
             entry_price, stop_loss, take_profit, position_size,
             risk_amount, reward_amount, risk_reward_ratio, risk_percentage,
             confidence, emotion_before, rule_followed,
-            entry_time, status, notes
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (
-        current_user.id,  # ADD USER ID HERE
-        data['pair'],
-        data['session'],
-        data['timeframe'],
-        data['setup_type'],
-        data['trade_type'],
-        entry,
-        sl,
-        tp,
-        position_size,
-        risk_amount,
-        reward_amount,
-        rr_ratio,
-        risk_percentage,
-        data.get('confidence'),
-        data.get('emotion_before'),
-        1 if data.get('rule_followed') == 'yes' else 0,
-        data.get('entry_time', datetime.now().isoformat()),
-        'open',
-        data.get('notes', '')
-    ))
+            entry_time, status, notes, {', '.join(derived)}
+        ) VALUES (
+            :user_id, :pair, :session, :timeframe, :setup_type, :trade_type,
+            :entry_price, :stop_loss, :take_profit, :position_size,
+            :risk_amount, :reward_amount, :risk_reward_ratio, :risk_percentage,
+            :confidence, :emotion_before, :rule_followed,
+            :entry_time, 'open', :notes, {', '.join(derived.values())}
+        )
+    ''', {
+        'user_id': current_user.id,
+        'pair': data['pair'],
+        'session': data['session'],
+        'timeframe': data['timeframe'],
+        'setup_type': data['setup_type'],
+        'trade_type': data['trade_type'],
+        'entry_price': entry,
+        'stop_loss': sl,
+        'take_profit': tp,
+        'position_size': position_size,
+        'risk_amount': risk_amount,
+        'reward_amount': reward_amount,
+        'risk_reward_ratio': rr_ratio,
+        'risk_percentage': risk_percentage,
+        'confidence': data.get('confidence'),
+        'emotion_before': data.get('emotion_before'),
+        'rule_followed': 1 if data.get('rule_followed') == 'yes' else 0,
+        'entry_time': data.get('entry_time', datetime.now().isoformat()),
+        'notes': data.get('notes', '')
+    })
     
     trade_id = cursor.lastrowid
     conn.commit()
     conn.close()
     
+    publish_trade_change(current_app.config['DATABASE'], current_user.id, 'created', trade_id)
+    
     return jsonify({
         'success': True,
         'trade_id': trade_id,
@@ -116,7 +310,10 @@ def close_trade(trade_id):
     cursor = conn.cursor()
     
     # Get trade details - verify ownership
-    cursor.execute('SELECT * FROM trades WHERE id = ? AND user_id = ?', (trade_id, current_user.id))
+    cursor.execute(
+        'SELECT entry_price, position_size, trade_type FROM trades WHERE id = ? AND user_id = ?',
+        (trade_id, current_user.id)
+    )
     trade = cursor.fetchone()
     
     if not trade:
@@ -133,15 +330,34 @@ def close_trade(trade_id):
     else:
         profit_loss = (entry_price - exit_price) * position_size
     
-    cursor.execute('''
+    if not math.isfinite(profit_loss):
+        conn.close()
+        return jsonify({'error': 'Exit price must be a finite number'}), 400
+    
+    exit_time = datetime.now()
+    # One UPDATE, derived columns included: its expressions see the row before
+    # the update, so they read the new values from the parameters
+    cursor.execute(f'''
         UPDATE trades 
-        SET exit_price = ?, exit_time = ?, profit_loss = ?, status = 'closed'
-        WHERE id = ? AND user_id = ?
-    ''', (exit_price, datetime.now().isoformat(), profit_loss, trade_id, current_user.id))
+        SET exit_price = :exit_price, exit_time = :exit_time, profit_loss = :profit_loss, status = 'closed',
+            {derived_trade_assignments(exit_time=':exit_time', profit_loss=':profit_loss')}
+        WHERE id = :id AND user_id = :user_id
+    ''', {
+        'exit_price': exit_price,
+        'exit_time': exit_time.isoformat(),
+        'profit_loss': profit_loss,
+        'id': trade_id,
+        'user_id': current_user.id
+    })
     
     conn.commit()
     conn.close()
     
+    publish_trade_change(
+        current_app.config['DATABASE'], current_user.id, 'closed', trade_id,
+        exit_date=exit_time.date().isoformat()
+    )
+    
     return jsonify({
         'success': True,
         'profit_loss': round(profit_loss, 2)
@@ -155,39 +371,66 @@ def delete_trade(trade_id):
     conn = db.get_connection()
     cursor = conn.cursor()
     
+    # Its daily bucket changes if it was closed
+    cursor.execute('SELECT exit_date FROM trades WHERE id = ? AND user_id = ?', (trade_id, current_user.id))
+    row = cursor.fetchone()
     cursor.execute('DELETE FROM trades WHERE id = ? AND user_id = ?', (trade_id, current_user.id))
+    deleted = cursor.rowcount
     conn.commit()
     conn.close()
     
+    # Not in the hot table - it may have been archived
+    if not deleted:
+        deleted = TradeArchive(db.db_path).delete_trade(trade_id, current_user.id)
+    
+    if deleted:
+        publish_trade_change(
+            current_app.config['DATABASE'], current_user.id, 'deleted', trade_id,
+            exit_date=row['exit_date'] if row else None
+        )
+    
     return jsonify({'success': True})
 
 @bp.route('/export/csv', methods=['GET'])
 @login_required
 def export_csv():
-    """Export current user's trades to CSV"""
+    """Export current user's trades to CSV (optionally ?from=<entry date>)"""
     import csv
     from io import StringIO
-    from flask import make_response
+    
+    since = request.args.get('from')
     
     db = get_db()
     conn = db.get_connection()
-    cursor = conn.cursor()
+    cursor = tuple_cursor(conn)
     
-    cursor.execute('SELECT * FROM trades WHERE user_id = ? ORDER BY entry_time DESC', (current_user.id,))
-    trades = [dict(row) for row in cursor.fetchall()]
-    conn.close()
+    source = trades_source(conn, db.db_path, since)
+    cursor.execute(f'''
+        SELECT * FROM {source}
+        WHERE user_id = ? AND (? IS NULL OR entry_time >= ?)
+        ORDER BY entry_time DESC
+    ''', (current_user.id, since, since))
+    rows = cursor.fetchmany(EXPORT_BATCH_SIZE)
     
-    if not trades:
+    if not rows:
+        conn.close()
         return jsonify({'error': 'No trades to export'}), 404
     
-    # Create CSV
-    si = StringIO()
-    writer = csv.DictWriter(si, fieldnames=trades[0].keys())
-    writer.writeheader()
-    writer.writerows(trades)
+    # Streamed a batch at a time, so large exports never sit in memory whole
+    def generate(rows):
+        si = StringIO()
+        writer = csv.writer(si)
+        writer.writerow(column[0] for column in cursor.description)
+        while rows:
+            writer.writerows(rows)
+            yield si.getvalue()
+            si.seek(0)
+            si.truncate()
+            rows = cursor.fetchmany(EXPORT_BATCH_SIZE)
     
-    output = make_response(si.getvalue())
+    output = Response(generate(rows), mimetype='text/csv')
     output.headers["Content-Disposition"] = f"attachment; filename=trades_export_{current_user.email}.csv"
-    output.headers["Content-type"] = "text/csv"
+    # Closed when the response is done, even if the client went away mid-export
+    output.call_on_close(conn.close)
     
     return output
\ No newline at end of file
@@ -0,0 +1,119 @@
+import os
+import threading
+from datetime import datetime
+from app.models.backup import DatabaseBackup
+from app.models.archive import archive_path_for
+from app.models.sharding import get_router
+
+try:
+    import fcntl
+except ImportError:  # Windows desktop mode - single process, no lock needed
+    fcntl = None
+
+def extra_databases(db_path):
+    """(path, backup subfolder) of the archive and of every shard file and its archive"""
+    databases = [(archive_path_for(db_path), 'archive')]
+    for shard_path in get_router(db_path).shard_paths():
+        name = os.path.splitext(os.path.basename(shard_path))[0]
+        databases.append((shard_path, os.path.join('shards', name)))
+        databases.append((archive_path_for(shard_path), os.path.join('shards', f'{name}_archive')))
+    return [(path, target_dir) for path, target_dir in databases if os.path.exists(path)]
+
+class BackupScheduler:
+    """Takes periodic online backups with GFS retention, plus new screenshot files"""
+
+    def __init__(self, db_path, upload_folder, backup_dir='backups', interval_minutes=60,
+                 incremental=True, keep_hourly=24, keep_daily=7, keep_weekly=4,
+                 io_limit_mb=None, codec='gzip', level=None, workers=None):
+        self.db_path = db_path
+        self.upload_folder = upload_folder
+        self.backup_dir = backup_dir
+        self.interval_seconds = interval_minutes * 60
+        self.incremental = incremental
+        self.retention = {'hourly': keep_hourly, 'daily': keep_daily, 'weekly': keep_weekly}
+        self.io_limit = int(io_limit_mb * 1024 * 1024) if io_limit_mb else None
+        self.codec = codec
+        # Level and threads apply to full (non-incremental) backups; one thread
+        # unless configured, so scheduled backups don't compete with requests
+        self.level = level
+        self.workers = workers or 1
+        self._stop = threading.Event()
+        self._lock_file = None
+
+    def _acquire_lock(self):
+        """Only one process (e.g. one of several preforked workers) runs backups"""
+        if fcntl is None:
+            return True
+        if self._lock_file is None:
+            os.makedirs(self.backup_dir, exist_ok=True)
+            self._lock_file = open(os.path.join(self.backup_dir, '.scheduler.lock'), 'w')
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            return False
+
+    def run_once(self):
+        """Take one backup, copy new screenshots and apply retention"""
+        # Fresh instance per run so the I/O throttle measures this run only
+        backup_system = DatabaseBackup(
+            self.db_path,
+            backup_dir=self.backup_dir,
+            codec=self.codec,
+            level=self.level,
+            workers=self.workers,
+            io_limit=self.io_limit
+        )
+
+        if self.incremental:
+            backup_file = backup_system.create_incremental_backup()
+        else:
+            backup_file = backup_system.create_backup()
+
+        screenshots = backup_system.backup_screenshots(self.upload_folder)
+        removed = backup_system.apply_retention(
+            hourly=self.retention['hourly'],
+            daily=self.retention['daily'],
+            weekly=self.retention['weekly']
+        )
+
+        result = {
+            'backup': backup_file,
+            'screenshots_copied': screenshots,
+            'backups_removed': removed
+        }
+
+        # Archived trades and shard files, each with its own chunk-deduplicated snapshots
+        for path, target_dir in extra_databases(self.db_path):
+            extra_backup = DatabaseBackup(
+                path,
+                backup_dir=os.path.join(self.backup_dir, target_dir),
+                workers=1,
+                io_limit=self.io_limit
+            )
+            result.setdefault('extra_backups', {})[target_dir] = extra_backup.create_incremental_backup()
+            extra_backup.apply_retention(
+                hourly=self.retention['hourly'],
+                daily=self.retention['daily'],
+                weekly=self.retention['weekly']
+            )
+
+        return result
+
+    def run_forever(self):
+        while not self._stop.wait(self.interval_seconds):
+            if not self._acquire_lock():
+                continue
+            try:
+                result = self.run_once()
+                print(f"[{datetime.now().isoformat()}] Scheduled backup: {result}")
+            except Exception as e:
+                print(f"Scheduled backup failed: {e}")
+
+    def start_thread(self):
+        thread = threading.Thread(target=self.run_forever, name='backup-scheduler', daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self._stop.set()
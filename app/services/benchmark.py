@@ -0,0 +1,537 @@
+import io
+import json
+import math
+import multiprocessing
+import os
+import platform
+import sqlite3
+import sys
+import threading
+import time
+import tracemalloc
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from app.services.seeder import TradeSeeder, SEED_PASSWORD
+
+try:
+    import resource
+except ImportError:  # Windows - peak RSS is not reported
+    resource = None
+
+DEFAULT_SIZES = (1000, 100000, 1000000)
+BENCH_USER = 'seed_user_1@example.com'
+
+# Statements that are bookkeeping (or slow-log plans) rather than queries
+UNCOUNTED_STATEMENTS = ('BEGIN', 'COMMIT', 'ROLLBACK', 'PRAGMA', 'EXPLAIN', '--')
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    rank = math.ceil(pct / 100 * len(ordered))
+    return ordered[max(rank, 1) - 1]
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def summarize(latencies, wall_seconds):
+    """Latency percentiles in milliseconds plus throughput"""
+    return {
+        'requests': len(latencies),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 2),
+        'throughput_rps': round(len(latencies) / wall_seconds, 1) if wall_seconds else None
+    }
+
+class QueryCounter:
+    """Counts SQL statements run through Database connections on this thread"""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._original = None
+
+    @property
+    def count(self):
+        return getattr(self._local, 'count', 0)
+
+    def reset(self):
+        self._local.count = 0
+
+    def _trace(self, statement):
+        if not statement.lstrip().upper().startswith(UNCOUNTED_STATEMENTS):
+            self._local.count = self.count + 1
+
+    def install(self):
+        from app.models.database import Database
+        self._original = Database.get_connection
+        counter = self
+
+        def get_connection(database):
+            conn = counter._original(database)
+            conn.set_trace_callback(counter._trace)
+            return conn
+
+        Database.get_connection = get_connection
+
+    def uninstall(self):
+        from app.models.database import Database
+        if self._original:
+            Database.get_connection = self._original
+            self._original = None
+
+def sample_png():
+    """A small valid PNG for the upload benchmark"""
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new('RGB', (320, 200), (30, 34, 42)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+def build_endpoints(trade_id, tag_id, year, month):
+    """(name, method, path, body) for every API route worth timing.
+
+    Bodies are callables so each request gets a fresh payload. Tag add and
+    remove alternate on the same trade so the data set doesn't drift.
+    """
+    png = sample_png()
+
+    def upload_body():
+        return {
+            'data': {
+                'file': (io.BytesIO(png), 'chart.png'),
+                'trade_id': str(trade_id),
+                'type': 'before'
+            },
+            'content_type': 'multipart/form-data'
+        }
+
+    return [
+        ('trades_list', 'GET', '/api/trades/', None),
+        ('trades_export_csv', 'GET', '/api/trades/export/csv', None),
+        ('stats_overall', 'GET', '/api/statistics/overall', None),
+        ('stats_daily_30', 'GET', '/api/statistics/daily/30', None),
+        ('stats_session', 'GET', '/api/statistics/session', None),
+        ('stats_setup', 'GET', '/api/statistics/setup', None),
+        ('stats_mistakes', 'GET', '/api/statistics/mistakes', None),
+        ('stats_hour', 'GET', '/api/statistics/hour', None),
+        ('stats_weekday', 'GET', '/api/statistics/weekday', None),
+        ('monthly_report', 'GET', f'/api/statistics/monthly-report/{year}/{month}', None),
+        ('tags_list', 'GET', '/api/tags/', None),
+        ('trade_tags', 'GET', f'/api/tags/trade/{trade_id}', None),
+        ('tag_add', 'POST', f'/api/tags/trade/{trade_id}/add', lambda: {'json': {'tag_id': tag_id}}),
+        ('tag_remove', 'POST', f'/api/tags/trade/{trade_id}/remove', lambda: {'json': {'tag_id': tag_id}}),
+        ('tag_set', 'PUT', f'/api/tags/trade/{trade_id}', lambda: {'json': {'tag_ids': []}}),
+        ('screenshot_upload', 'POST', '/api/screenshots/upload', upload_body),
+        ('screenshot_view', 'GET', None, None)
+    ]
+
+class EndpointBenchmark:
+    """Seeds databases of several sizes and times every API route against them.
+
+    Each size runs in a fresh process so peak RSS belongs to that size alone.
+    Routes are driven sequentially through the Flask test client (latency and
+    query counts), then concurrently over HTTP against a local threaded server
+    (throughput under contention). Seeded databases are kept in work_dir and
+    reused by later runs with the same size and seed.
+    """
+
+    def __init__(self, work_dir='database/bench', sizes=DEFAULT_SIZES, seed=42,
+                 iterations=20, time_budget=30.0, concurrency=8, duration=10.0):
+        self.work_dir = os.path.abspath(work_dir)
+        self.sizes = sizes
+        self.seed = seed
+        self.iterations = iterations
+        self.time_budget = time_budget
+        self.concurrency = concurrency
+        self.duration = duration
+
+    def database_for(self, size):
+        return os.path.join(self.work_dir, f'bench_{size}_seed{self.seed}.db')
+
+    def prepare(self, size):
+        """Seed (once) a database holding `size` trades for the bench user"""
+        db_path = self.database_for(size)
+        if os.path.exists(db_path):
+            return db_path, None
+
+        os.makedirs(self.work_dir, exist_ok=True)
+        partial = f'{db_path}.seeding'
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(partial + suffix):
+                os.remove(partial + suffix)
+
+        # Fixed end date: the same seed always yields the same trades
+        summary = TradeSeeder(partial, seed=self.seed).seed(
+            users=1, trades_per_user=size, end_date=datetime(2025, 1, 1)
+        )
+        os.replace(partial, db_path)
+        for suffix in ('.migrate.lock', '.backfill.lock'):
+            if os.path.exists(partial + suffix):
+                os.remove(partial + suffix)
+        return db_path, summary['seconds']
+
+    def run(self, progress=print):
+        results = {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'settings': {
+                'seed': self.seed,
+                'iterations': self.iterations,
+                'time_budget': self.time_budget,
+                'concurrency': self.concurrency,
+                'duration': self.duration
+            },
+            'sizes': {}
+        }
+
+        context = multiprocessing.get_context('spawn')
+        for size in self.sizes:
+            db_path, seed_seconds = self.prepare(size)
+            if seed_seconds is not None:
+                progress(f"✓ Seeded {size} trades in {seed_seconds}s")
+
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                result = pool.submit(run_size, self, size, db_path).result()
+            if seed_seconds is not None:
+                result['seed_seconds'] = seed_seconds
+
+            results['sizes'][str(size)] = result
+            progress(f"✓ Benchmarked {size} trades (peak RSS {result['peak_rss_mb']} MB)")
+
+        return results
+
+    def time_sequential(self, client, counter, endpoints, view_path):
+        """Per-route latency and query count through the test client"""
+        results = {}
+
+        for name, method, path, body in endpoints:
+            path = path or view_path
+            if path is None:
+                continue
+
+            latencies = []
+            queries = 0
+            status = None
+            budget_end = time.perf_counter() + self.time_budget
+
+            # At least 3 samples even when a single request blows the budget
+            for i in range(self.iterations):
+                kwargs = body() if body else {}
+                counter.reset()
+                started = time.perf_counter()
+                response = client.open(path, method=method, **kwargs)
+                response.get_data()
+                latencies.append(time.perf_counter() - started)
+                queries = counter.count
+                status = response.status_code
+                response.close()
+
+                if name == 'screenshot_upload' and status == 200:
+                    view_path = response.get_json()['url']
+                if i >= 2 and time.perf_counter() > budget_end:
+                    break
+
+            results[name] = {
+                **summarize(latencies, sum(latencies)),
+                'status': status,
+                'queries': queries,
+                'peak_rss_mb': peak_rss_mb()
+            }
+
+        return results, view_path
+
+    def time_concurrent(self, app, endpoints, view_path):
+        """Throughput of each read route with `concurrency` clients over HTTP"""
+        from werkzeug.serving import make_server, WSGIRequestHandler
+
+        class QuietHandler(WSGIRequestHandler):
+            def log_request(self, *args, **kwargs):
+                pass
+
+        server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        base_url = f'http://127.0.0.1:{server.port}'
+
+        try:
+            login = urllib.request.Request(
+                f'{base_url}/auth/login',
+                data=json.dumps({'email': BENCH_USER, 'password': SEED_PASSWORD}).encode(),
+                headers={'Content-Type': 'application/json'}
+            )
+            with urllib.request.urlopen(login) as response:
+                cookies = [header.split(';', 1)[0] for header in response.headers.get_all('Set-Cookie')]
+            cookie_header = '; '.join(cookies)
+
+            def fetch(url):
+                request = urllib.request.Request(url, headers={'Cookie': cookie_header})
+                started = time.perf_counter()
+                with urllib.request.urlopen(request) as response:
+                    response.read()
+                return time.perf_counter() - started
+
+            def worker(url, deadline):
+                latencies = [fetch(url)]
+                while time.perf_counter() < deadline:
+                    latencies.append(fetch(url))
+                return latencies
+
+            results = {}
+            for name, method, path, body in endpoints:
+                path = path or view_path
+                if method != 'GET' or path is None:
+                    continue
+
+                started = time.perf_counter()
+                deadline = started + self.duration
+                with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+                    futures = [pool.submit(worker, base_url + path, deadline) for _ in range(self.concurrency)]
+                    latencies = [latency for future in futures for latency in future.result()]
+
+                results[name] = summarize(latencies, time.perf_counter() - started)
+        finally:
+            server.shutdown()
+
+        return results
+
+def run_size(bench, size, db_path):
+    """Benchmark one seeded database. Runs in its own (spawned) process."""
+    os.environ['DATABASE_PATH'] = db_path
+    from app import create_app
+
+    app = create_app()
+    app.config['TESTING'] = True
+    # Uploads land next to the benchmark databases, never in the real folder
+    app.config['UPLOAD_FOLDER'] = os.path.join(bench.work_dir, f'screenshots_{size}')
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+
+    conn = sqlite3.connect(db_path)
+    user_id = conn.execute('SELECT id FROM users WHERE email = ?', (BENCH_USER,)).fetchone()[0]
+    trade_id, latest_exit = conn.execute(
+        'SELECT MAX(id), MAX(exit_date) FROM trades WHERE user_id = ?', (user_id,)
+    ).fetchone()
+    tag_id = conn.execute('SELECT MIN(id) FROM tags').fetchone()[0]
+    # Make sure tag_add starts from a clean state
+    conn.execute('DELETE FROM trade_tags WHERE trade_id = ? AND tag_id = ?', (trade_id, tag_id))
+    conn.commit()
+    conn.close()
+
+    year, month = (int(part) for part in latest_exit.split('-')[:2])
+    endpoints = build_endpoints(trade_id, tag_id, year, month)
+
+    client = app.test_client()
+    response = client.post('/auth/login', json={'email': BENCH_USER, 'password': SEED_PASSWORD})
+    if response.status_code != 200:
+        raise RuntimeError(f'Benchmark login failed: {response.status_code}')
+
+    counter = QueryCounter()
+    counter.install()
+    try:
+        sequential, view_path = bench.time_sequential(client, counter, endpoints, None)
+    finally:
+        counter.uninstall()
+
+    concurrent = bench.time_concurrent(app, endpoints, view_path) if bench.concurrency > 0 else {}
+
+    return {
+        'trades': size,
+        'database_mb': round(os.path.getsize(db_path) / (1024 * 1024), 1),
+        'peak_rss_mb': peak_rss_mb(),
+        'sequential': sequential,
+        'concurrent': concurrent
+    }
+
+def compare_results(current, baseline, threshold=0.2, min_delta_ms=1.0):
+    """List regressions of `current` against `baseline`.
+
+    A route regresses when its p95 grows by more than `threshold` (and by at
+    least `min_delta_ms`, to ignore noise on sub-millisecond routes), when it
+    runs more queries, or when concurrent throughput drops by more than
+    `threshold`. Sizes or routes missing from either run are skipped.
+    """
+    regressions = []
+
+    for size, result in current['sizes'].items():
+        base = baseline.get('sizes', {}).get(size)
+        if not base:
+            continue
+
+        for name, stats in result['sequential'].items():
+            old = base['sequential'].get(name)
+            if not old:
+                continue
+            if (stats['p95_ms'] > old['p95_ms'] * (1 + threshold)
+                    and stats['p95_ms'] - old['p95_ms'] >= min_delta_ms):
+                regressions.append(
+                    f"{size} trades {name}: p95 {old['p95_ms']} ms -> {stats['p95_ms']} ms"
+                )
+            if stats['queries'] > old['queries']:
+                regressions.append(
+                    f"{size} trades {name}: queries {old['queries']} -> {stats['queries']}"
+                )
+
+        for name, stats in result['concurrent'].items():
+            old = base.get('concurrent', {}).get(name)
+            if not old or not old['throughput_rps']:
+                continue
+            if stats['throughput_rps'] < old['throughput_rps'] * (1 - threshold):
+                regressions.append(
+                    f"{size} trades {name}: throughput {old['throughput_rps']} -> "
+                    f"{stats['throughput_rps']} req/s"
+                )
+
+        if base.get('peak_rss_mb') and result.get('peak_rss_mb'):
+            if result['peak_rss_mb'] > base['peak_rss_mb'] * (1 + threshold):
+                regressions.append(
+                    f"{size} trades: peak RSS {base['peak_rss_mb']} MB -> {result['peak_rss_mb']} MB"
+                )
+
+    return regressions
+
+PAYLOAD_SIZES = (10000, 100000)
+
+def trade_payload(size, seed=42):
+    """`size` trades shaped like a GET /api/trades/ response"""
+    from app.services.seeder import TRADE_COLUMNS
+    seeder = TradeSeeder(None, seed=seed)
+    start = datetime(2024, 1, 1)
+    payload = []
+    for trade_id in range(1, size + 1):
+        entry_time = start + timedelta(minutes=trade_id * 37)
+        trade = dict(zip(TRADE_COLUMNS, seeder.generate_trade(1, entry_time, 0.45, 1.8, 0.02, 0.1)))
+        trade['id'] = trade_id
+        trade['created_at'] = entry_time.strftime('%Y-%m-%d %H:%M:%S')
+        trade['tags'] = [{'id': 1, 'name': 'FOMO', 'color': '#dc2626'}] if trade_id % 5 == 0 else []
+        payload.append(trade)
+    return payload
+
+def _best_time(func, iterations):
+    """Fastest of `iterations` runs (seconds) and the last result"""
+    best = None
+    for _ in range(iterations):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def bench_payloads(sizes=PAYLOAD_SIZES, iterations=3):
+    """Serialization time per JSON provider and bytes on the wire per encoding.
+
+    Encodings compress the response body as the app sends it; their time
+    is compression only, on top of serialization.
+    """
+    from flask import Flask
+    from flask.json.provider import DefaultJSONProvider
+    from app.services import compression, json_provider
+
+    app = Flask(__name__)
+    providers = [('stdlib', DefaultJSONProvider(app))]
+    if json_provider.orjson is not None:
+        providers.append(('orjson', json_provider.OrjsonProvider(app)))
+
+    encodings = [('gzip', {'level': 1}), ('gzip', {'level': 6})]
+    if compression.brotli is not None:
+        encodings += [('br', {'brotli_quality': 4}), ('br', {'brotli_quality': 6})]
+
+    results = []
+    for size in sizes:
+        payload = trade_payload(size)
+        body = None
+        for name, provider in providers:
+            with app.app_context():
+                seconds, response = _best_time(lambda: provider.response(payload), iterations)
+            body = response.get_data()
+            results.append({
+                'trades': size, 'step': 'serialize', 'name': name,
+                'ms': round(seconds * 1000, 1), 'bytes': len(body)
+            })
+
+        for encoding, options in encodings:
+            seconds, compressed = _best_time(
+                lambda: compression.compress_bytes(body, encoding, **options), iterations
+            )
+            setting = options.get('level', options.get('brotli_quality'))
+            results.append({
+                'trades': size, 'step': 'compress', 'name': f'{encoding}-{setting}',
+                'ms': round(seconds * 1000, 1), 'bytes': len(compressed),
+                'ratio': round(len(body) / len(compressed), 1)
+            })
+    return results
+
+MEMORY_BENCH_SIZE = 100000
+
+def _traced(func):
+    """Peak traced allocation (bytes) and wall time (seconds) of func()"""
+    tracemalloc.start()
+    try:
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    del result
+    return peak, elapsed
+
+def bench_memory(size=MEMORY_BENCH_SIZE, work_dir='database/bench', seed=42):
+    """Peak Python allocation of the statistics and trade list row loading.
+
+    'rows' is what those paths used to do - SELECT * into sqlite3.Row and a
+    dict per trade; 'narrow' is the current code: only the columns used, as
+    plain tuples, with the trade list encoded a row at a time as it
+    streams. Peaks are scaled to MB per 100k trades.
+    """
+    from app.models.database import Database, tuple_cursor, iter_dicts
+    from app.services.statistics import StatisticsService
+
+    db_path, _ = EndpointBenchmark(work_dir=work_dir, sizes=(size,), seed=seed).prepare(size)
+    database = Database(db_path)
+    conn = database.get_connection()
+    user_id = conn.execute('SELECT id FROM users WHERE email = ?', (BENCH_USER,)).fetchone()[0]
+    closed = 'SELECT {} FROM trades WHERE status = \'closed\' AND user_id = ? ORDER BY exit_time'
+    listed = 'SELECT * FROM trades WHERE user_id = ? ORDER BY entry_time DESC'
+    service = StatisticsService(db_path, user_id=user_id)
+
+    def closed_rows():
+        return [dict(row) for row in conn.execute(closed.format('*'), (user_id,)).fetchall()]
+
+    def closed_narrow():
+        return service._overall_part(database)
+
+    def listed_rows():
+        return [dict(row) for row in conn.execute(listed, (user_id,)).fetchall()]
+
+    def listed_narrow():
+        # Encoded a row at a time, as GET /api/trades/ streams it
+        for trade in iter_dicts(tuple_cursor(conn).execute(listed, (user_id,))):
+            json.dumps(trade)
+
+    steps = [
+        ('overall stats', 'rows', closed_rows),
+        ('overall stats', 'narrow', closed_narrow),
+        ('trades list', 'rows', listed_rows),
+        ('trades list', 'narrow', listed_narrow)
+    ]
+    results = []
+    try:
+        for step, name, func in steps:
+            func()  # warm the page cache
+            peak, elapsed = _traced(func)
+            results.append({
+                'trades': size, 'step': step, 'name': name,
+                'peak_mb': round(peak / (1024 * 1024) * MEMORY_BENCH_SIZE / size, 1),
+                'ms': round(elapsed * 1000, 1)
+            })
+    finally:
+        conn.close()
+    return results
@@ -0,0 +1,65 @@
+"""Pluggable screenshot capture backends.
+
+Backends run inside capture worker processes, never in a request thread.
+Each one writes a PNG to `output_path` or raises on failure.
+"""
+import os
+import importlib
+
+class CaptureBackend:
+    name = None
+
+    def capture_url(self, url, output_path):
+        raise NotImplementedError(f"{self.name} backend cannot capture URLs")
+
+    def capture_screen(self, output_path):
+        raise NotImplementedError(f"{self.name} backend cannot capture the screen")
+
+class StubCaptureBackend(CaptureBackend):
+    """Writes a local placeholder image - for tests and development"""
+    name = 'stub'
+
+    def __init__(self, source_file=None):
+        # Optional fixture PNG to copy instead of generating one
+        self.source_file = source_file or os.getenv('CAPTURE_STUB_SOURCE')
+
+    def _write(self, output_path, label):
+        if self.source_file:
+            with open(self.source_file, 'rb') as f_in, open(output_path, 'wb') as f_out:
+                f_out.write(f_in.read())
+            return
+
+        from PIL import Image, ImageDraw
+        image = Image.new('RGB', (640, 360), '#1f2937')
+        ImageDraw.Draw(image).text((16, 16), label, fill='#f9fafb')
+        image.save(output_path, 'PNG')
+
+    def capture_url(self, url, output_path):
+        self._write(output_path, f"stub capture: {url}")
+
+    def capture_screen(self, output_path):
+        self._write(output_path, "stub capture: screen")
+
+class ScreenCaptureBackend(CaptureBackend):
+    """Grabs the local display with Pillow (Windows/macOS, or X11 on Linux)"""
+    name = 'screen'
+
+    def capture_screen(self, output_path):
+        from PIL import ImageGrab
+        ImageGrab.grab().save(output_path, 'PNG')
+
+BACKENDS = {
+    StubCaptureBackend.name: StubCaptureBackend,
+    ScreenCaptureBackend.name: ScreenCaptureBackend
+}
+
+def get_capture_backend(name):
+    """Instantiate a backend by registered name or 'package.module:ClassName'"""
+    if ':' in name:
+        module_name, class_name = name.split(':', 1)
+        return getattr(importlib.import_module(module_name), class_name)()
+
+    try:
+        return BACKENDS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown capture backend: {name}")
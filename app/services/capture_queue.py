@@ -0,0 +1,271 @@
+import os
+import sqlite3
+import threading
+import time
+import multiprocessing
+from datetime import datetime, timedelta
+from app.services.screenshot import ScreenshotService
+from app.services.capture_backends import get_capture_backend
+from app.models.sharding import get_router
+
+JOB_KINDS = ('url', 'screen')
+
+# Extra lease time so a job isn't re-claimed while its own worker is reaping it
+LEASE_GRACE_SECONDS = 30
+
+class CaptureJobQueue:
+    """Persistent screenshot capture queue stored in the screenshot_jobs table"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+
+    def get_connection(self):
+        # Short busy timeout: workers and request threads share the table
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def enqueue(self, kind, trade_id, screenshot_type='before', url=None, user_id=None,
+                max_attempts=3, timeout_seconds=60):
+        """Add a capture job and return its id (user_id routes the result to the trade's shard)"""
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown capture kind: {kind}")
+
+        now = datetime.now().isoformat()
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO screenshot_jobs (
+                kind, trade_id, user_id, screenshot_type, url,
+                max_attempts, timeout_seconds, run_after, updated_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (kind, trade_id, user_id, screenshot_type, url, max_attempts, timeout_seconds, now, now))
+        job_id = cursor.lastrowid
+        conn.commit()
+        conn.close()
+        return job_id
+
+    def get(self, job_id, user_id=None):
+        """Get a job as a dict, or None (also when it isn't `user_id`'s, if given)"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        if user_id is None:
+            cursor.execute('SELECT * FROM screenshot_jobs WHERE id = ?', (job_id,))
+        else:
+            cursor.execute('SELECT * FROM screenshot_jobs WHERE id = ? AND user_id = ?', (job_id, user_id))
+        row = cursor.fetchone()
+        conn.close()
+        return dict(row) if row else None
+
+    def claim_next(self):
+        """Atomically lease the next runnable job, or return None"""
+        now = datetime.now()
+        conn = self.get_connection()
+        conn.isolation_level = None
+        cursor = conn.cursor()
+
+        try:
+            # Write lock up front so two workers can never claim the same job
+            cursor.execute('BEGIN IMMEDIATE')
+
+            # An expired lease means the worker or its dispatcher died mid-attempt:
+            # jobs with no attempts left fail here rather than being retried forever
+            cursor.execute('''
+                UPDATE screenshot_jobs
+                SET status = 'failed', error = 'Lease expired', locked_until = NULL, updated_at = ?
+                WHERE status = 'running' AND locked_until <= ? AND attempts >= max_attempts
+            ''', (now.isoformat(), now.isoformat()))
+
+            # Jobs whose worker died or overran keep their lease until it expires
+            cursor.execute('''
+                SELECT * FROM screenshot_jobs
+                WHERE (status = 'pending' AND run_after <= ?)
+                   OR (status = 'running' AND locked_until <= ?)
+                ORDER BY run_after, id
+                LIMIT 1
+            ''', (now.isoformat(), now.isoformat()))
+            row = cursor.fetchone()
+
+            if not row:
+                cursor.execute('COMMIT')
+                return None
+
+            locked_until = now + timedelta(seconds=row['timeout_seconds'] + LEASE_GRACE_SECONDS)
+            cursor.execute('''
+                UPDATE screenshot_jobs
+                SET status = 'running', attempts = attempts + 1,
+                    locked_until = ?, updated_at = ?
+                WHERE id = ?
+            ''', (locked_until.isoformat(), now.isoformat(), row['id']))
+            cursor.execute('COMMIT')
+        except Exception:
+            cursor.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+        job = dict(row)
+        job['attempts'] += 1
+        return job
+
+    def complete(self, job, filename):
+        """Mark a job done and attach the screenshot to its trade"""
+        now = datetime.now().isoformat()
+        column = 'screenshot_before' if job['screenshot_type'] == 'before' else 'screenshot_after'
+
+        router = get_router(self.db_path)
+        if router.enabled and job.get('user_id'):
+            # The owner's shard, where screenshot_jobs resolves to the attached global database
+            conn = router.for_user(job['user_id']).get_connection()
+        else:
+            conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE screenshot_jobs
+            SET status = 'done', filename = ?, error = NULL, locked_until = NULL, updated_at = ?
+            WHERE id = ?
+        ''', (filename, now, job['id']))
+        cursor.execute(
+            f'UPDATE trades SET {column} = ? WHERE id = ? AND user_id = ?',
+            (filename, job['trade_id'], job['user_id'])
+        )
+        conn.commit()
+        conn.close()
+
+    def fail(self, job, error):
+        """Record a failed attempt, scheduling a retry with backoff while attempts remain"""
+        now = datetime.now()
+
+        if job['attempts'] < job['max_attempts']:
+            status = 'pending'
+            run_after = now + timedelta(seconds=5 * 2 ** (job['attempts'] - 1))
+        else:
+            status = 'failed'
+            run_after = now
+
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE screenshot_jobs
+            SET status = ?, error = ?, run_after = ?, locked_until = NULL, updated_at = ?
+            WHERE id = ?
+        ''', (status, str(error), run_after.isoformat(), now.isoformat(), job['id']))
+        conn.commit()
+        conn.close()
+
+    def release(self, job):
+        """Put a job back to pending without using up the attempt it was leased for"""
+        now = datetime.now().isoformat()
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE screenshot_jobs
+            SET status = 'pending', attempts = MAX(attempts - 1, 0), run_after = ?,
+                locked_until = NULL, updated_at = ?
+            WHERE id = ? AND status = 'running'
+        ''', (now, now, job['id']))
+        conn.commit()
+        conn.close()
+
+def run_capture(backend_name, kind, url, output_path):
+    """Worker process entry point - performs one capture"""
+    backend = get_capture_backend(backend_name)
+    if kind == 'url':
+        backend.capture_url(url, output_path)
+    else:
+        backend.capture_screen(output_path)
+
+class CaptureWorker:
+    """Runs queued captures in a pool of worker processes, killing any that time out"""
+
+    def __init__(self, db_path, upload_folder, backend='stub', processes=2, poll_interval=1.0):
+        self.queue = CaptureJobQueue(db_path)
+        self.screenshots = ScreenshotService(upload_folder)
+        self.backend = backend
+        self.processes = processes
+        self.poll_interval = poll_interval
+        # Spawn, not fork: the app process may be running request threads
+        self.context = multiprocessing.get_context('spawn')
+        self.running = {}
+        self._stop = threading.Event()
+
+    def _temp_path(self, job):
+        os.makedirs(self.screenshots.incoming_folder, exist_ok=True)
+        return os.path.join(self.screenshots.incoming_folder, f"job_{job['id']}_{job['attempts']}.png")
+
+    def _start(self, job):
+        output_path = self._temp_path(job)
+        process = self.context.Process(
+            target=run_capture,
+            args=(self.backend, job['kind'], job['url'], output_path),
+            daemon=True
+        )
+        process.start()
+        deadline = time.monotonic() + job['timeout_seconds']
+        self.running[job['id']] = (job, process, output_path, deadline)
+
+    def _finish(self, job_id, stopping=False):
+        job, process, output_path, deadline = self.running.pop(job_id)
+
+        if process.is_alive():
+            process.terminate()
+            process.join()
+            if stopping:
+                # Interrupted, not failed: the job goes back as it was
+                if os.path.exists(output_path):
+                    os.remove(output_path)
+                self.queue.release(job)
+                return
+            error = f"Capture timed out after {job['timeout_seconds']}s"
+        elif process.exitcode != 0:
+            error = f"Capture process exited with code {process.exitcode}"
+        elif not os.path.exists(output_path) or os.path.getsize(output_path) == 0:
+            error = "Capture produced no image"
+        else:
+            error = None
+
+        if error:
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            self.queue.fail(job, error)
+            return
+
+        filename = self.screenshots.generate_filename(job['trade_id'], job['screenshot_type'])
+        os.replace(output_path, os.path.join(self.screenshots.upload_folder, filename))
+        self.queue.complete(job, filename)
+
+    def run_once(self):
+        """Reap finished/overdue captures and start new ones; returns number still running"""
+        now = time.monotonic()
+        for job_id, (job, process, output_path, deadline) in list(self.running.items()):
+            if not process.is_alive() or now >= deadline:
+                self._finish(job_id)
+
+        while len(self.running) < self.processes:
+            job = self.queue.claim_next()
+            if not job:
+                break
+            self._start(job)
+
+        return len(self.running)
+
+    def run_forever(self):
+        while not self._stop.is_set():
+            self.run_once()
+            self._stop.wait(self.poll_interval)
+
+        self.shutdown()
+
+    def shutdown(self):
+        """Kill in-flight captures and put their jobs back for retry"""
+        for job_id in list(self.running):
+            self._finish(job_id, stopping=True)
+
+    def start_thread(self):
+        """Run the dispatcher in a daemon thread of the current process"""
+        thread = threading.Thread(target=self.run_forever, name='capture-worker', daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self._stop.set()
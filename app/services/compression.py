@@ -0,0 +1,113 @@
+import zlib
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # optional - gzip is always available
+    brotli = None
+
+COMPRESSIBLE_TYPES = (
+    'application/json', 'text/csv', 'text/html', 'text/plain', 'text/css',
+    'text/javascript', 'application/javascript', 'image/svg+xml'
+)
+# Bytes handed to the compressor at a time for buffered bodies
+COMPRESS_CHUNK_SIZE = 64 * 1024
+CONTENT_CODINGS = ('br', 'gzip')
+
+def available_encodings():
+    """Content codings this process can produce, preferred first"""
+    return CONTENT_CODINGS if brotli is not None else ('gzip',)
+
+def encoded_etag(etag, encoding):
+    """Strong ETag of the `encoding`-compressed variant of a response"""
+    return f'{etag}-{encoding}'
+
+class StreamCompressor:
+    """Incremental gzip or brotli encoder: feed chunks, then finish()"""
+
+    def __init__(self, encoding, level=6, brotli_quality=4):
+        self.encoding = encoding
+        if encoding == 'br':
+            self._compressor = brotli.Compressor(quality=brotli_quality)
+        elif encoding == 'gzip':
+            # wbits 16+ writes a gzip header and trailer
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        else:
+            raise ValueError(f"Unknown encoding: {encoding}")
+
+    def compress(self, data):
+        if self.encoding == 'br':
+            return self._compressor.process(data)
+        return self._compressor.compress(data)
+
+    def finish(self):
+        if self.encoding == 'br':
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+def compress_bytes(data, encoding, level=6, brotli_quality=4):
+    compressor = StreamCompressor(encoding, level, brotli_quality)
+    view = memoryview(data)
+    parts = [
+        compressor.compress(view[start:start + COMPRESS_CHUNK_SIZE])
+        for start in range(0, len(view), COMPRESS_CHUNK_SIZE)
+    ]
+    parts.append(compressor.finish())
+    return b''.join(parts)
+
+def compress_stream(chunks, encoding, level=6, brotli_quality=4):
+    """Compress a streamed body as it is produced"""
+    compressor = StreamCompressor(encoding, level, brotli_quality)
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.finish()
+    finally:
+        # Closing the wrapper must still close the original body (and its cursor)
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+def init_compression(app, min_size=1024, level=6, brotli_quality=4):
+    """Compress text responses for clients that accept gzip or brotli.
+
+    Buffered bodies under `min_size` bytes go out as they are; streamed
+    bodies (no known size) are always compressed, chunk by chunk. Files
+    sent with send_file and event streams are never touched.
+    """
+    encodings = available_encodings()
+
+    @app.after_request
+    def compress_response(response):
+        if (response.status_code < 200 or response.status_code in (204, 206, 304)
+                or response.direct_passthrough
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_TYPES):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = request.accept_encodings.best_match(encodings)
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = compress_stream(response.response, encoding, level, brotli_quality)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < min_size:
+                return response
+            response.set_data(compress_bytes(data, encoding, level, brotli_quality))
+
+        # A strong validator names exact bytes, so each coding gets its own
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(encoded_etag(etag, encoding))
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    return encodings
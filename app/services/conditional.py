@@ -0,0 +1,79 @@
+import os
+import zlib
+from datetime import date
+from functools import wraps
+from flask import request, make_response, current_app
+from app.models.database import Database, data_version
+from app.models.change_log import user_version
+from app.models.sharding import get_router
+from app.services.compression import CONTENT_CODINGS, encoded_etag
+from app.services.metrics import metrics
+
+def tags_etag():
+    """ETag of the tag catalogue"""
+    conn = Database(current_app.config['DATABASE']).get_connection()
+    try:
+        return f"tags-{data_version(conn, 'tags')}"
+    finally:
+        conn.close()
+
+def user_etag(user_id, daily=False):
+    """ETag of everything built from a user's trades and the tag catalogue.
+
+    Made of the file holding their trades (change log sequence numbers are
+    per file, so a reshard can't repeat an old tag), their newest change and
+    the tag catalogue version. `daily` adds today's date, for results that
+    depend on it (last N days).
+    """
+    db = get_router(current_app.config['DATABASE']).for_user(user_id)
+    conn = db.get_connection()
+    try:
+        parts = [
+            f'u{user_id}',
+            format(zlib.crc32(os.path.basename(db.db_path).encode()), 'x'),
+            user_version(conn, user_id),
+            f"t{data_version(conn, 'tags')}"
+        ]
+    finally:
+        conn.close()
+    if daily:
+        parts.append(date.today().isoformat())
+    return '-'.join(str(part) for part in parts)
+
+def conditional(etag_func):
+    """Answer If-None-Match with 304 from a data version, before the view runs.
+
+    `etag_func()` returns the strong ETag of the current data. It is read
+    before the view reads anything, so a write landing in between gives the
+    client newer data under the older tag: its next request gets a full
+    response, never a stale 304.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            etag = etag_func()
+
+            if request.if_none_match:
+                # The client may hold any compressed variant of this version
+                candidates = [etag] + [encoded_etag(etag, coding) for coding in CONTENT_CODINGS]
+                matched = next(
+                    (tag for tag in candidates if request.if_none_match.contains_weak(tag)), None
+                )
+                metrics.record_cache('etag', matched is not None)
+                if matched is not None:
+                    response = current_app.response_class(status=304)
+                    response.set_etag(matched)
+                    response.vary.add('Accept-Encoding')
+                    response.cache_control.private = True
+                    response.cache_control.no_cache = True
+                    return response
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                response.set_etag(etag)
+                # Browsers keep the body and revalidate it on every fetch
+                response.cache_control.private = True
+                response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
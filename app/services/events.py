@@ -0,0 +1,160 @@
+import json
+import queue
+import threading
+
+# Events a client can receive (besides SSE comment heartbeats)
+EVENT_TYPES = ('trade', 'stats', 'daily', 'tags', 'resync')
+
+def format_event(event, data):
+    """One server-sent event frame"""
+    return f'event: {event}\ndata: {json.dumps(data, default=str)}\n\n'
+
+class Subscription:
+    """One open stream: a bounded queue of (event, data) pairs"""
+
+    def __init__(self, user_id, max_queue=100):
+        self.user_id = user_id
+        self.queue = queue.Queue(maxsize=max_queue)
+
+    def put(self, event, data):
+        try:
+            self.queue.put_nowait((event, data))
+        except queue.Full:
+            # A client this far behind refetches everything instead
+            # of replaying a backlog, so its memory stays bounded
+            while True:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            self.queue.put_nowait(('resync', {}))
+
+    def get(self, timeout):
+        """Next (event, data), or None after `timeout` seconds without one"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+class EventBroker:
+    """In-process pub/sub of per-user change events for /api/stream.
+
+    Events only reach streams served by the same process: with several
+    workers, a change made through one is not pushed by the others.
+    """
+
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id, max_queue=100, max_per_user=None):
+        """Open a subscription, or return None when the user has too many"""
+        with self._lock:
+            subscribers = self._subscribers.setdefault(user_id, set())
+            if max_per_user and len(subscribers) >= max_per_user:
+                return None
+            subscription = Subscription(user_id, max_queue)
+            subscribers.add(subscription)
+            return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def has_subscribers(self, user_id):
+        return user_id in self._subscribers
+
+    def client_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def publish(self, user_id, event, data):
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for subscription in subscribers:
+            subscription.put(event, data)
+
+class StatsRefresher:
+    """Computes the statistics a trade change moved, off the request thread.
+
+    Work waits per user in one background thread (started on first use, so
+    after any fork). A change arriving before the thread got to the user's
+    previous one is merged into it, so a burst of writes costs one pass.
+    """
+
+    def __init__(self, broker):
+        self.broker = broker
+        # user_id -> merged work, oldest user first
+        self._pending = {}
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def request(self, db_path, user_id, action, trade_id, exit_date=None):
+        with self._condition:
+            work = self._pending.setdefault(
+                user_id, {'db_path': db_path, 'stats': False, 'tags': False, 'trade_id': None, 'exit_dates': set()}
+            )
+            if action == 'tagged':
+                work['tags'] = True
+                work['trade_id'] = trade_id
+            elif action != 'created':
+                work['stats'] = True
+            if exit_date:
+                work['exit_dates'].add(exit_date)
+
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='event-stats', daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+                user_id = next(iter(self._pending))
+                work = self._pending.pop(user_id)
+            try:
+                self._publish(user_id, work)
+            except Exception as e:
+                print(f"✗ Stream statistics failed: {e}")
+
+    def _publish(self, user_id, work):
+        # The streams may have closed while this waited
+        if not self.broker.has_subscribers(user_id):
+            return
+
+        from app.services.statistics import StatisticsService
+        service = StatisticsService(work['db_path'], user_id=user_id)
+        if work['tags']:
+            self.broker.publish(
+                user_id, 'tags', {'trade_id': work['trade_id'], 'mistakes': service.get_mistake_frequency()}
+            )
+        if work['stats']:
+            self.broker.publish(user_id, 'stats', service.get_overall_stats())
+        for exit_date in sorted(work['exit_dates']):
+            self.broker.publish(user_id, 'daily', service.get_day_stats(exit_date))
+
+events = EventBroker()
+stats_refresher = StatsRefresher(events)
+
+def publish_trade_change(db_path, user_id, action, trade_id, exit_date=None):
+    """Push a trade change and the statistics it moved to the user's open streams.
+
+    action: 'created', 'closed', 'deleted' or 'tagged'. Nothing is computed
+    unless the user has a stream open. The 'trade' event goes out straight
+    away; the statistics follow from the stats_refresher thread, so writes
+    never wait on them. exit_date is the exit date of a closed (or deleted
+    closed) trade, whose daily bucket is re-sent. trade_id is None when many
+    trades were tagged at once.
+    """
+    if not events.has_subscribers(user_id):
+        return
+
+    events.publish(user_id, 'trade', {'action': action, 'trade_id': trade_id})
+    if action != 'created' or exit_date:
+        stats_refresher.request(db_path, user_id, action, trade_id, exit_date)
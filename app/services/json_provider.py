@@ -0,0 +1,57 @@
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional - the standard library encoder is the fallback
+    orjson = None
+
+JSON_PROVIDERS = ('auto', 'orjson', 'stdlib')
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask's JSON provider, encoding with orjson.
+
+    Output is semantically equivalent to the default provider's, not
+    byte-identical: keys sorted, dates as HTTP dates (through the same
+    `default` hook) and indented in debug mode, but non-ASCII characters are
+    written as raw UTF-8 rather than \\u escapes, dumps() (which streamed
+    responses use) has no spaces after separators, and NaN/Infinity become
+    null. Calls with encoder arguments orjson doesn't take fall back to the
+    stdlib encoder.
+    """
+
+    def _options(self, indent=False):
+        options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self._options()).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = self.compact is False or (self.compact is None and self._app.debug)
+        # Bytes straight into the response - no decode/encode round trip
+        data = orjson.dumps(obj, default=self.default, option=self._options(indent))
+        return self._app.response_class(data + b'\n', mimetype=self.mimetype)
+
+def init_json_provider(app, provider='auto'):
+    """Install the JSON provider named by JSON_PROVIDER; returns the one in use"""
+    if provider not in JSON_PROVIDERS:
+        raise ValueError(f"JSON_PROVIDER must be one of: {', '.join(JSON_PROVIDERS)}")
+    if provider == 'orjson' and orjson is None:
+        raise ValueError("JSON_PROVIDER=orjson requires the 'orjson' package")
+
+    if provider == 'stdlib' or orjson is None:
+        return 'stdlib'
+    app.json = OrjsonProvider(app)
+    return 'orjson'
@@ -0,0 +1,290 @@
+import sqlite3
+import threading
+import time
+import weakref
+from contextvars import ContextVar
+from flask import g, request
+
+# Prometheus' default latency buckets (seconds)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 1000)
+
+# SQL totals for the request running in the current context (None outside requests)
+request_sql = ContextVar('request_sql', default=None)
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self, kind='counter'):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {kind}']
+        with self._lock:
+            for label_values, value in sorted(self.values.items()):
+                lines.append(f'{self.name}{_format_labels(self.labels, label_values)} {value:g}')
+        return lines
+
+class Gauge(Counter):
+    def dec(self, *label_values, amount=1):
+        self.inc(*label_values, amount=-amount)
+
+    def render(self):
+        return super().render(kind='gauge')
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [bucket counts..., +Inf count, sum]
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self.values.get(label_values)
+            if series is None:
+                series = self.values[label_values] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for label_values, series in sorted(self.values.items()):
+                for bound, count in zip(self.buckets, series):
+                    labels = _format_labels(self.labels, label_values, [('le', f'{bound:g}')])
+                    lines.append(f'{self.name}_bucket{labels} {count}')
+                labels = _format_labels(self.labels, label_values, [('le', '+Inf')])
+                lines.append(f'{self.name}_bucket{labels} {series[-2]}')
+                labels = _format_labels(self.labels, label_values)
+                lines.append(f'{self.name}_sum{labels} {series[-1]:g}')
+                lines.append(f'{self.name}_count{labels} {series[-2]}')
+        return lines
+
+class MetricsRegistry:
+    """In-process metrics, rendered in the Prometheus text format.
+
+    Values are per process: with several workers, scrape each one (or run a
+    single worker) to get complete numbers.
+    """
+
+    def __init__(self):
+        self.requests = Counter(
+            'http_requests_total', 'HTTP requests by route and status',
+            ('method', 'endpoint', 'status')
+        )
+        self.latency = Histogram(
+            'http_request_duration_seconds', 'Request latency by route',
+            ('method', 'endpoint')
+        )
+        self.in_flight = Gauge('http_requests_in_flight', 'Requests currently being handled')
+        self.request_queries = Histogram(
+            'db_queries_per_request', 'SQL statements executed per request',
+            ('endpoint',), buckets=QUERY_COUNT_BUCKETS
+        )
+        self.sql_seconds = Counter(
+            'db_query_seconds_total', 'Time spent executing SQL, by route', ('endpoint',)
+        )
+        self.queries = Counter('db_queries_total', 'SQL statements executed')
+        self.connections_open = Gauge('db_connections_open', 'SQLite connections currently open')
+        self.connections_opened = Counter('db_connections_opened_total', 'SQLite connections opened')
+        self.cache = Counter(
+            'cache_requests_total', 'Cache lookups by cache and result', ('cache', 'result')
+        )
+
+    def record_cache(self, cache, hit):
+        self.cache.inc(cache, 'hit' if hit else 'miss')
+
+    def render(self):
+        lines = []
+        for metric in (self.requests, self.latency, self.in_flight, self.request_queries,
+                       self.sql_seconds, self.queries, self.connections_open,
+                       self.connections_opened, self.cache):
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+metrics = MetricsRegistry()
+
+def _record_sql(elapsed):
+    metrics.queries.inc()
+    totals = request_sql.get()
+    if totals is not None:
+        totals[0] += 1
+        totals[1] += elapsed
+
+class TracingCursor(sqlite3.Cursor):
+    """Times every statement and attributes it to the current request.
+
+    With a slow query log attached to the connection, each statement's time
+    (execute plus fetching its rows) is checked against the threshold when
+    the statement is finished: on the next execute, fetchall, or close.
+    """
+
+    # [sql, params, seconds, rows, many] of the statement awaiting the slow log check
+    _pending = None
+
+    def _run(self, method, args, many=False):
+        self._flush_slow()
+        started = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            elapsed = time.perf_counter() - started
+            _record_sql(elapsed)
+            if self.connection.slow_query_log is not None:
+                params = args[1] if len(args) > 1 else ()
+                self._pending = [args[0], params, elapsed, 0, many]
+
+    def execute(self, *args):
+        return self._run(super().execute, args)
+
+    def executemany(self, *args):
+        return self._run(super().executemany, args, many=True)
+
+    def executescript(self, *args):
+        return self._run(super().executescript, args, many=True)
+
+    # Rows are produced lazily, so fetching is part of the query's cost
+    def fetchall(self):
+        rows = self._timed_fetch(super().fetchall)
+        self._flush_slow()
+        return rows
+
+    def fetchmany(self, *args):
+        return self._timed_fetch(super().fetchmany, *args)
+
+    def fetchone(self):
+        return self._timed_fetch(super().fetchone)
+
+    def _timed_fetch(self, fetch, *args):
+        started = time.perf_counter()
+        result = fetch(*args)
+        elapsed = time.perf_counter() - started
+
+        totals = request_sql.get()
+        if totals is not None:
+            totals[1] += elapsed
+        if self._pending:
+            self._pending[2] += elapsed
+            self._pending[3] += len(result) if isinstance(result, list) else int(result is not None)
+        return result
+
+    def _flush_slow(self):
+        pending = self._pending
+        if not pending:
+            return
+        self._pending = None
+
+        sql, params, seconds, rows, many = pending
+        slow_log = self.connection.slow_query_log
+        if slow_log is not None and seconds * 1000 >= slow_log.threshold_ms:
+            slow_log.record(self.connection, sql, params, seconds, rows or max(self.rowcount, 0), many)
+
+    def close(self):
+        self._flush_slow()
+        super().close()
+
+def _connection_released(state):
+    if not state['closed']:
+        state['closed'] = True
+        metrics.connections_open.dec()
+
+class TracingConnection(sqlite3.Connection):
+    """sqlite3 connection factory used by Database.get_connection when metrics
+    or the slow query log are on"""
+
+    # app.services.slow_queries.SlowQueryLog, when enabled
+    slow_query_log = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        metrics.connections_opened.inc()
+        metrics.connections_open.inc()
+        # Connections dropped without close() still leave the gauge
+        self._state = {'closed': False}
+        weakref.finalize(self, _connection_released, self._state)
+        self._cursors = weakref.WeakSet() if self.slow_query_log is not None else None
+
+    def cursor(self, factory=TracingCursor):
+        cursor = super().cursor(factory)
+        if self._cursors is not None:
+            self._cursors.add(cursor)
+        return cursor
+
+    def execute(self, *args):
+        return self.cursor().execute(*args)
+
+    def executemany(self, *args):
+        return self.cursor().executemany(*args)
+
+    def executescript(self, *args):
+        return self.cursor().executescript(*args)
+
+    def close(self):
+        # Statements read with fetchone() are finished when the connection closes
+        for cursor in list(self._cursors or ()):
+            cursor._flush_slow()
+        super().close()
+        _connection_released(self._state)
+
+def init_metrics(app, server_timing=False):
+    """Instrument every request of `app`; optionally add Server-Timing headers"""
+    from app.models.database import Database
+    Database.connection_factory = TracingConnection
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_started = time.perf_counter()
+        g.metrics_sql = [0, 0.0]
+        request_sql.set(g.metrics_sql)
+        metrics.in_flight.inc()
+
+    @app.after_request
+    def record_request(response):
+        g.metrics_status = response.status_code
+        if server_timing and 'metrics_started' in g:
+            total_ms = (time.perf_counter() - g.metrics_started) * 1000
+            queries, sql_seconds = g.metrics_sql
+            response.headers.add(
+                'Server-Timing',
+                f'db;dur={sql_seconds * 1000:.2f};desc="{queries} queries", app;dur={total_ms:.2f}'
+            )
+        return response
+
+    @app.teardown_request
+    def finish_request(error=None):
+        if 'metrics_started' not in g:
+            return
+        elapsed = time.perf_counter() - g.metrics_started
+        endpoint = request.url_rule.rule if request.url_rule else '<unmatched>'
+        status = g.get('metrics_status', 500)
+        queries, sql_seconds = g.metrics_sql
+
+        metrics.in_flight.dec()
+        metrics.requests.inc(request.method, endpoint, str(status))
+        metrics.latency.observe(elapsed, request.method, endpoint)
+        metrics.request_queries.observe(queries, endpoint)
+        metrics.sql_seconds.inc(endpoint, amount=sql_seconds)
+        request_sql.set(None)
@@ -1,23 +1,250 @@
 import os
+import json
+import uuid
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
 from werkzeug.utils import secure_filename
 from datetime import datetime
 
+try:
+    import fcntl
+except ImportError:  # Windows desktop mode runs a single process
+    fcntl = None
+
+# Size of each read from the request stream / partial file
+STREAM_BUFFER_SIZE = 64 * 1024
+# Serializes part file writes where flock isn't available (single process)
+_part_lock = threading.Lock()
+# Uploads whose hash state is kept in memory; older ones are rehashed from disk
+MAX_CACHED_HASHERS = 256
+
+class UploadError(Exception):
+    """Raised when a chunked upload request cannot be applied"""
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.offset = offset
+
 class ScreenshotService:
-    def __init__(self, upload_folder):
+    # Incremental hash state per upload id, valid while `offset` matches the part
+    # file. Least recently used first, bounded, so abandoned uploads can't pile up.
+    _hashers = OrderedDict()
+    _hashers_lock = threading.Lock()
+
+    def __init__(self, upload_folder, max_size=16 * 1024 * 1024):
         self.upload_folder = upload_folder
+        self.incoming_folder = os.path.join(upload_folder, '.incoming')
+        self.max_size = max_size
         os.makedirs(upload_folder, exist_ok=True)
-    
+
+    def generate_filename(self, trade_id, screenshot_type):
+        """Build a timestamped filename for a trade screenshot"""
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        return secure_filename(f"trade_{trade_id}_{screenshot_type}_{timestamp}.png")
+
     def upload_screenshot(self, file, trade_id, screenshot_type='before'):
         """Upload screenshot file"""
         if not file:
             return None
-        
+
         # Generate filename
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = secure_filename(f"trade_{trade_id}_{screenshot_type}_{timestamp}.png")
-        
+        filename = self.generate_filename(trade_id, screenshot_type)
+
         # Save file
         filepath = os.path.join(self.upload_folder, filename)
         file.save(filepath)
-        
+
         return filename
+
+    # ---- Chunked / resumable uploads ----
+
+    def _part_path(self, upload_id):
+        return os.path.join(self.incoming_folder, f"{upload_id}.part")
+
+    def _meta_path(self, upload_id):
+        return os.path.join(self.incoming_folder, f"{upload_id}.json")
+
+    def _load_meta(self, upload_id, user_id=None):
+        # Upload ids are generated by us; reject anything else before touching the filesystem
+        try:
+            uuid.UUID(hex=upload_id)
+        except (TypeError, ValueError):
+            raise UploadError('Upload not found', status=404)
+
+        try:
+            with open(self._meta_path(upload_id)) as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            raise UploadError('Upload not found', status=404)
+
+        # Someone else's upload looks exactly like a missing one
+        if user_id is not None and meta.get('user_id') != user_id:
+            raise UploadError('Upload not found', status=404)
+        return meta
+
+    @classmethod
+    def _remember_hasher(cls, upload_id, offset, hasher):
+        with cls._hashers_lock:
+            cls._hashers[upload_id] = (offset, hasher)
+            cls._hashers.move_to_end(upload_id)
+            while len(cls._hashers) > MAX_CACHED_HASHERS:
+                cls._hashers.popitem(last=False)
+
+    @classmethod
+    def forget_hasher(cls, upload_id):
+        """Drop the cached hash state of an upload that is finished or gone"""
+        with cls._hashers_lock:
+            cls._hashers.pop(upload_id, None)
+
+    def _hasher_for(self, upload_id, offset):
+        """Return a sha256 object positioned at `offset`, rebuilding it from disk if needed"""
+        with self._hashers_lock:
+            cached = self._hashers.get(upload_id)
+        if cached and cached[0] == offset:
+            return cached[1]
+
+        # Another worker appended the previous chunk (or we restarted) - rehash the part file
+        hasher = hashlib.sha256()
+        with open(self._part_path(upload_id), 'rb') as f:
+            remaining = offset
+            while remaining > 0:
+                block = f.read(min(STREAM_BUFFER_SIZE, remaining))
+                if not block:
+                    break
+                hasher.update(block)
+                remaining -= len(block)
+        return hasher
+
+    def init_upload(self, trade_id, screenshot_type='before', total_size=None, user_id=None):
+        """Start a chunked upload owned by `user_id` and return its metadata"""
+        if total_size is None or total_size <= 0:
+            raise UploadError('total_size must be a positive integer')
+        if total_size > self.max_size:
+            raise UploadError(f'File exceeds maximum size of {self.max_size} bytes', status=413)
+
+        os.makedirs(self.incoming_folder, exist_ok=True)
+        upload_id = uuid.uuid4().hex
+        meta = {
+            'upload_id': upload_id,
+            'user_id': user_id,
+            'trade_id': trade_id,
+            'type': screenshot_type,
+            'total_size': total_size,
+            'created_at': datetime.now().isoformat()
+        }
+
+        # Create the empty part file first so status() always finds it
+        open(self._part_path(upload_id), 'wb').close()
+        with open(self._meta_path(upload_id), 'w') as f:
+            json.dump(meta, f)
+
+        self._remember_hasher(upload_id, 0, hashlib.sha256())
+        return self.upload_status(upload_id, user_id)
+
+    def upload_status(self, upload_id, user_id=None):
+        """Return upload metadata plus the number of bytes received so far.
+
+        With `user_id`, uploads owned by anyone else are reported as not
+        found - and so are by every method taking it.
+        """
+        meta = self._load_meta(upload_id, user_id)
+        meta['offset'] = os.path.getsize(self._part_path(upload_id))
+        return meta
+
+    @contextmanager
+    def _open_part(self, upload_id, mode):
+        """The part file, locked against every other writer of it (in any process)"""
+        try:
+            f = open(self._part_path(upload_id), mode)
+        except FileNotFoundError:
+            # Completed or aborted since its metadata was read
+            raise UploadError('Upload not found', status=404)
+
+        with f:
+            if fcntl is None:
+                with _part_lock:
+                    yield f
+                return
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield f
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def append_chunk(self, upload_id, offset, stream, length=None, user_id=None):
+        """Stream a chunk onto the part file at `offset`; returns the new offset"""
+        meta = self.upload_status(upload_id, user_id)
+        current = meta['offset']
+
+        if offset != current:
+            raise UploadError('Offset mismatch', status=409, offset=current)
+        if length is not None and current + length > meta['total_size']:
+            raise UploadError('Chunk exceeds declared total_size', status=413, offset=current)
+
+        with self._open_part(upload_id, 'r+b') as f:
+            # A concurrent or retried PUT may have appended while we waited
+            current = os.fstat(f.fileno()).st_size
+            if offset != current:
+                raise UploadError('Offset mismatch', status=409, offset=current)
+
+            hasher = self._hasher_for(upload_id, current)
+            written = current
+            try:
+                f.seek(current)
+                while True:
+                    block = stream.read(STREAM_BUFFER_SIZE)
+                    if not block:
+                        break
+                    if written + len(block) > meta['total_size']:
+                        # Drop the partial chunk so the client can resume from `current`
+                        f.truncate(current)
+                        raise UploadError('Chunk exceeds declared total_size', status=413, offset=current)
+                    f.write(block)
+                    hasher.update(block)
+                    written += len(block)
+            except BaseException:
+                # The cached state may now be ahead of the file
+                self.forget_hasher(upload_id)
+                raise
+
+            self._remember_hasher(upload_id, written, hasher)
+        return written
+
+    def complete_upload(self, upload_id, sha256=None, user_id=None):
+        """Verify a finished upload and move it into screenshot storage"""
+        meta = self.upload_status(upload_id, user_id)
+
+        with self._open_part(upload_id, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size != meta['total_size']:
+                raise UploadError('Upload incomplete', status=409, offset=size)
+
+            digest = self._hasher_for(upload_id, size).hexdigest()
+            if sha256 and sha256.lower() != digest:
+                self.abort_upload(upload_id, user_id)
+                raise UploadError('Checksum mismatch, upload discarded', status=422)
+
+            filename = self.generate_filename(meta['trade_id'], meta['type'])
+
+            # Same filesystem, so the rename is atomic - readers never see a partial file
+            os.replace(self._part_path(upload_id), os.path.join(self.upload_folder, filename))
+            os.remove(self._meta_path(upload_id))
+            self.forget_hasher(upload_id)
+
+        return {
+            'filename': filename,
+            'sha256': digest,
+            'trade_id': meta['trade_id'],
+            'type': meta['type']
+        }
+
+    def abort_upload(self, upload_id, user_id=None):
+        """Discard a partial upload"""
+        self._load_meta(upload_id, user_id)
+        for path in (self._part_path(upload_id), self._meta_path(upload_id)):
+            if os.path.exists(path):
+                os.remove(path)
+        self.forget_hasher(upload_id)
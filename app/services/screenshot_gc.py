@@ -0,0 +1,143 @@
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from app.models.archive import attach_archive, ARCHIVE_SCHEMA
+from app.models.sharding import get_router
+from app.services.screenshot import ScreenshotService
+
+try:
+    import fcntl
+except ImportError:  # Windows desktop mode - single process, no lock needed
+    fcntl = None
+
+class ScreenshotGarbageCollector:
+    """Finds screenshot files no trade references any more and removes them"""
+
+    def __init__(self, db_path, upload_folder, grace_hours=24):
+        self.db_path = db_path
+        self.upload_folder = upload_folder
+        self.incoming_folder = os.path.join(upload_folder, '.incoming')
+        self.quarantine_folder = os.path.join(upload_folder, '.quarantine')
+        self.grace_seconds = grace_hours * 3600
+        self._lock_path = f'{db_path}.screenshot_gc.lock'
+        self._lock_file = None
+
+    def _acquire_lock(self):
+        """One process (of several preforked workers) does the collecting"""
+        if fcntl is None:
+            return True
+        if self._lock_file is None:
+            self._lock_file = open(self._lock_path, 'w')
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            return False
+
+    def referenced_filenames(self):
+        """Set of filenames referenced by any trade (archived and sharded ones too), read row by row"""
+        referenced = set()
+        for db_path in [self.db_path] + get_router(self.db_path).shard_paths():
+            conn = sqlite3.connect(db_path)
+            cursor = conn.cursor()
+            tables = ['main.trades']
+            if attach_archive(conn, db_path):
+                tables.append(f'{ARCHIVE_SCHEMA}.trades')
+
+            for table in tables:
+                cursor.execute(f'''
+                    SELECT screenshot_before, screenshot_after FROM {table}
+                    WHERE screenshot_before IS NOT NULL OR screenshot_after IS NOT NULL
+                ''')
+                for before, after in cursor:
+                    if before:
+                        referenced.add(before)
+                    if after:
+                        referenced.add(after)
+
+            conn.close()
+        return referenced
+
+    def find_orphans(self):
+        """Yield DirEntry objects for unreferenced files older than the grace period"""
+        referenced = self.referenced_filenames()
+        cutoff = time.time() - self.grace_seconds
+
+        with os.scandir(self.upload_folder) as entries:
+            for entry in entries:
+                # Skips .gitkeep and the .incoming/.quarantine folders
+                if entry.name.startswith('.') or not entry.is_file(follow_symlinks=False):
+                    continue
+                if entry.name in referenced:
+                    continue
+                if entry.stat().st_mtime > cutoff:
+                    continue
+                yield entry
+
+    def find_stale_uploads(self):
+        """Yield abandoned chunked-upload files older than the grace period"""
+        if not os.path.isdir(self.incoming_folder):
+            return
+
+        cutoff = time.time() - self.grace_seconds
+        with os.scandir(self.incoming_folder) as entries:
+            for entry in entries:
+                if entry.is_file(follow_symlinks=False) and entry.stat().st_mtime <= cutoff:
+                    yield entry
+
+    def collect(self, dry_run=False, quarantine=False):
+        """Delete (or move to .quarantine) orphaned files and return a report"""
+        report = {
+            'files': [],
+            'reclaimed_bytes': 0,
+            'dry_run': dry_run,
+            'action': 'quarantine' if quarantine else 'delete'
+        }
+
+        if quarantine and not dry_run:
+            os.makedirs(self.quarantine_folder, exist_ok=True)
+
+        candidates = [(entry, False) for entry in self.find_orphans()]
+        candidates += [(entry, True) for entry in self.find_stale_uploads()]
+
+        for entry, partial in candidates:
+            size = entry.stat().st_size
+            report['files'].append({'filename': entry.name, 'size': size})
+            report['reclaimed_bytes'] += size
+
+            if dry_run:
+                continue
+
+            # Partial uploads are never worth keeping
+            if quarantine and not partial:
+                shutil.move(entry.path, os.path.join(self.quarantine_folder, entry.name))
+            else:
+                os.remove(entry.path)
+            if partial:
+                # <upload id>.part / .json: its cached hash state goes with it
+                ScreenshotService.forget_hasher(os.path.splitext(entry.name)[0])
+
+        report['total_files'] = len(report['files'])
+        return report
+
+    def start_periodic(self, interval_hours):
+        """Run collect() in a daemon thread every `interval_hours`"""
+        def loop():
+            while True:
+                time.sleep(interval_hours * 3600)
+                if not self._acquire_lock():
+                    continue
+                try:
+                    report = self.collect()
+                    if report['total_files']:
+                        print(f"[{datetime.now().isoformat()}] Screenshot GC removed "
+                              f"{report['total_files']} files ({report['reclaimed_bytes']} bytes)")
+                except Exception as e:
+                    print(f"Screenshot GC failed: {e}")
+
+        thread = threading.Thread(target=loop, name='screenshot-gc', daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,245 @@
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from werkzeug.security import generate_password_hash
+from app.models.database import Database
+from app.models.change_log import RESET_TRADE_ID, latest_change, log_change
+from app.models.sharding import get_router
+
+# (pair, typical price, typical stop distance, units per lot)
+PAIRS = [
+    ('EURUSD', 1.08, 0.0015, 100000),
+    ('GBPUSD', 1.27, 0.0020, 100000),
+    ('USDJPY', 150.0, 0.25, 1000),
+    ('AUDUSD', 0.66, 0.0012, 100000),
+    ('USDCAD', 1.36, 0.0015, 100000),
+    ('XAUUSD', 2000.0, 5.0, 100)
+]
+
+# Session by entry hour (UTC)
+SESSIONS = [('Asian', 0, 7), ('London', 7, 13), ('New York', 13, 21)]
+SETUPS = ['EMA + Trendline', 'Support/Resistance', 'Break & Retest', 'Liquidity Sweep', 'Range Fade']
+TIMEFRAMES = ['M5', 'M15', 'H1', 'H4']
+EMOTIONS = ['Calm', 'Confident', 'Anxious', 'Greedy', 'Fearful', 'Bored']
+NOTES = [
+    'Clean setup, followed plan',
+    'Entered early before confirmation',
+    'Moved stop to breakeven too soon',
+    'News spike took me out',
+    'Textbook retest of the level',
+    'Chased the move after missing entry',
+    ''
+]
+
+# Every seed user (seed_user_N@example.com) shares this password
+SEED_PASSWORD = 'seed-password'
+
+TRADE_COLUMNS = (
+    'user_id', 'pair', 'session', 'timeframe', 'setup_type', 'trade_type',
+    'entry_price', 'stop_loss', 'take_profit', 'position_size',
+    'risk_amount', 'reward_amount', 'risk_reward_ratio', 'risk_percentage',
+    'confidence', 'emotion_before', 'rule_followed',
+    'entry_time', 'exit_time', 'exit_price', 'profit_loss', 'status', 'notes',
+    'screenshot_before', 'screenshot_after'
+)
+
+class TradeSeeder:
+    """Generates realistic, reproducible trade histories for load testing.
+
+    The same seed and options always produce the same rows. Rows are
+    inserted with executemany in large transactions, so millions of
+    trades take minutes rather than hours.
+    """
+
+    def __init__(self, db_path, seed=42, batch_size=50000):
+        self.db_path = db_path
+        self.random = random.Random(seed)
+        self.batch_size = batch_size
+
+    def _connect(self):
+        # Make sure the schema exists (fresh benchmark databases)
+        Database(self.db_path)
+        from app.models.migrations import Migration
+        migration = Migration(self.db_path)
+        migration.run_all_migrations()
+        # Seeded rows get derived columns on insert; mark the backfills done
+        # so an app started on this database doesn't rescan it
+        migration.run_all_backfills(batch_size=50000)
+        return self._open(self.db_path)
+
+    def _open(self, path):
+        conn = sqlite3.connect(path)
+        # Seed data is reproducible, so trade durability for speed on this connection
+        conn.execute('PRAGMA synchronous = OFF')
+        conn.execute('PRAGMA cache_size = -65536')
+        return conn
+
+    def _connect_trades(self, router, user_id):
+        """Connection to the shard holding `user_id`'s trades, as the app will read them"""
+        from app.models.migrations import Migration
+        # Creates the shard file and brings it to the current schema
+        shard_path = router.for_user(user_id).db_path
+        Migration(shard_path, shard=True).run_all_backfills(batch_size=50000)
+        return self._open(shard_path)
+
+    def _ensure_users(self, cursor, count):
+        """Create (or reuse) seed users and return their ids"""
+        # Hashing is deliberately slow - one hash shared by every seed user
+        password_hash = generate_password_hash(SEED_PASSWORD)
+        cursor.executemany(
+            'INSERT OR IGNORE INTO users (email, password_hash, full_name) VALUES (?, ?, ?)',
+            [(f'seed_user_{n}@example.com', password_hash, f'Seed User {n}') for n in range(1, count + 1)]
+        )
+        cursor.execute(
+            "SELECT id FROM users WHERE email LIKE 'seed_user_%@example.com' ORDER BY id LIMIT ?",
+            (count,)
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+    def generate_trade(self, user_id, entry_time, win_rate, avg_win_r, open_rate, screenshot_rate):
+        """Build one trade row as a tuple in TRADE_COLUMNS order"""
+        rnd = self.random
+        pair, price, stop_distance, lot_units = rnd.choice(PAIRS)
+
+        session = 'Asian'
+        for name, start_hour, end_hour in SESSIONS:
+            if start_hour <= entry_time.hour < end_hour:
+                session = name
+
+        is_buy = rnd.random() < 0.5
+        entry = round(price * rnd.uniform(0.97, 1.03), 5)
+        risk = stop_distance * rnd.uniform(0.6, 1.6)
+        rr_target = round(rnd.choice([1.0, 1.5, 2.0, 2.5, 3.0]), 2)
+        direction = 1 if is_buy else -1
+
+        stop_loss = round(entry - direction * risk, 5)
+        take_profit = round(entry + direction * risk * rr_target, 5)
+        position_size = round(rnd.uniform(0.1, 2.0), 2) * lot_units
+        risk_amount = risk * position_size
+        reward_amount = risk * rr_target * position_size
+
+        exit_time = exit_price = profit_loss = None
+        status = 'open'
+        if rnd.random() >= open_rate:
+            status = 'closed'
+            if rnd.random() < win_rate:
+                r_multiple = max(0.1, rnd.gauss(avg_win_r, avg_win_r / 3))
+            else:
+                # Most losers stop out at -1R, some are cut early or slip
+                r_multiple = -min(1.3, max(0.1, rnd.gauss(0.9, 0.2)))
+            exit_price = round(entry + direction * risk * r_multiple, 5)
+            profit_loss = round(r_multiple * risk_amount, 2)
+            exit_time = entry_time + timedelta(minutes=int(rnd.expovariate(1 / 240)) + 1)
+
+        screenshot_before = screenshot_after = None
+        if rnd.random() < screenshot_rate:
+            stamp = entry_time.strftime('%Y%m%d_%H%M%S')
+            screenshot_before = f'seed_{user_id}_before_{stamp}.png'
+            if status == 'closed':
+                screenshot_after = f'seed_{user_id}_after_{stamp}.png'
+
+        return (
+            user_id, pair, session, rnd.choice(TIMEFRAMES), rnd.choice(SETUPS),
+            'Buy' if is_buy else 'Sell',
+            entry, stop_loss, take_profit, position_size,
+            risk_amount, reward_amount, rr_target, risk / entry * 100,
+            rnd.randint(1, 5), rnd.choice(EMOTIONS), 1 if rnd.random() < 0.8 else 0,
+            entry_time.isoformat(),
+            exit_time.isoformat() if exit_time else None,
+            exit_price, profit_loss, status, rnd.choice(NOTES),
+            screenshot_before, screenshot_after
+        )
+
+    def seed(self, users=10, trades_per_user=1000, days=730, end_date=None, win_rate=0.45,
+             avg_win_r=1.8, open_rate=0.02, tag_rate=0.2, screenshot_rate=0.1, progress=None):
+        """Insert trades (and tag links) for `users` seed users; returns a summary.
+
+        Trades are spread over the `days` before `end_date` (default: today),
+        so date-windowed statistics see recent data. Pass a fixed end_date to
+        reproduce identical timestamps as well as identical values. In a
+        sharded database each user's trades go to their shard.
+        """
+        started = time.perf_counter()
+        conn = self._connect()
+        cursor = conn.cursor()
+
+        user_ids = self._ensure_users(cursor, users)
+        cursor.execute('SELECT id FROM tags ORDER BY id')
+        tag_ids = [row[0] for row in cursor.fetchall()]
+        conn.commit()
+        # Users and tags stay in the main database; trades go where the
+        # recorded shard layout routes each user
+        router = get_router(self.db_path)
+
+        insert_sql = (
+            f"INSERT INTO trades ({', '.join(TRADE_COLUMNS)}) "
+            f"VALUES ({', '.join('?' * len(TRADE_COLUMNS))})"
+        )
+        end_date = end_date or datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        span_seconds = days * 86400
+        start_time = end_date - timedelta(seconds=span_seconds)
+        total = len(user_ids) * trades_per_user
+        inserted = 0
+        tagged = 0
+
+        for user_id in user_ids:
+            trades_conn = self._connect_trades(router, user_id) if router.enabled else conn
+            cursor = trades_conn.cursor()
+            # Each user's entries are spread over `days`, in time order
+            offsets = sorted(self.random.randrange(span_seconds) for _ in range(trades_per_user))
+
+            for batch_start in range(0, trades_per_user, self.batch_size):
+                batch_offsets = offsets[batch_start:batch_start + self.batch_size]
+                rows = [
+                    self.generate_trade(
+                        user_id, start_time + timedelta(seconds=offset),
+                        win_rate, avg_win_r, open_rate, screenshot_rate
+                    )
+                    for offset in batch_offsets
+                ]
+
+                cursor.execute('BEGIN')
+                logged = latest_change(trades_conn)
+                cursor.executemany(insert_sql, rows)
+                # We hold the write lock, so the new ids are the top contiguous block
+                cursor.execute('SELECT MAX(id) FROM trades')
+                last_id = cursor.fetchone()[0]
+                first_id = last_id - len(rows) + 1
+
+                Database.refresh_derived_columns(cursor, 'id BETWEEN ? AND ?', (first_id, last_id))
+
+                if tag_ids and tag_rate > 0:
+                    links = []
+                    for trade_id in range(first_id, last_id + 1):
+                        if self.random.random() < tag_rate:
+                            count = 1 if self.random.random() < 0.8 else 2
+                            for tag_id in self.random.sample(tag_ids, min(count, len(tag_ids))):
+                                links.append((trade_id, tag_id))
+                    cursor.executemany(
+                        'INSERT OR IGNORE INTO trade_tags (trade_id, tag_id) VALUES (?, ?)', links
+                    )
+                    tagged += len(links)
+
+                # One reset per user, with their last batch, instead of a change row per seeded trade
+                cursor.execute('DELETE FROM trade_changes WHERE seq > ?', (logged,))
+                if batch_start + self.batch_size >= trades_per_user:
+                    log_change(trades_conn, RESET_TRADE_ID, user_id, 'reset')
+                trades_conn.commit()
+                inserted += len(rows)
+                if progress:
+                    progress(inserted, total)
+
+            if trades_conn is not conn:
+                trades_conn.close()
+
+        conn.close()
+        elapsed = time.perf_counter() - started
+
+        return {
+            'users': len(user_ids),
+            'trades': inserted,
+            'tag_links': tagged,
+            'seconds': round(elapsed, 2),
+            'trades_per_minute': int(inserted / elapsed * 60) if elapsed else inserted
+        }
@@ -0,0 +1,149 @@
+import json
+import logging
+import os
+import re
+import sqlite3
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+EXPLAINABLE = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?([A-Za-z_]\w*)')
+
+def normalize_sql(sql):
+    """Collapse a statement to its shape, so variants group together"""
+    sql = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    sql = re.sub(r'\b\d+(?:\.\d+)?\b', '?', sql)
+    sql = re.sub(r'\s+', ' ', sql).strip()
+    return re.sub(r'IN \((?:\?, ?)*\?\)', 'IN (...)', sql, flags=re.IGNORECASE)
+
+def describe_params(params, many=False):
+    """Parameter shape only - values may be personal data and never hit the log"""
+    if many:
+        return {'batched': True}
+    if isinstance(params, dict):
+        return {'names': sorted(params), 'types': [type(v).__name__ for v in params.values()]}
+    return {'count': len(params), 'types': [type(v).__name__ for v in params]}
+
+def explain(conn, sql, params):
+    """EXPLAIN QUERY PLAN details for a statement, or None if it can't be explained"""
+    if not sql.lstrip().upper().startswith(EXPLAINABLE):
+        return None
+    try:
+        # A plain cursor, so the plan query itself isn't traced or logged
+        cursor = sqlite3.Cursor(conn)
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [row[3] for row in cursor.fetchall()]
+    except sqlite3.Error:
+        return None
+
+class SlowQueryLog:
+    """Writes statements slower than threshold_ms, with their query plans, as JSON lines"""
+
+    def __init__(self, path, threshold_ms=200, max_bytes=10 * 1024 * 1024, backup_count=5):
+        self.path = path
+        self.threshold_ms = threshold_ms
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self.logger = logging.getLogger(f'tradejournal.slow_queries.{path}')
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        if not self.logger.handlers:
+            handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count)
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            self.logger.addHandler(handler)
+
+    def record(self, conn, sql, params, seconds, rows, many=False):
+        plan = None if many else explain(conn, sql, params)
+        full_scans = []
+        for detail in plan or ():
+            match = FULL_SCAN.match(detail)
+            # "SCAN t USING (COVERING) INDEX" walks an index, not the table
+            if match and 'INDEX' not in detail:
+                full_scans.append(match.group(1))
+
+        entry = {
+            'time': datetime.now().isoformat(timespec='milliseconds'),
+            'duration_ms': round(seconds * 1000, 2),
+            'rows': rows,
+            'sql': re.sub(r'\s+', ' ', sql).strip(),
+            'normalized': normalize_sql(sql),
+            'params': describe_params(params, many),
+            'plan': plan,
+            'full_scan': full_scans,
+            'temp_btree': any('TEMP B-TREE' in detail for detail in plan or ()),
+            'endpoint': _current_endpoint()
+        }
+        self.logger.info(json.dumps(entry))
+
+def _current_endpoint():
+    from flask import has_request_context, request
+    if has_request_context() and request.url_rule:
+        return f'{request.method} {request.url_rule.rule}'
+    return None
+
+def init_slow_query_log(path, threshold_ms=200, max_bytes=10 * 1024 * 1024, backup_count=5):
+    """Log slow statements made through Database.get_connection"""
+    from app.models.database import Database
+    from app.services.metrics import TracingConnection
+
+    TracingConnection.slow_query_log = SlowQueryLog(path, threshold_ms, max_bytes, backup_count)
+    Database.connection_factory = TracingConnection
+    return TracingConnection.slow_query_log
+
+def read_slow_log(path):
+    """Entries from the log and its rotated files, oldest first"""
+    paths = [path]
+    index = 1
+    while os.path.exists(f'{path}.{index}'):
+        paths.append(f'{path}.{index}')
+        index += 1
+
+    for log_path in reversed(paths):
+        if not os.path.exists(log_path):
+            continue
+        with open(log_path) as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue  # Partially written line
+
+def slow_query_report(path, since=None):
+    """Aggregate slow log entries by normalized statement, worst total time first"""
+    groups = {}
+    for entry in read_slow_log(path):
+        if since and entry['time'] < since:
+            continue
+        group = groups.setdefault(entry['normalized'], {
+            'normalized': entry['normalized'],
+            'count': 0,
+            'total_ms': 0.0,
+            'max_ms': 0.0,
+            'max_rows': 0,
+            'full_scan': set(),
+            'temp_btree': False,
+            'endpoints': set(),
+            'plan': None,
+            'last_seen': None
+        })
+        group['count'] += 1
+        group['total_ms'] += entry['duration_ms']
+        group['max_rows'] = max(group['max_rows'], entry['rows'] or 0)
+        group['full_scan'].update(entry['full_scan'])
+        group['temp_btree'] = group['temp_btree'] or entry['temp_btree']
+        if entry['endpoint']:
+            group['endpoints'].add(entry['endpoint'])
+        if entry['duration_ms'] >= group['max_ms']:
+            group['max_ms'] = entry['duration_ms']
+            group['plan'] = entry['plan']
+        group['last_seen'] = entry['time']
+
+    report = []
+    for group in groups.values():
+        group['avg_ms'] = round(group['total_ms'] / group['count'], 2)
+        group['total_ms'] = round(group['total_ms'], 2)
+        group['full_scan'] = sorted(group['full_scan'])
+        group['endpoints'] = sorted(group['endpoints'])
+        report.append(group)
+
+    return sorted(report, key=lambda group: group['total_ms'], reverse=True)
@@ -1,33 +1,85 @@
+import heapq
 from datetime import datetime, timedelta
-from app.models.database import Database
+from calendar import monthrange
+from concurrent.futures import ThreadPoolExecutor
+from app.models.database import tuple_cursor
+from app.models.sharding import get_router
+from app.models.archive import trades_source, archive_rollups, archive_snapshot
+
+# Shards queried at once for statistics across all users
+FAN_OUT_WORKERS = 8
+
+def _combine_rollups(rollups):
+    """Add up 'all' rollups from several databases (None where one has no archive)"""
+    rollups = [rollup for rollup in rollups if rollup]
+    if len(rollups) <= 1:
+        return rollups[0] if rollups else None
+    
+    combined = dict(rollups[0])
+    for rollup in rollups[1:]:
+        for column, value in rollup.items():
+            values = [v for v in (combined[column], value) if v is not None]
+            if column == 'max_pnl':
+                combined[column] = max(values, default=None)
+            elif column == 'min_pnl':
+                combined[column] = min(values, default=None)
+            else:
+                combined[column] = sum(values)
+    return combined
+
+def _combine_grouped(parts, key, sums):
+    """Merge GROUP BY rows from several databases, adding the `sums` columns"""
+    if len(parts) == 1:
+        return parts[0]
+    
+    merged = {}
+    for rows in parts:
+        for row in rows:
+            current = merged.get(row[key])
+            if current is None:
+                merged[row[key]] = dict(row)
+                continue
+            for column in sums:
+                current[column] = (current[column] or 0) + (row[column] or 0)
+    
+    # Same order as GROUP BY: NULL first, then ascending
+    return sorted(
+        merged.values(),
+        key=lambda row: (row[key] is not None, row[key] if row[key] is not None else 0)
+    )
 
 class StatisticsService:
+    """Trading statistics for one user, or across all users when user_id is None.
+    
+    Every query runs per database and the partial results are merged, so with
+    sharding enabled a user's statistics read only their shard and the
+    all-users totals fan out over every shard in parallel.
+    """
+    
     def __init__(self, db_path, user_id=None):
-        self.db = Database(db_path)
+        router = get_router(db_path)
         self.user_id = user_id
+        self.databases = [router.for_user(user_id)] if user_id else router.databases()
+    
+    def _gather(self, collect):
+        """collect(db) for each database, in parallel when there are several"""
+        if len(self.databases) <= 1:
+            return [collect(db) for db in self.databases]
+        with ThreadPoolExecutor(max_workers=min(FAN_OUT_WORKERS, len(self.databases))) as pool:
+            return list(pool.map(collect, self.databases))
     
     def get_overall_stats(self):
         """Calculate overall trading statistics"""
-        conn = self.db.get_connection()
-        cursor = conn.cursor()
-        
-        if self.user_id:
-            cursor.execute('''
-                SELECT * FROM trades 
-                WHERE status = 'closed' AND user_id = ?
-                ORDER BY exit_time
-            ''', (self.user_id,))
+        parts = self._gather(self._overall_part)
+        if len(parts) == 1:
+            trades = parts[0][0]
         else:
-            cursor.execute('''
-                SELECT * FROM trades 
-                WHERE status = 'closed'
-                ORDER BY exit_time
-            ''')
+            # Each part is in exit order already
+            trades = list(heapq.merge(*(part[0] for part in parts), key=lambda trade: trade[0] or ''))
+        archived = _combine_rollups(part[1] for part in parts)
+        snapshot = parts[0][2] if self.user_id else None
         
-        trades = [dict(row) for row in cursor.fetchall()]
-        conn.close()
-        
-        if not trades:
+        if not trades and not archived:
             return {
                 'total_trades': 0,
                 'win_rate': 0,
@@ -47,15 +99,28 @@ class StatisticsService:
             }
         
         total_trades = len(trades)
-        wins = [t for t in trades if t.get('profit_loss') and t['profit_loss'] > 0]
-        losses = [t for t in trades if t.get('profit_loss') and t['profit_loss'] <= 0]
+        wins = [pnl for _, pnl in trades if pnl and pnl > 0]
+        losses = [pnl for _, pnl in trades if pnl and pnl <= 0]
         
         total_wins = len(wins)
         total_losses = len(losses)
-        win_rate = (total_wins / total_trades * 100) if total_trades > 0 else 0
         
-        total_profit = sum([t['profit_loss'] for t in wins]) if wins else 0
-        total_loss = abs(sum([t['profit_loss'] for t in losses])) if losses else 0
+        total_profit = sum(wins) if wins else 0
+        total_loss = abs(sum(losses)) if losses else 0
+        
+        largest_win = max(wins) if wins else 0
+        largest_loss = min(losses) if losses else 0
+        
+        if archived:
+            total_trades += archived['trades']
+            total_wins += archived['wins']
+            total_losses += archived['losses']
+            total_profit += archived['win_pnl']
+            total_loss += abs(archived['loss_pnl'])
+            largest_win = max(largest_win, archived['max_pnl'] or 0)
+            largest_loss = min(largest_loss, archived['min_pnl'] or 0)
+        
+        win_rate = (total_wins / total_trades * 100) if total_trades > 0 else 0
         total_profit_loss = total_profit - total_loss
         
         avg_win = total_profit / total_wins if total_wins > 0 else 0
@@ -64,10 +129,7 @@ class StatisticsService:
         expectancy = (win_rate/100 * avg_win) - ((100-win_rate)/100 * avg_loss) if total_trades > 0 else 0
         profit_factor = total_profit / total_loss if total_loss > 0 else (total_profit if total_profit > 0 else 0)
         
-        max_drawdown = self._calculate_max_drawdown(trades)
-        
-        largest_win = max([t['profit_loss'] for t in wins]) if wins else 0
-        largest_loss = min([t['profit_loss'] for t in losses]) if losses else 0
+        max_drawdown = self._calculate_max_drawdown(trades, start=snapshot)
         
         avg_r_multiple = self.get_avg_r_multiple()
         risk_discipline = self.get_risk_discipline()
@@ -91,33 +153,82 @@ class StatisticsService:
             'current_streak': current_streak
         }
     
+    def _overall_part(self, db):
+        """Closed (exit_time, profit_loss) pairs in exit order, archived 'all' rollup and drawdown snapshot from one database"""
+        conn = db.get_connection()
+        cursor = tuple_cursor(conn)
+        
+        if self.user_id:
+            cursor.execute('''
+                SELECT exit_time, profit_loss FROM trades 
+                WHERE status = 'closed' AND user_id = ?
+                ORDER BY exit_time
+            ''', (self.user_id,))
+        else:
+            cursor.execute('''
+                SELECT exit_time, profit_loss FROM trades 
+                WHERE status = 'closed'
+                ORDER BY exit_time
+            ''')
+        
+        trades = cursor.fetchall()
+        
+        # Archived trades count through their lifetime rollups
+        archived = archive_rollups(conn, db.db_path, 'all', self.user_id).get('')
+        snapshot = archive_snapshot(conn, db.db_path, self.user_id) if self.user_id else None
+        conn.close()
+        
+        return trades, archived, snapshot
+    
     def get_avg_r_multiple(self):
         """Calculate average R multiple for winning trades"""
-        conn = self.db.get_connection()
+        parts = self._gather(self._avg_r_part)
+        r_sum = sum(part[0] for part in parts)
+        r_count = sum(part[1] for part in parts)
+        
+        avg_r = r_sum / r_count if r_count else 0
+        return round(avg_r, 2)
+    
+    def _avg_r_part(self, db):
+        conn = db.get_connection()
         cursor = conn.cursor()
         
         if self.user_id:
             cursor.execute('''
-                SELECT AVG(profit_loss / risk_amount) as avg_r
+                SELECT COALESCE(SUM(r_multiple), 0) as r_sum, COUNT(r_multiple) as r_count
                 FROM trades 
-                WHERE status = 'closed' AND profit_loss > 0 AND risk_amount > 0 AND user_id = ?
+                WHERE user_id = ? AND r_multiple > 0 AND status = 'closed'
             ''', (self.user_id,))
         else:
             cursor.execute('''
-                SELECT AVG(profit_loss / risk_amount) as avg_r
+                SELECT COALESCE(SUM(r_multiple), 0) as r_sum, COUNT(r_multiple) as r_count
                 FROM trades 
-                WHERE status = 'closed' AND profit_loss > 0 AND risk_amount > 0
+                WHERE r_multiple > 0 AND status = 'closed'
             ''')
         
-        result = cursor.fetchone()
+        result = dict(cursor.fetchone())
+        archived = archive_rollups(conn, db.db_path, 'all', self.user_id).get('')
         conn.close()
         
-        avg_r = result['avg_r'] if result and result['avg_r'] else 0
-        return round(avg_r, 2)
+        if archived:
+            result['r_sum'] += archived['r_win_sum']
+            result['r_count'] += archived['r_win_count']
+        
+        return result['r_sum'], result['r_count']
 
     def get_risk_discipline(self):
         """Calculate percentage of trades that followed risk rules"""
-        conn = self.db.get_connection()
+        parts = self._gather(self._discipline_part)
+        total = sum(part[0] for part in parts)
+        disciplined = sum(part[1] or 0 for part in parts)
+        
+        if total > 0:
+            discipline = (disciplined / total * 100)
+            return round(discipline, 1)
+        return 0
+    
+    def _discipline_part(self, db):
+        conn = db.get_connection()
         cursor = conn.cursor()
         
         if self.user_id:
@@ -137,36 +248,28 @@ class StatisticsService:
                 WHERE status = 'closed'
             ''')
         
-        result = cursor.fetchone()
+        result = dict(cursor.fetchone())
+        archived = archive_rollups(conn, db.db_path, 'all', self.user_id).get('')
         conn.close()
         
-        if result and result['total'] > 0:
-            discipline = (result['disciplined'] / result['total'] * 100)
-            return round(discipline, 1)
-        return 0
+        if archived:
+            result['total'] += archived['trades']
+            result['disciplined'] = (result['disciplined'] or 0) + (archived['disciplined'] or 0)
+        
+        return result['total'], result['disciplined']
 
     def get_current_streak(self):
         """Get current win/loss streak"""
-        conn = self.db.get_connection()
-        cursor = conn.cursor()
-        
-        if self.user_id:
-            cursor.execute('''
-                SELECT profit_loss FROM trades 
-                WHERE status = 'closed' AND user_id = ?
-                ORDER BY exit_time DESC
-                LIMIT 20
-            ''', (self.user_id,))
+        parts = self._gather(self._recent_trades_part)
+        if len(parts) == 1:
+            trades = parts[0]
         else:
-            cursor.execute('''
-                SELECT profit_loss FROM trades 
-                WHERE status = 'closed'
-                ORDER BY exit_time DESC
-                LIMIT 20
-            ''')
-        
-        trades = [dict(row) for row in cursor.fetchall()]
-        conn.close()
+            # Latest 20 across databases
+            trades = sorted(
+                (trade for part in parts for trade in part),
+                key=lambda trade: trade['exit_time'] or '',
+                reverse=True
+            )[:20]
         
         if not trades:
             return {'type': 'none', 'count': 0}
@@ -186,26 +289,50 @@ class StatisticsService:
             'count': streak
         }
     
-    def _calculate_max_drawdown(self, trades):
-        """Calculate maximum drawdown"""
-        if not trades:
-            return 0
+    def _recent_trades_part(self, db):
+        """The 20 most recently closed trades in one database"""
+        conn = db.get_connection()
+        cursor = conn.cursor()
         
-        sorted_trades = sorted(
-            [t for t in trades if t.get('exit_time')], 
-            key=lambda x: x['exit_time'] or ''
-        )
+        if self.user_id:
+            cursor.execute('''
+                SELECT profit_loss, exit_time FROM trades 
+                WHERE status = 'closed' AND user_id = ?
+                ORDER BY exit_time DESC
+                LIMIT 20
+            ''', (self.user_id,))
+        else:
+            cursor.execute('''
+                SELECT profit_loss, exit_time FROM trades 
+                WHERE status = 'closed'
+                ORDER BY exit_time DESC
+                LIMIT 20
+            ''')
         
-        if not sorted_trades:
-            return 0
+        trades = [dict(row) for row in cursor.fetchall()]
+        
+        # Fewer than 20 recent trades: the streak may continue into the archive
+        if len(trades) < 20:
+            source = trades_source(conn, db.db_path)
+            if source != 'trades':
+                cursor.execute(f'''
+                    SELECT profit_loss, exit_time FROM {source}
+                    WHERE status = 'closed' AND (? IS NULL OR user_id = ?)
+                    ORDER BY exit_time DESC
+                    LIMIT 20
+                ''', (self.user_id, self.user_id))
+                trades = [dict(row) for row in cursor.fetchall()]
+        conn.close()
         
-        balance = 0
-        peak = 0
-        max_drawdown = 0
+        return trades
+    
+    def _calculate_max_drawdown(self, trades, start=None):
+        """Maximum drawdown over (exit_time, profit_loss) pairs in exit order, continuing from an archived (balance, peak, drawdown)"""
+        balance, peak, max_drawdown = start or (0, 0, 0)
         
-        for trade in sorted_trades:
-            if trade.get('profit_loss'):
-                balance += trade['profit_loss']
+        for exit_time, pnl in trades:
+            if exit_time and pnl:
+                balance += pnl
                 if balance > peak:
                     peak = balance
                 drawdown = peak - balance
@@ -216,57 +343,80 @@ class StatisticsService:
     
     def get_stats_by_timeframe(self, days=30):
         """Get statistics for a specific timeframe"""
-        conn = self.db.get_connection()
+        cutoff_date = (datetime.now() - timedelta(days=days)).isoformat()
+        parts = self._gather(lambda db: self._timeframe_part(db, cutoff_date))
+        return _combine_grouped(parts, 'date', ('trades', 'profit_loss', 'wins', 'losses'))
+    
+    def get_day_stats(self, day):
+        """The daily bucket for one exit date (YYYY-MM-DD), zeroed if nothing closed that day"""
+        end = (datetime.fromisoformat(day) + timedelta(days=1)).isoformat()
+        parts = self._gather(lambda db: self._timeframe_part(db, day, end))
+        buckets = _combine_grouped(parts, 'date', ('trades', 'profit_loss', 'wins', 'losses'))
+        return buckets[0] if buckets else {'date': day, 'trades': 0, 'profit_loss': 0, 'wins': 0, 'losses': 0}
+    
+    def _timeframe_part(self, db, cutoff_date, end_date=None):
+        conn = db.get_connection()
         cursor = conn.cursor()
         
-        cutoff_date = (datetime.now() - timedelta(days=days)).isoformat()
+        source = trades_source(conn, db.db_path, cutoff_date)
         
         if self.user_id:
-            cursor.execute('''
-                SELECT * FROM trades 
-                WHERE status = 'closed' AND exit_time >= ? AND user_id = ?
-                ORDER BY exit_time
-            ''', (cutoff_date, self.user_id))
+            cursor.execute(f'''
+                SELECT exit_date as date,
+                       COUNT(*) as trades,
+                       COALESCE(SUM(profit_loss), 0) as profit_loss,
+                       SUM(CASE WHEN profit_loss > 0 THEN 1 ELSE 0 END) as wins,
+                       SUM(CASE WHEN profit_loss < 0 THEN 1 ELSE 0 END) as losses
+                FROM {source} 
+                WHERE user_id = ? AND status = 'closed' AND exit_time >= ?
+                  AND (? IS NULL OR exit_time < ?)
+                GROUP BY exit_date
+                ORDER BY exit_date
+            ''', (self.user_id, cutoff_date, end_date, end_date))
         else:
-            cursor.execute('''
-                SELECT * FROM trades 
+            cursor.execute(f'''
+                SELECT exit_date as date,
+                       COUNT(*) as trades,
+                       COALESCE(SUM(profit_loss), 0) as profit_loss,
+                       SUM(CASE WHEN profit_loss > 0 THEN 1 ELSE 0 END) as wins,
+                       SUM(CASE WHEN profit_loss < 0 THEN 1 ELSE 0 END) as losses
+                FROM {source} 
                 WHERE status = 'closed' AND exit_time >= ?
-                ORDER BY exit_time
-            ''', (cutoff_date,))
+                  AND (? IS NULL OR exit_time < ?)
+                GROUP BY exit_date
+                ORDER BY exit_date
+            ''', (cutoff_date, end_date, end_date))
         
-        trades = [dict(row) for row in cursor.fetchall()]
+        results = [dict(row) for row in cursor.fetchall()]
         conn.close()
         
-        if not trades:
-            return []
+        return results
+    
+    def get_stats_by_session(self):
+        """Get statistics grouped by trading session"""
+        results = _combine_grouped(
+            self._gather(self._session_part), 'session', ('total', 'wins', 'total_pnl')
+        )
         
-        daily_stats = {}
-        for trade in trades:
-            if not trade.get('exit_time'):
-                continue
-            date = trade['exit_time'][:10]
-            if date not in daily_stats:
-                daily_stats[date] = {
-                    'date': date,
-                    'trades': 0,
-                    'profit_loss': 0,
-                    'wins': 0,
-                    'losses': 0
-                }
+        stats = []
+        for row in results:
+            total = row['total']
+            wins = row['wins'] or 0
+            win_rate = (wins / total * 100) if total > 0 else 0
             
-            daily_stats[date]['trades'] += 1
-            if trade.get('profit_loss'):
-                daily_stats[date]['profit_loss'] += trade['profit_loss']
-                if trade['profit_loss'] > 0:
-                    daily_stats[date]['wins'] += 1
-                else:
-                    daily_stats[date]['losses'] += 1
+            stats.append({
+                'session': row['session'],
+                'total_trades': total,
+                'wins': wins,
+                'losses': total - wins,
+                'win_rate': round(win_rate, 2),
+                'total_pnl': round(row['total_pnl'] or 0, 2)
+            })
         
-        return list(daily_stats.values())
+        return stats
     
-    def get_stats_by_session(self):
-        """Get statistics grouped by trading session"""
-        conn = self.db.get_connection()
+    def _session_part(self, db):
+        conn = db.get_connection()
         cursor = conn.cursor()
         
         if self.user_id:
@@ -291,7 +441,15 @@ class StatisticsService:
             ''')
         
         results = [dict(row) for row in cursor.fetchall()]
+        archived = archive_rollups(conn, db.db_path, 'session', self.user_id)
         conn.close()
+        return self._merge_rollups(results, 'session', archived)
+    
+    def get_stats_by_setup(self):
+        """Get statistics grouped by setup type"""
+        results = _combine_grouped(
+            self._gather(self._setup_part), 'setup_type', ('total', 'wins', 'total_pnl')
+        )
         
         stats = []
         for row in results:
@@ -300,7 +458,7 @@ class StatisticsService:
             win_rate = (wins / total * 100) if total > 0 else 0
             
             stats.append({
-                'session': row['session'],
+                'setup': row['setup_type'],
                 'total_trades': total,
                 'wins': wins,
                 'losses': total - wins,
@@ -310,9 +468,8 @@ class StatisticsService:
         
         return stats
     
-    def get_stats_by_setup(self):
-        """Get statistics grouped by setup type"""
-        conn = self.db.get_connection()
+    def _setup_part(self, db):
+        conn = db.get_connection()
         cursor = conn.cursor()
         
         if self.user_id:
@@ -337,33 +494,33 @@ class StatisticsService:
             ''')
         
         results = [dict(row) for row in cursor.fetchall()]
+        archived = archive_rollups(conn, db.db_path, 'setup_type', self.user_id)
         conn.close()
-        
-        stats = []
-        for row in results:
-            total = row['total']
-            wins = row['wins'] or 0
-            win_rate = (wins / total * 100) if total > 0 else 0
-            
-            stats.append({
-                'setup': row['setup_type'],
-                'total_trades': total,
-                'wins': wins,
-                'losses': total - wins,
-                'win_rate': round(win_rate, 2),
-                'total_pnl': round(row['total_pnl'] or 0, 2)
-            })
-        
-        return stats
+        return self._merge_rollups(results, 'setup_type', archived)
     
     def get_mistake_frequency(self):
         """Get frequency of each mistake tag"""
-        conn = self.db.get_connection()
+        results = {}
+        for part in self._gather(self._mistakes_part):
+            for tag_id, row in part.items():
+                if tag_id in results:
+                    results[tag_id]['count'] += row['count']
+                else:
+                    results[tag_id] = row
+        
+        results = sorted(results.values(), key=lambda row: row['count'], reverse=True)
+        for row in results:
+            del row['id']
+        return results
+    
+    def _mistakes_part(self, db):
+        """Tag counts by tag id in one database"""
+        conn = db.get_connection()
         cursor = conn.cursor()
         
         if self.user_id:
             cursor.execute('''
-                SELECT t.name, t.color, COUNT(tt.trade_id) as count
+                SELECT t.id, t.name, t.color, COUNT(tt.trade_id) as count
                 FROM tags t
                 LEFT JOIN trade_tags tt ON t.id = tt.tag_id
                 LEFT JOIN trades tr ON tt.trade_id = tr.id
@@ -374,7 +531,7 @@ class StatisticsService:
             ''', (self.user_id,))
         else:
             cursor.execute('''
-                SELECT t.name, t.color, COUNT(tt.trade_id) as count
+                SELECT t.id, t.name, t.color, COUNT(tt.trade_id) as count
                 FROM tags t
                 LEFT JOIN trade_tags tt ON t.id = tt.tag_id
                 GROUP BY t.id, t.name, t.color
@@ -382,7 +539,268 @@ class StatisticsService:
                 ORDER BY count DESC
             ''')
         
+        results = {row['id']: dict(row) for row in cursor.fetchall()}
+        
+        # Tags on archived trades, counted in the rollups by tag id
+        archived = archive_rollups(conn, db.db_path, 'tag', self.user_id)
+        if archived:
+            cursor.execute('SELECT id, name, color FROM tags')
+            for tag in cursor.fetchall():
+                if tag['id'] in archived:
+                    row = results.setdefault(tag['id'], dict(tag, count=0))
+                    row['count'] += archived[tag['id']]['trades']
+        conn.close()
+        
+        return results
+    
+    def _merge_rollups(self, results, key, archived):
+        """Add archived rollup totals to grouped rows (total, wins, total_pnl[, r_sum, r_count])"""
+        if not archived:
+            return results
+        
+        merged = {row[key]: row for row in results}
+        for bucket, rollup in archived.items():
+            row = merged.setdefault(bucket, {
+                key: bucket, 'total': 0, 'wins': 0, 'total_pnl': 0, 'r_sum': None, 'r_count': 0
+            })
+            row['total'] += rollup['trades']
+            row['wins'] = (row['wins'] or 0) + rollup['wins']
+            row['total_pnl'] = (row['total_pnl'] or 0) + rollup['pnl']
+            if 'r_count' in row:
+                row['r_sum'] = (row['r_sum'] or 0) + rollup['r_sum']
+                row['r_count'] += rollup['r_count']
+        
+        # Same order as GROUP BY: NULL first, then ascending
+        return sorted(
+            merged.values(),
+            key=lambda row: (row[key] is not None, row[key] if row[key] is not None else 0)
+        )
+    
+    def _get_stats_by_column(self, column):
+        """Win/loss totals for closed trades grouped by a derived column"""
+        results = _combine_grouped(
+            self._gather(lambda db: self._column_part(db, column)),
+            'bucket', ('total', 'wins', 'total_pnl', 'r_sum', 'r_count')
+        )
+        
+        stats = []
+        for row in results:
+            total = row['total']
+            wins = row['wins'] or 0
+            win_rate = (wins / total * 100) if total > 0 else 0
+            avg_r = row['r_sum'] / row['r_count'] if row['r_count'] else 0
+            
+            stats.append({
+                'bucket': row['bucket'],
+                'total_trades': total,
+                'wins': wins,
+                'losses': total - wins,
+                'win_rate': round(win_rate, 2),
+                'total_pnl': round(row['total_pnl'] or 0, 2),
+                'avg_r_multiple': round(avg_r, 2)
+            })
+        
+        return stats
+    
+    def _column_part(self, db, column):
+        conn = db.get_connection()
+        cursor = conn.cursor()
+        
+        if self.user_id:
+            cursor.execute(f'''
+                SELECT {column} as bucket,
+                       COUNT(*) as total,
+                       SUM(CASE WHEN profit_loss > 0 THEN 1 ELSE 0 END) as wins,
+                       SUM(CASE WHEN profit_loss IS NOT NULL THEN profit_loss ELSE 0 END) as total_pnl,
+                       SUM(r_multiple) as r_sum,
+                       COUNT(r_multiple) as r_count
+                FROM trades 
+                WHERE user_id = ? AND status = 'closed'
+                GROUP BY {column}
+                ORDER BY {column}
+            ''', (self.user_id,))
+        else:
+            cursor.execute(f'''
+                SELECT {column} as bucket,
+                       COUNT(*) as total,
+                       SUM(CASE WHEN profit_loss > 0 THEN 1 ELSE 0 END) as wins,
+                       SUM(CASE WHEN profit_loss IS NOT NULL THEN profit_loss ELSE 0 END) as total_pnl,
+                       SUM(r_multiple) as r_sum,
+                       COUNT(r_multiple) as r_count
+                FROM trades 
+                WHERE status = 'closed'
+                GROUP BY {column}
+                ORDER BY {column}
+            ''')
+        
         results = [dict(row) for row in cursor.fetchall()]
+        archived = archive_rollups(conn, db.db_path, column, self.user_id)
+        conn.close()
+        return self._merge_rollups(results, 'bucket', archived)
+    
+    def get_stats_by_hour(self):
+        """Get statistics grouped by entry hour (0-23)"""
+        stats = self._get_stats_by_column('entry_hour')
+        for row in stats:
+            row['hour'] = row.pop('bucket')
+        return stats
+    
+    def get_stats_by_weekday(self):
+        """Get statistics grouped by entry weekday (0 = Sunday)"""
+        weekdays = ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
+        stats = self._get_stats_by_column('entry_weekday')
+        for row in stats:
+            weekday = row.pop('bucket')
+            row['weekday'] = weekday
+            row['name'] = weekdays[weekday] if weekday is not None else None
+        return stats
+    
+    def get_monthly_report(self, year, month):
+        """Get comprehensive monthly trading report"""
+        # Get month date range
+        start_date = f"{year}-{month:02d}-01"
+        last_day = monthrange(year, month)[1]
+        end_date = f"{year}-{month:02d}-{last_day}"
+        
+        parts = [
+            part for part in self._gather(lambda db: self._monthly_part(db, start_date, end_date))
+            if part['summary']['total_trades']
+        ]
+        
+        if not parts:
+            return {
+                'month': f"{year}-{month:02d}",
+                'total_trades': 0,
+                'message': 'No trades this month'
+            }
+        
+        if len(parts) == 1:
+            summary = parts[0]['summary']
+            best_trade = parts[0]['best_trade']
+            worst_trade = parts[0]['worst_trade']
+            best_setup = parts[0]['setups'][0]
+        else:
+            summary = {
+                column: sum(part['summary'][column] or 0 for part in parts)
+                for column in ('total_trades', 'total_pnl', 'total_wins', 'win_pnl', 'loss_pnl', 'rule_followed')
+            }
+            summary['trading_days'] = len({
+                day for part in parts for day in (part['summary']['exit_dates'] or '').split(',') if day
+            })
+            best_trade = min(
+                (part['best_trade'] for part in parts),
+                key=lambda trade: (-trade['profit_loss'], trade['exit_time'])
+            )
+            worst_trade = min(
+                (part['worst_trade'] for part in parts),
+                key=lambda trade: (trade['profit_loss'], trade['exit_time'])
+            )
+            setups = {}
+            for part in parts:
+                for setup in part['setups']:
+                    current = setups.setdefault(setup['setup_type'], dict(setup, total=0, pnl=0))
+                    current['total'] += setup['total']
+                    current['pnl'] += setup['pnl'] or 0
+                    current['first_exit'] = min(current['first_exit'], setup['first_exit'])
+            best_setup = min(setups.values(), key=lambda setup: (-setup['pnl'], setup['first_exit']))
+        
+        total_trades = summary['total_trades']
+        total_wins = summary['total_wins']
+        total_losses = total_trades - total_wins
+        
+        win_rate = (total_wins / total_trades * 100) if total_trades > 0 else 0
+        avg_win = summary['win_pnl'] / total_wins if total_wins else 0
+        avg_loss = abs(summary['loss_pnl']) / total_losses if total_losses else 0
+        
+        # Discipline score (percentage of trades that followed rules)
+        discipline_score = (summary['rule_followed'] / total_trades * 100) if total_trades > 0 else 0
+        
+        return {
+            'month': f"{year}-{month:02d}",
+            'total_trades': total_trades,
+            'trading_days': summary['trading_days'],
+            'total_pnl': round(summary['total_pnl'], 2),
+            'win_rate': round(win_rate, 2),
+            'total_wins': total_wins,
+            'total_losses': total_losses,
+            'avg_win': round(avg_win, 2),
+            'avg_loss': round(avg_loss, 2),
+            'best_trade': {
+                'pair': best_trade['pair'],
+                'pnl': round(best_trade['profit_loss'], 2),
+                'date': best_trade['exit_date']
+            },
+            'worst_trade': {
+                'pair': worst_trade['pair'],
+                'pnl': round(worst_trade['profit_loss'], 2),
+                'date': worst_trade['exit_date']
+            },
+            'best_setup': {
+                'name': best_setup['setup_type'],
+                'pnl': round(best_setup['pnl'], 2),
+                'trades': best_setup['total']
+            },
+            'discipline_score': round(discipline_score, 1)
+        }
+    
+    def _monthly_part(self, db, start_date, end_date):
+        """Month summary, best and worst trade and setup totals from one database"""
+        conn = db.get_connection()
+        cursor = conn.cursor()
+        
+        source = trades_source(conn, db.db_path, start_date)
+        
+        if self.user_id:
+            scope = "user_id = ? AND status = 'closed' AND exit_date BETWEEN ? AND ?"
+            params = (self.user_id, start_date, end_date)
+        else:
+            scope = "status = 'closed' AND exit_date BETWEEN ? AND ?"
+            params = (start_date, end_date)
+        
+        cursor.execute(f'''
+            SELECT COUNT(*) as total_trades,
+                   COUNT(DISTINCT exit_date) as trading_days,
+                   GROUP_CONCAT(DISTINCT exit_date) as exit_dates,
+                   SUM(profit_loss) as total_pnl,
+                   SUM(CASE WHEN profit_loss > 0 THEN 1 ELSE 0 END) as total_wins,
+                   SUM(CASE WHEN profit_loss > 0 THEN profit_loss ELSE 0 END) as win_pnl,
+                   SUM(CASE WHEN profit_loss <= 0 THEN profit_loss ELSE 0 END) as loss_pnl,
+                   SUM(CASE WHEN rule_followed = 1 THEN 1 ELSE 0 END) as rule_followed
+            FROM {source}
+            WHERE {scope}
+        ''', params)
+        summary = dict(cursor.fetchone())
+        
+        if not summary['total_trades']:
+            conn.close()
+            return {'summary': summary}
+        
+        # Ties go to the earliest exit, as when scanning trades in exit order
+        cursor.execute(f'''
+            SELECT pair, profit_loss, exit_date, exit_time FROM {source}
+            WHERE {scope}
+            ORDER BY profit_loss DESC, exit_time
+            LIMIT 1
+        ''', params)
+        best_trade = dict(cursor.fetchone())
+        
+        cursor.execute(f'''
+            SELECT pair, profit_loss, exit_date, exit_time FROM {source}
+            WHERE {scope}
+            ORDER BY profit_loss, exit_time
+            LIMIT 1
+        ''', params)
+        worst_trade = dict(cursor.fetchone())
+        
+        # Setups, most profitable first
+        cursor.execute(f'''
+            SELECT setup_type, COUNT(*) as total, SUM(profit_loss) as pnl, MIN(exit_time) as first_exit
+            FROM {source}
+            WHERE {scope}
+            GROUP BY setup_type
+            ORDER BY pnl DESC, first_exit
+        ''', params)
+        setups = [dict(row) for row in cursor.fetchall()]
         conn.close()
         
-        return results
\ No newline at end of file
+        return {'summary': summary, 'best_trade': best_trade, 'worst_trade': worst_trade, 'setups': setups}
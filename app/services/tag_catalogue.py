@@ -0,0 +1,44 @@
+from app.models.database import data_version
+from app.services.metrics import metrics
+
+class TagCatalogue:
+    """The tags table held in memory, as id -> tag, per database.
+
+    Every lookup compares the cached copy with the tags version in
+    data_versions - one primary key read, bumped by triggers on any change
+    from any process - and reloads it when the version moved. Writes in
+    this process also drop it straight away. Tags are shared between
+    callers and responses, so treat them as read-only.
+    """
+
+    def __init__(self):
+        # db_path -> (version, {id: tag}); replaced whole, never mutated
+        self._cached = {}
+
+    def get(self, conn, db_path):
+        """id -> tag for the database at `db_path`, reloaded through `conn` if stale.
+
+        `conn` may be a shard connection: the global tables resolve
+        through the attached main database.
+        """
+        # Version first: a change landing before the reload only costs another reload
+        version = data_version(conn, 'tags')
+        cached = self._cached.get(db_path)
+        hit = cached is not None and cached[0] == version
+        metrics.record_cache('tags', hit)
+        if hit:
+            return cached[1]
+
+        rows = conn.execute('SELECT id, name, color FROM tags').fetchall()
+        tags = {row[0]: {'id': row[0], 'name': row[1], 'color': row[2]} for row in rows}
+        self._cached[db_path] = (version, tags)
+        return tags
+
+    def sorted(self, conn, db_path):
+        """All tags ordered by name"""
+        return sorted(self.get(conn, db_path).values(), key=lambda tag: tag['name'])
+
+    def invalidate(self, db_path):
+        self._cached.pop(db_path, None)
+
+tag_catalogue = TagCatalogue()
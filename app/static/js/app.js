@@ -2,6 +2,8 @@
 let currentTradeId = null;
 let allTags = [];
 let allTradesData = [];
+// Delta sync position for allTradesData (see syncTrades)
+let tradesCursor = null;
 
 // Export to CSV
 async function exportToCSV() {
@@ -92,38 +94,38 @@ function openTagModal(tradeId) {
         });
 }
 
-// Close tag modal
-function closeTagModal() {
+// Close tag modal, saving the selected tags in one request
+async function closeTagModal() {
     document.getElementById('tag-modal').style.display = 'none';
-    loadTrades();
+    await saveTradeTags();
+    syncTrades();
 }
 
-// Toggle tag selection
-async function toggleTag(tagId) {
-    const tagElement = document.querySelector(`[data-tag-id="${tagId}"]`);
-    const isSelected = tagElement.classList.contains('selected');
+// Replace the current trade's tags with the selected ones
+async function saveTradeTags() {
+    const tagIds = [...document.querySelectorAll('#available-tags .tag-selectable.selected')]
+        .map(el => parseInt(el.dataset.tagId));
     
     try {
-        if (isSelected) {
-            await fetch(`/api/tags/trade/${currentTradeId}/remove`, {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ tag_id: tagId })
-            });
-            tagElement.classList.remove('selected');
-        } else {
-            await fetch(`/api/tags/trade/${currentTradeId}/add`, {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ tag_id: tagId })
-            });
-            tagElement.classList.add('selected');
+        const response = await fetch(`/api/tags/trade/${currentTradeId}`, {
+            method: 'PUT',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ tag_ids: tagIds })
+        });
+        if (!response.ok) {
+            alert('❌ Failed to save tags');
         }
     } catch (error) {
-        console.error('Error toggling tag:', error);
+        console.error('Error saving tags:', error);
     }
 }
 
+// Toggle tag selection (saved when the modal closes)
+function toggleTag(tagId) {
+    const tagElement = document.querySelector(`[data-tag-id="${tagId}"]`);
+    tagElement.classList.toggle('selected');
+}
+
 // Close trade function
 async function closeTrade(tradeId) {
     const exitPrice = prompt('Enter exit price:');
@@ -148,7 +150,7 @@ async function closeTrade(tradeId) {
                 ? `✅ Trade closed! Profit: $${pnl.toFixed(2)}`
                 : `❌ Trade closed. Loss: $${Math.abs(pnl).toFixed(2)}`;
             alert(message);
-            loadTrades();
+            syncTrades();
         }
     } catch (error) {
         alert('Error closing trade');
@@ -166,7 +168,7 @@ async function deleteTrade(tradeId) {
         
         if (result.success) {
             alert('✅ Trade deleted');
-            loadTrades();
+            syncTrades();
         }
     } catch (error) {
         alert('Error deleting trade');
@@ -389,9 +391,12 @@ function renderTrades(trades) {
 // Load trades
 async function loadTrades() {
     try {
+        // Take the sync cursor first: changes made during the load are replayed, not lost
+        const changes = await (await fetch('/api/trades/changes?since=0')).json();
         const response = await fetch('/api/trades/');
         const trades = await response.json();
        
+        tradesCursor = changes.cursor;
         allTradesData = trades; // Store for filtering
         populateFilters();
         renderTrades(trades);
@@ -401,20 +406,84 @@ async function loadTrades() {
     }
 }
 
-// Upload screenshot
+// Apply only the trades changed since the last load or sync
+async function syncTrades() {
+    if (tradesCursor === null) return loadTrades();
+
+    try {
+        let hasMore = true;
+        while (hasMore) {
+            const response = await fetch(`/api/trades/changes?since=${tradesCursor}`);
+            const delta = await response.json();
+            if (delta.reset) return loadTrades();
+
+            const replaced = new Set([...delta.deleted, ...delta.trades.map(t => t.id)]);
+            allTradesData = allTradesData.filter(t => !replaced.has(t.id)).concat(delta.trades);
+            tradesCursor = delta.cursor;
+            hasMore = delta.has_more;
+        }
+
+        allTradesData.sort((a, b) => (b.entry_time || '').localeCompare(a.entry_time || ''));
+        populateFilters();
+        renderTrades(allTradesData);
+    } catch (error) {
+        console.error('Error syncing trades:', error);
+    }
+}
+
+// Upload screenshot in resumable chunks
+const UPLOAD_CHUNK_SIZE = 1024 * 1024;
+const UPLOAD_MAX_RETRIES = 5;
+
 async function uploadScreenshot(file, tradeId, type) {
-    const formData = new FormData();
-    formData.append('file', file);
-    formData.append('trade_id', tradeId);
-    formData.append('type', type);
-    
     try {
-        const response = await fetch('/api/screenshots/upload', {
+        const initResponse = await fetch('/api/screenshots/uploads', {
             method: 'POST',
-            body: formData
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ trade_id: tradeId, type: type, total_size: file.size })
         });
         
-        const result = await response.json();
+        const upload = await initResponse.json();
+        if (!initResponse.ok) return false;
+        
+        let offset = upload.offset;
+        let retries = 0;
+        
+        while (offset < file.size) {
+            const chunk = file.slice(offset, offset + UPLOAD_CHUNK_SIZE);
+            
+            try {
+                const response = await fetch(`/api/screenshots/uploads/${upload.upload_id}?offset=${offset}`, {
+                    method: 'PUT',
+                    headers: { 'Content-Type': 'application/octet-stream' },
+                    body: chunk
+                });
+                const result = await response.json();
+                
+                if (response.ok) {
+                    offset = result.offset;
+                    retries = 0;
+                } else if (response.status === 409 && result.offset !== undefined) {
+                    // Server has a different view of progress - resume from there
+                    offset = result.offset;
+                } else {
+                    return false;
+                }
+            } catch (error) {
+                // Connection dropped - ask the server how much it kept and resume
+                if (++retries > UPLOAD_MAX_RETRIES) throw error;
+                const status = await fetch(`/api/screenshots/uploads/${upload.upload_id}`);
+                offset = (await status.json()).offset;
+            }
+        }
+        
+        const completeResponse = await fetch(`/api/screenshots/uploads/${upload.upload_id}/complete`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({})
+        });
+        
+        const result = await completeResponse.json();
         return result.success;
     } catch (error) {
         console.error('Screenshot upload error:', error);
@@ -486,7 +555,7 @@ document.addEventListener('DOMContentLoaded', async () => {
                 alert('✅ Trade added successfully!');
                 document.getElementById('trade-form').reset();
                 document.getElementById('rr-value').textContent = '0.00';
-                await loadTrades();
+                await syncTrades();
             }
         } catch (error) {
             alert('❌ Error adding trade');
@@ -34,14 +34,20 @@ Chart.defaults.backgroundColor = '#1e2433';
 
 // Load overall stats
 async function loadOverallStats() {
-    const pnlEl = document.getElementById('total-pnl');
-    if (!pnlEl) return;
-
     try {
         const response = await fetch('/api/statistics/overall');
         if (!response.ok) return;
-        const stats = await response.json();
+        renderOverallStats(await response.json());
+    } catch (e) {
+        console.error('Error loading overall stats:', e);
+    }
+}
 
+function renderOverallStats(stats) {
+    const pnlEl = document.getElementById('total-pnl');
+    if (!pnlEl) return;
+
+    try {
         pnlEl.textContent = `$${stats.total_profit_loss.toFixed(2)}`;
         pnlEl.style.color = stats.total_profit_loss >= 0 ? '#10b981' : '#ef4444';
 
@@ -68,15 +74,25 @@ async function loadOverallStats() {
 }
 
 // Load equity curve
+// Daily buckets behind the equity curve, patched by streamed updates
+let equityDays = [];
+
 async function loadEquityCurve() {
+    try {
+        const response = await fetch('/api/statistics/daily/30');
+        if (!response.ok) return;
+        equityDays = await response.json();
+        renderEquityCurve(equityDays);
+    } catch (e) {
+        console.error('Error loading equity curve:', e);
+    }
+}
+
+function renderEquityCurve(data) {
     const canvas = document.getElementById('equity-chart');
     if (!canvas) return;
 
     try {
-        const response = await fetch('/api/statistics/daily/30');
-        if (!response.ok) return;
-        const data = await response.json();
-        
         if (data.length === 0) return;
         
         let cumulative = 0;
@@ -145,14 +161,20 @@ async function loadEquityCurve() {
 
 // Load win/loss chart
 async function loadWinLossChart() {
+    try {
+        const response = await fetch('/api/statistics/overall');
+        if (!response.ok) return;
+        renderWinLossChart(await response.json());
+    } catch (e) {
+        console.error('Error loading win/loss chart:', e);
+    }
+}
+
+function renderWinLossChart(stats) {
     const canvas = document.getElementById('winloss-chart');
     if (!canvas) return;
 
     try {
-        const response = await fetch('/api/statistics/overall');
-        if (!response.ok) return;
-        const stats = await response.json();
-        
         const ctx = canvas.getContext('2d');
         if (!ctx) return;
 
@@ -264,8 +286,14 @@ async function loadSessionChart() {
 async function loadMistakesChart() {
     try {
         const response = await fetch('/api/statistics/mistakes');
-        const data = await response.json();
-        
+        renderMistakesChart(await response.json());
+    } catch (error) {
+        console.error('Error loading mistakes chart:', error);
+    }
+}
+
+function renderMistakesChart(data) {
+    try {
         if (data.length === 0) return;
         
         const ctx = document.getElementById('mistakes-chart').getContext('2d');
@@ -404,13 +432,66 @@ async function loadSessionStatsTable() {
     }
 }
 
-// Initialize dashboard
-document.addEventListener('DOMContentLoaded', () => {
+// Reload the grouped charts and tables (not part of the streamed deltas)
+function loadGroupedStats() {
+    if (document.getElementById('session-chart')) loadSessionChart();
+    if (document.getElementById('setup-stats-table')) loadSetupStatsTable();
+    if (document.getElementById('session-stats-table')) loadSessionStatsTable();
+}
+
+function loadDashboard() {
     if (document.getElementById('total-pnl')) loadOverallStats();
     if (document.getElementById('equity-chart')) loadEquityCurve();
     if (document.getElementById('winloss-chart')) loadWinLossChart();
-    if (document.getElementById('session-chart')) loadSessionChart();
     if (document.getElementById('mistakes-chart')) loadMistakesChart();
-    if (document.getElementById('setup-stats-table')) loadSetupStatsTable();
-    if (document.getElementById('session-stats-table')) loadSessionStatsTable();
+    loadGroupedStats();
+}
+
+// Live updates: the server pushes changes, so an open dashboard never re-polls
+let groupedRefreshTimer;
+
+function connectDashboardStream() {
+    if (!window.EventSource) return;
+
+    const source = new EventSource('/api/stream');
+    let dropped = false;
+
+    source.addEventListener('stats', e => {
+        const stats = JSON.parse(e.data);
+        renderOverallStats(stats);
+        renderWinLossChart(stats);
+        // A burst of closes triggers one reload
+        clearTimeout(groupedRefreshTimer);
+        groupedRefreshTimer = setTimeout(loadGroupedStats, 1000);
+    });
+
+    source.addEventListener('daily', e => {
+        const day = JSON.parse(e.data);
+        equityDays = equityDays.filter(d => d.date !== day.date);
+        if (day.trades > 0) equityDays.push(day);
+        equityDays.sort((a, b) => (a.date || '').localeCompare(b.date || ''));
+        renderEquityCurve(equityDays);
+    });
+
+    source.addEventListener('tags', e => {
+        if (document.getElementById('mistakes-chart')) renderMistakesChart(JSON.parse(e.data).mistakes);
+    });
+
+    // The server dropped queued events for this client
+    source.addEventListener('resync', loadDashboard);
+
+    // EventSource reconnects by itself; catch up on what was missed meanwhile
+    source.addEventListener('error', () => { dropped = true; });
+    source.addEventListener('open', () => {
+        if (dropped) {
+            dropped = false;
+            loadDashboard();
+        }
+    });
+}
+
+// Initialize dashboard
+document.addEventListener('DOMContentLoaded', () => {
+    loadDashboard();
+    if (document.getElementById('total-pnl')) connectDashboardStream();
 });
\ No newline at end of file
@@ -2,12 +2,44 @@
 """
 Management CLI for TradeJournal
 Usage:
-    python manage.py migrate        # Run database migrations
+    python manage.py migrate        # Run database migrations and data backfills
+    python manage.py migrate --status  # Show schema version and backfill progress
+        [--batch-size=1000] [--rate=ROWS_PER_SECOND]
     python manage.py backup         # Create database backup
-    python manage.py restore <file> # Restore from backup
+    python manage.py backup --incremental  # Snapshot only changed chunks
+    python manage.py backup [--codec=gzip|zstd] [--level=N] [--workers=N]
+    python manage.py bench-backup   # Backup/restore throughput per codec (MB/s)
+    python manage.py backup-daemon [--once]  # Scheduled backups with GFS retention
+    python manage.py bench-startup  # Measure app cold-start and schema check time
+    python manage.py seed [--users=10] [--trades=1000] [--seed=42] [--days=730]
+        [--end-date=YYYY-MM-DD] [--win-rate=0.45] [--avg-win-r=1.8] [--tag-rate=0.2]
+        [--screenshot-rate=0.1] [--database=PATH]   # Generate synthetic trades
+    python manage.py bench [--sizes=1000,100000,1000000] [--iterations=20]
+        [--concurrency=8] [--duration=10] [--output=FILE] [--baseline=FILE]
+        [--threshold=0.2]           # Time every API route, flag regressions
+    python manage.py bench-json [--sizes=10000,100000] [--iterations=3]
+                                    # JSON encode time and gzip/brotli size per payload
+    python manage.py bench-memory [--trades=100000]
+                                    # Peak allocation of row loading, old vs narrow rows
+    python manage.py slow-queries [--limit=20] [--since=YYYY-MM-DD] [--log=PATH]
+                                    # Worst statements from the slow query log
+    python manage.py db-maintain [--analyze] [--vacuum-pages=N] [--no-convert] [--report]
+                                    # ANALYZE/optimize, compact the change log, reclaim
+                                    # free pages, show sizes
+    python manage.py archive --older-than=DAYS [--batch-size=2000]
+                                    # Move old closed trades to the archive database
+    python manage.py archive --status  # Hot/archived trade counts and cutoff
+    python manage.py reshard --mode=user|hash|off [--shards=16] [--batch-size=2000]
+                                    # Move trades to per-user or hashed shard files
+                                    # (stop the app first; rerun to resume)
+    python manage.py restore <file> # Restore from backup (.db.gz or snapshot .json)
     python manage.py list-backups   # List all backups
     python manage.py create-user    # Create a new user
     python manage.py clean-sample-data  # Remove sample/test trades (user_id=1)
+    python manage.py gc-screenshots [--dry-run] [--quarantine] [--grace-hours=24]
+                                    # Remove screenshots no trade references
+    python manage.py capture-worker [--processes=2] [--backend=stub]
+                                    # Process queued screenshot captures
 """
 
 import sys
@@ -16,26 +48,101 @@ import getpass
 import sqlite3
 from app.models.migrations import Migration
 from app.models.backup import DatabaseBackup
+from app.models.maintenance import DatabaseMaintenance, compact_change_logs
+from app.models.archive import TradeArchive
+from app.models.sharding import Resharder, ShardRouter, SHARD_MODES
 from app.models.user import User
+from app.services.screenshot_gc import ScreenshotGarbageCollector
+from app.services.capture_queue import CaptureWorker
+from app.services.backup_scheduler import BackupScheduler, extra_databases
 
 DATABASE_PATH = 'database/trading_journal.db'
+UPLOAD_FOLDER = 'app/static/screenshots'
+SLOW_QUERY_LOG = os.getenv('SLOW_QUERY_LOG', 'logs/slow_queries.log')
+
+def get_option(name, default=None):
+    """Read a --name=value option from the command line"""
+    prefix = f'--{name}='
+    for arg in sys.argv[2:]:
+        if arg.startswith(prefix):
+            return arg[len(prefix):]
+    return default
+
+def has_flag(name):
+    return f'--{name}' in sys.argv[2:]
 
 def migrate():
     """Run database migrations"""
-    print("Running migrations...")
     migration = Migration(DATABASE_PATH)
+    
+    if has_flag('status'):
+        migration_status(migration)
+        return
+    
+    print("Running migrations...")
     migration.run_all_migrations()
+    # Shards also migrate themselves when first opened, but backfill only here
+    shard_migrations = [
+        Migration(shard_path, shard=True) for shard_path in ShardRouter(DATABASE_PATH).shard_paths()
+    ]
+    for shard_migration in shard_migrations:
+        shard_migration.run_all_migrations(verbose=False)
+    
+    rate = get_option('rate')
+    for target in [migration] + shard_migrations:
+        target.run_all_backfills(
+            batch_size=int(get_option('batch-size', 1000)),
+            max_rows_per_second=int(rate) if rate else None
+        )
     print("✓ Migrations complete")
 
+def migration_status(migration):
+    """Print schema version, pending migrations and backfill progress"""
+    print(f"\n🗂  Schema version: {migration.current_version()} / {migration.latest_version}")
+    pending = migration.pending_migrations()
+    if pending:
+        print("Pending migrations:")
+        for version in pending:
+            print(f"  - {version}")
+    
+    statuses = migration.backfill_status() if not pending else []
+    if statuses:
+        print("\nBackfills:")
+        print("-" * 70)
+        for status in statuses:
+            print(f"{status['name']:<40} {status['state']:<8} {status['percent']:>5}%  "
+                  f"({status['rows_done']} rows)")
+
+def get_backup_system():
+    """DatabaseBackup configured from --codec/--level/--workers or BACKUP_* env vars"""
+    level = get_option('level', os.getenv('BACKUP_LEVEL'))
+    workers = get_option('workers', os.getenv('BACKUP_WORKERS'))
+    return DatabaseBackup(
+        DATABASE_PATH,
+        codec=get_option('codec', os.getenv('BACKUP_CODEC', 'gzip')),
+        level=int(level) if level else None,
+        workers=int(workers) if workers else None
+    )
+
 def backup():
     """Create database backup"""
     print("Creating backup...")
-    backup_system = DatabaseBackup(DATABASE_PATH)
-    backup_file = backup_system.create_backup()
+    backup_system = get_backup_system()
+    if has_flag('incremental'):
+        backup_file = backup_system.create_incremental_backup()
+    else:
+        backup_file = backup_system.create_backup()
     if backup_file:
         print(f"✓ Backup created: {backup_file}")
     else:
         print("✗ Backup failed")
+    
+    # Archive and shard files get their own deduplicated snapshots
+    for path, target_dir in extra_databases(DATABASE_PATH):
+        extra_backup = DatabaseBackup(path, backup_dir=os.path.join('backups', target_dir))
+        extra_file = extra_backup.create_incremental_backup()
+        print(f"✓ Snapshot of {os.path.basename(path)} created: {extra_file}" if extra_file
+              else f"✗ Backup of {os.path.basename(path)} failed")
 
 def restore(backup_file):
     """Restore database from backup"""
@@ -50,7 +157,12 @@ def restore(backup_file):
     
     print(f"Restoring from {backup_file}...")
     backup_system = DatabaseBackup(DATABASE_PATH)
-    if backup_system.restore_backup(backup_file):
+    if backup_file.endswith('.json'):
+        restored = backup_system.restore_snapshot(backup_file)
+    else:
+        restored = backup_system.restore_backup(backup_file)
+    
+    if restored:
         print("✓ Restore complete")
     else:
         print("✗ Restore failed")
@@ -59,18 +171,29 @@ def list_backups():
     """List all available backups"""
     backup_system = DatabaseBackup(DATABASE_PATH)
     backups = backup_system.list_backups()
+    snapshots = backup_system.list_snapshots()
     
-    if not backups:
+    if not backups and not snapshots:
         print("No backups found")
         return
     
-    print("\n📦 Available Backups:")
-    print("-" * 70)
-    for backup in backups:
-        print(f"{backup['filename']}")
-        print(f"  Size: {backup['size_kb']} KB")
-        print(f"  Created: {backup['created']}")
-        print()
+    if backups:
+        print("\n📦 Available Backups:")
+        print("-" * 70)
+        for backup in backups:
+            print(f"{backup['filename']}")
+            print(f"  Size: {backup['size_kb']} KB")
+            print(f"  Created: {backup['created']}")
+            print()
+    
+    if snapshots:
+        print("\n🧩 Incremental Snapshots:")
+        print("-" * 70)
+        for snapshot in snapshots:
+            print(f"{snapshot['path']}")
+            print(f"  Database size: {snapshot['size_kb']} KB (new data stored: {snapshot['new_kb']} KB)")
+            print(f"  Created: {snapshot['created']}")
+            print()
 
 def create_user():
     """Create a new user"""
@@ -107,7 +230,7 @@ def clean_sample_data():
         print("Cancelled")
         return
     
-    conn = sqlite3.connect(DATABASE_PATH)
+    conn = sqlite3.connect(ShardRouter(DATABASE_PATH).for_user(1).db_path)
     cursor = conn.cursor()
     cursor.execute('DELETE FROM trades WHERE user_id = 1')
     deleted = cursor.rowcount
@@ -116,6 +239,403 @@ def clean_sample_data():
     
     print(f"✓ Deleted {deleted} sample trades")
 
+def gc_screenshots():
+    """Delete or quarantine orphaned screenshot files"""
+    dry_run = has_flag('dry-run')
+    quarantine = has_flag('quarantine')
+    grace_hours = float(get_option('grace-hours', 24))
+    
+    collector = ScreenshotGarbageCollector(DATABASE_PATH, UPLOAD_FOLDER, grace_hours=grace_hours)
+    report = collector.collect(dry_run=dry_run, quarantine=quarantine)
+    
+    if not report['files']:
+        print("No orphaned screenshots found")
+        return
+    
+    verb = 'Would ' + report['action'] if dry_run else report['action'].capitalize() + 'd'
+    print(f"\n🧹 {verb} {report['total_files']} orphaned files:")
+    print("-" * 70)
+    for file in report['files']:
+        print(f"{file['filename']}  ({round(file['size'] / 1024, 2)} KB)")
+    print()
+    reclaimed_mb = round(report['reclaimed_bytes'] / (1024 * 1024), 2)
+    print(f"{'Reclaimable' if dry_run else 'Reclaimed'}: {reclaimed_mb} MB")
+
+def capture_worker():
+    """Run the screenshot capture worker until interrupted"""
+    processes = int(get_option('processes', 2))
+    backend = get_option('backend', os.getenv('CAPTURE_BACKEND', 'stub'))
+    
+    worker = CaptureWorker(DATABASE_PATH, UPLOAD_FOLDER, backend=backend, processes=processes)
+    print(f"📷 Capture worker running ({processes} processes, backend: {backend}). Ctrl+C to stop.")
+    try:
+        worker.run_forever()
+    except KeyboardInterrupt:
+        worker.shutdown()
+        print("\n✓ Capture worker stopped")
+
+def bench_backup():
+    """Measure backup and restore throughput for each codec"""
+    import tempfile
+    import time
+    from app.models import backup as backup_module
+    
+    db_size_mb = os.path.getsize(DATABASE_PATH) / (1024 * 1024)
+    configs = [('gzip', 1, 1), ('gzip', 6, 1), ('gzip', 1, None), ('gzip', 6, None)]
+    if backup_module.zstandard is not None:
+        configs += [('zstd', 3, None), ('zstd', 9, None)]
+    
+    print(f"\n⏱  Backup benchmark ({round(db_size_mb, 2)} MB database)")
+    print("-" * 70)
+    print(f"{'codec':<6} {'level':>5} {'workers':>7} {'ratio':>7} {'backup MB/s':>12} {'restore MB/s':>13}")
+    
+    for codec, level, workers in configs:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            backup_system = DatabaseBackup(
+                DATABASE_PATH, backup_dir=temp_dir, codec=codec, level=level, workers=workers
+            )
+            
+            started = time.perf_counter()
+            backup_file = backup_system.create_backup()
+            backup_seconds = time.perf_counter() - started
+            
+            # Restore into a scratch database - never over the real one
+            restore_system = DatabaseBackup(os.path.join(temp_dir, 'restored.db'), backup_dir=temp_dir)
+            started = time.perf_counter()
+            restore_system.restore_backup(backup_file)
+            restore_seconds = time.perf_counter() - started
+            
+            ratio = os.path.getsize(DATABASE_PATH) / os.path.getsize(backup_file)
+            print(f"{codec:<6} {level:>5} {backup_system.workers:>7} {ratio:>7.2f} "
+                  f"{db_size_mb / backup_seconds:>12.1f} {db_size_mb / restore_seconds:>13.1f}")
+
+def backup_daemon():
+    """Run scheduled backups in the foreground"""
+    io_limit_mb = float(os.getenv('BACKUP_IO_LIMIT_MB', 0)) or None
+    level = os.getenv('BACKUP_LEVEL')
+    workers = os.getenv('BACKUP_WORKERS')
+    scheduler = BackupScheduler(
+        DATABASE_PATH,
+        UPLOAD_FOLDER,
+        interval_minutes=float(get_option('interval', os.getenv('BACKUP_INTERVAL_MINUTES', 60))),
+        keep_hourly=int(os.getenv('BACKUP_KEEP_HOURLY', 24)),
+        keep_daily=int(os.getenv('BACKUP_KEEP_DAILY', 7)),
+        keep_weekly=int(os.getenv('BACKUP_KEEP_WEEKLY', 4)),
+        io_limit_mb=io_limit_mb,
+        codec=os.getenv('BACKUP_CODEC', 'gzip'),
+        level=int(level) if level else None,
+        workers=int(workers) if workers else None
+    )
+    
+    if has_flag('once'):
+        print(scheduler.run_once())
+        return
+    
+    print(f"🗄  Backup daemon running every {scheduler.interval_seconds / 60:g} minutes. Ctrl+C to stop.")
+    try:
+        scheduler.run_forever()
+    except KeyboardInterrupt:
+        print("\n✓ Backup daemon stopped")
+
+def bench_startup():
+    """Time create_app in fresh interpreters, and the migration check on its own"""
+    import subprocess
+    import time
+    
+    runs = int(get_option('runs', 5))
+    code = (
+        "import time; t = time.perf_counter(); "
+        "from app import create_app; create_app(); "
+        "print(time.perf_counter() - t)"
+    )
+    
+    cold = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, '-c', code],
+            capture_output=True, text=True, check=True,
+            env={**os.environ, 'DATABASE_PATH': os.path.abspath(DATABASE_PATH)}
+        )
+        cold.append(float(result.stdout.strip().splitlines()[-1]))
+    
+    migration = Migration(DATABASE_PATH)
+    started = time.perf_counter()
+    for _ in range(100):
+        migration.run_all_migrations()
+    check_ms = (time.perf_counter() - started) * 10
+    
+    print(f"\n⏱  Startup benchmark ({runs} runs)")
+    print("-" * 70)
+    print(f"create_app cold start: min {min(cold) * 1000:.1f} ms, "
+          f"avg {sum(cold) / len(cold) * 1000:.1f} ms")
+    print(f"Schema version check (up to date): {check_ms:.3f} ms")
+
+def seed():
+    """Generate synthetic trade histories for load testing"""
+    from datetime import datetime
+    from app.services.seeder import TradeSeeder
+    
+    database = get_option('database', DATABASE_PATH)
+    end_date = get_option('end-date')
+    
+    seeder = TradeSeeder(database, seed=int(get_option('seed', 42)))
+    
+    def progress(done, total):
+        print(f"\r  {done}/{total} trades", end='', flush=True)
+    
+    print(f"🌱 Seeding {database}...")
+    summary = seeder.seed(
+        users=int(get_option('users', 10)),
+        trades_per_user=int(get_option('trades', 1000)),
+        days=int(get_option('days', 730)),
+        end_date=datetime.fromisoformat(end_date) if end_date else None,
+        win_rate=float(get_option('win-rate', 0.45)),
+        avg_win_r=float(get_option('avg-win-r', 1.8)),
+        tag_rate=float(get_option('tag-rate', 0.2)),
+        screenshot_rate=float(get_option('screenshot-rate', 0.1)),
+        progress=progress
+    )
+    print()
+    print(f"✓ Inserted {summary['trades']} trades and {summary['tag_links']} tag links "
+          f"for {summary['users']} users in {summary['seconds']}s "
+          f"({summary['trades_per_minute']} trades/minute)")
+
+def bench():
+    """Benchmark every API route at several database sizes"""
+    import json
+    from datetime import datetime
+    from app.services.benchmark import EndpointBenchmark, compare_results, DEFAULT_SIZES
+    
+    sizes = get_option('sizes')
+    benchmark = EndpointBenchmark(
+        work_dir=get_option('work-dir', 'database/bench'),
+        sizes=[int(size) for size in sizes.split(',')] if sizes else DEFAULT_SIZES,
+        seed=int(get_option('seed', 42)),
+        iterations=int(get_option('iterations', 20)),
+        time_budget=float(get_option('time-budget', 30)),
+        concurrency=int(get_option('concurrency', 8)),
+        duration=float(get_option('duration', 10))
+    )
+    
+    print(f"\n⏱  Endpoint benchmark ({', '.join(str(size) for size in benchmark.sizes)} trades)")
+    results = benchmark.run()
+    
+    for size, result in results['sizes'].items():
+        print(f"\n{size} trades ({result['database_mb']} MB database, peak RSS {result['peak_rss_mb']} MB)")
+        print("-" * 78)
+        print(f"{'route':<20} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'queries':>8} {'conc req/s':>11}")
+        for name, stats in result['sequential'].items():
+            concurrent = result['concurrent'].get(name)
+            rps = f"{concurrent['throughput_rps']:.1f}" if concurrent else '-'
+            print(f"{name:<20} {stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} "
+                  f"{stats['p99_ms']:>9.2f} {stats['queries']:>8} {rps:>11}")
+    
+    output = get_option('output', os.path.join(
+        benchmark.work_dir, f"results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    ))
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\n✓ Results saved: {output}")
+    
+    baseline = get_option('baseline')
+    if baseline:
+        with open(baseline) as f:
+            regressions = compare_results(results, json.load(f), float(get_option('threshold', 0.2)))
+        if regressions:
+            print(f"\n✗ {len(regressions)} regression(s) against {baseline}:")
+            for regression in regressions:
+                print(f"  - {regression}")
+            sys.exit(1)
+        print(f"✓ No regressions against {baseline}")
+
+def bench_json():
+    """Serialization time and bytes on the wire for large trade lists"""
+    from app.services.benchmark import bench_payloads, PAYLOAD_SIZES
+    
+    sizes = get_option('sizes')
+    sizes = [int(size) for size in sizes.split(',')] if sizes else PAYLOAD_SIZES
+    results = bench_payloads(sizes, iterations=int(get_option('iterations', 3)))
+    
+    print(f"\n⏱  JSON response benchmark (best of {get_option('iterations', 3)})")
+    print("-" * 62)
+    print(f"{'trades':>8} {'step':<10} {'name':<10} {'ms':>9} {'MB':>9} {'ratio':>7}")
+    for row in results:
+        ratio = f"{row['ratio']:.1f}" if 'ratio' in row else '-'
+        print(f"{row['trades']:>8} {row['step']:<10} {row['name']:<10} {row['ms']:>9.1f} "
+              f"{row['bytes'] / (1024 * 1024):>9.2f} {ratio:>7}")
+
+def bench_memory():
+    """Peak allocation per 100k trades, SELECT * dict rows vs narrow tuples"""
+    from app.services.benchmark import bench_memory as run_bench_memory, MEMORY_BENCH_SIZE
+    
+    size = int(get_option('trades', MEMORY_BENCH_SIZE))
+    results = run_bench_memory(size, work_dir=get_option('work-dir', 'database/bench'))
+    
+    print(f"\n⏱  Row memory benchmark ({size} trades, peak per 100k trades)")
+    print("-" * 50)
+    print(f"{'step':<15} {'rows':<8} {'peak MB':>10} {'ms':>10}")
+    for row in results:
+        print(f"{row['step']:<15} {row['name']:<8} {row['peak_mb']:>10.1f} {row['ms']:>10.1f}")
+
+def slow_queries():
+    """Aggregate the slow query log by statement"""
+    from app.services.slow_queries import slow_query_report
+    
+    log_path = get_option('log', SLOW_QUERY_LOG)
+    limit = int(get_option('limit', 20))
+    report = slow_query_report(log_path, since=get_option('since'))
+    
+    if not report:
+        print(f"No slow queries logged in {log_path}")
+        return
+    
+    print(f"\n🐢 Slowest statements ({len(report)} distinct, by total time)")
+    print("-" * 78)
+    for group in report[:limit]:
+        flags = []
+        if group['full_scan']:
+            flags.append(f"FULL SCAN {', '.join(group['full_scan'])}")
+        if group['temp_btree']:
+            flags.append("TEMP B-TREE")
+        
+        print(f"{group['total_ms']:>10.1f} ms total  {group['count']:>5}x  "
+              f"avg {group['avg_ms']:.1f} ms  max {group['max_ms']:.1f} ms  "
+              f"rows ≤{group['max_rows']}")
+        print(f"    {group['normalized'][:300]}")
+        if flags:
+            print(f"    ⚠  {' | '.join(flags)}")
+        if group['endpoints']:
+            print(f"    from {', '.join(group['endpoints'])}")
+        for detail in group['plan'] or ():
+            print(f"      plan: {detail}")
+        print()
+
+def db_maintain():
+    """Planner statistics, space reclamation and a storage report"""
+    # Once sharded, the trades live in the shard files: each gets the same pass
+    paths = [DATABASE_PATH] + ShardRouter(DATABASE_PATH).shard_paths()
+    
+    if not has_flag('report'):
+        vacuum_pages = get_option('vacuum-pages')
+        compacted = compact_change_logs(DATABASE_PATH)
+        print(f"✓ Change log compacted ({compacted['superseded']} superseded, "
+              f"{compacted['expired']} expired rows removed)")
+        
+        for path in paths:
+            maintenance = DatabaseMaintenance(path)
+            if len(paths) > 1:
+                print(f"\n🗄  {os.path.basename(path)}")
+            before = maintenance.page_stats()
+            if not has_flag('no-convert') and before['auto_vacuum'] != 'incremental':
+                print(f"🔧 Enabling incremental auto-vacuum (one-time VACUUM of {before['file_mb']} MB)...")
+            
+            result = maintenance.run(
+                vacuum_pages=int(vacuum_pages) if vacuum_pages else None,
+                full_analyze=has_flag('analyze'),
+                convert=not has_flag('no-convert')
+            )
+            after = result['after']
+            
+            print(f"✓ Statistics refreshed ({result['analyze']['mode']}, {result['analyze']['seconds']}s)")
+            print(f"✓ Reclaimed {result['pages_reclaimed']} free pages")
+            if result['checkpoint']:
+                print(f"✓ WAL checkpointed ({result['checkpoint']['checkpointed']} pages)")
+            print(f"✓ File size {result['before']['file_mb']} MB -> {after['file_mb']} MB "
+                  f"({after['freelist_count']} free pages, auto_vacuum={after['auto_vacuum']}, "
+                  f"journal={after['journal_mode']})")
+    
+    for path in paths:
+        report = DatabaseMaintenance(path).space_report()
+        if report is None:
+            print("\n(dbstat is not available in this SQLite build - no size report)")
+            return
+        
+        title = f" - {os.path.basename(path)}" if len(paths) > 1 else ''
+        print(f"\n📊 Storage by table and index{title}")
+        print("-" * 78)
+        print(f"{'name':<40} {'type':<6} {'pages':>8} {'MB':>8} {'unused %':>9} {'scattered %':>12}")
+        for item in report:
+            print(f"{item['name'][:40]:<40} {item['type']:<6} {item['pages']:>8} {item['mb']:>8.2f} "
+                  f"{item['unused_pct']:>9.1f} {item['scattered_pct']:>12.1f}")
+
+def archive():
+    """Move closed trades older than --older-than days into the archive database"""
+    # Make sure archive_state exists
+    Migration(DATABASE_PATH).run_all_migrations()
+    # With sharding, every shard has its own archive
+    trade_archives = [TradeArchive(db.db_path) for db in ShardRouter(DATABASE_PATH).databases()]
+    
+    if has_flag('status'):
+        for trade_archive in trade_archives:
+            status = trade_archive.status()
+            if len(trade_archives) > 1:
+                print(f"\n{os.path.basename(trade_archive.db_path)}")
+            print(f"Archived before: {status['archived_before'] or 'never archived'}")
+            print(f"Hot trades: {status['hot_trades']} ({status['hot_mb']} MB)")
+            print(f"Archived trades: {status['archived_trades']} ({status['archive_mb']} MB)")
+        return
+    
+    older_than = get_option('older-than')
+    if not older_than:
+        print("✗ --older-than=DAYS is required")
+        return
+    
+    moved = 0
+    for trade_archive in trade_archives:
+        def progress(count):
+            print(f"\r  {count} trades moved", end='', flush=True)
+        
+        print(f"📦 Archiving closed trades older than {older_than} days to {trade_archive.archive_path}...")
+        result = trade_archive.archive(
+            int(older_than),
+            batch_size=int(get_option('batch-size', 2000)),
+            progress=progress
+        )
+        print()
+        print(f"✓ Moved {result['moved']} trades (exited before {result['cutoff']})")
+        moved += result['moved']
+    if moved:
+        print("  Run `python manage.py db-maintain` to reclaim the freed space")
+
+def reshard():
+    """Move trades to per-user or hash-partitioned shard files (or back with --mode=off)"""
+    from app.services.statistics import StatisticsService
+    
+    mode = get_option('mode')
+    if mode not in SHARD_MODES:
+        print(f"✗ --mode must be one of: {', '.join(SHARD_MODES)}")
+        return
+    
+    # shard_state and the derived columns must be in place before copying rows
+    migration = Migration(DATABASE_PATH)
+    migration.run_all_migrations()
+    migration.run_all_backfills()
+    
+    before = StatisticsService(DATABASE_PATH).get_overall_stats()['total_trades']
+    resharder = Resharder(
+        DATABASE_PATH,
+        mode,
+        shard_count=int(get_option('shards', 16)) if mode == 'hash' else 0,
+        batch_size=int(get_option('batch-size', 2000))
+    )
+    
+    def progress(user_id, result):
+        if result['moved'] or result['archived']:
+            print(f"  user {user_id}: {result['moved']} trades, {result['archived']} archived")
+    
+    print(f"🔀 Resharding {resharder.source.mode} -> {mode}"
+          f"{f' ({resharder.target.shard_count} shards)' if mode == 'hash' else ''}...")
+    totals = resharder.run(progress=progress)
+    
+    after = StatisticsService(DATABASE_PATH).get_overall_stats()['total_trades']
+    print(f"✓ Moved {totals['moved']} trades and {totals['archived']} archived trades "
+          f"for {totals['users']} users into {totals['shards']} shard files")
+    if totals['renumbered']:
+        print(f"  {totals['renumbered']} trades got new ids (their id was taken in the target file)")
+    if totals['removed_files']:
+        print(f"  Removed {totals['removed_files']} emptied shard files")
+    print(f"{'✓' if before == after else '✗'} Closed trades across all users: {before} before, {after} after")
+
 def main():
     if len(sys.argv) < 2:
         print(__doc__)
@@ -130,7 +650,20 @@ def main():
         'list-backups': list_backups,
         'create-user': create_user,
         'cleanup-backups': cleanup_backups,
-        'clean-sample-data': clean_sample_data
+        'clean-sample-data': clean_sample_data,
+        'gc-screenshots': gc_screenshots,
+        'capture-worker': capture_worker,
+        'bench-backup': bench_backup,
+        'backup-daemon': backup_daemon,
+        'bench-startup': bench_startup,
+        'seed': seed,
+        'bench': bench,
+        'bench-json': bench_json,
+        'bench-memory': bench_memory,
+        'slow-queries': slow_queries,
+        'db-maintain': db_maintain,
+        'archive': archive,
+        'reshard': reshard
     }
     
     if command in commands:
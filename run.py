@@ -1,6 +1,11 @@
+import os
 from app import create_app
 
-app = create_app()
+# With the reloader on, this process only watches files and restarts the server
+# process it spawns (WERKZEUG_RUN_MAIN=true), which runs the background threads
+reloader_watcher = __name__ == '__main__' and os.environ.get('WERKZEUG_RUN_MAIN') != 'true'
+
+app = create_app(background_tasks=not reloader_watcher)
 
 if __name__ == '__main__':
     app.run(